@@ -0,0 +1,135 @@
+"""
+Mede a latência por requisição com e sem reaproveitamento de conexões
+(`src/scrapping/cliente_http.py`) contra um servidor local que faz o papel da
+API de avaliações.
+
+O servidor responde um JSON do tamanho de uma página de avaliações e, com
+`--rtt-ms`, simula a distância até o servidor real: cada requisição espera um
+RTT e cada conexão nova espera mais um (TCP) ou dois (TCP + TLS) RTTs de
+handshake. Com o `openssl` disponível, o servidor usa TLS com um certificado
+autoassinado temporário, como a API real.
+
+    python benchmarks/bench_cliente_http.py [--requisicoes 300] [--rtt-ms 20] [--threads 8]
+"""
+import argparse
+import json
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+import urllib3
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(project_root, 'src', 'scrapping'))
+
+from cliente_http import criar_sessao
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+
+def criar_servidor(tamanho_kb, rtt, tls):
+    corpo = json.dumps({"reviews": [{"_id": "1", "reviews": [{"text": "x" * 1024}] * tamanho_kb}]}).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            # Handshake de uma conexão nova: TCP (1 RTT) e, com TLS, mais 1 RTT
+            time.sleep(rtt * (2 if tls else 1))
+            super().setup()
+
+        def do_GET(self):
+            time.sleep(rtt)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    servidor.daemon_threads = True
+    pasta = None
+    if tls:
+        pasta = tempfile.mkdtemp()
+        chave, certificado = os.path.join(pasta, "chave.pem"), os.path.join(pasta, "cert.pem")
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+             "-keyout", chave, "-out", certificado],
+            check=True, capture_output=True,
+        )
+        contexto = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        contexto.load_cert_chain(certificado, chave)
+        # Handshake TLS feito na thread de cada conexão, no primeiro read
+        servidor.socket = contexto.wrap_socket(servidor.socket, server_side=True, do_handshake_on_connect=False)
+
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    esquema = "https" if tls else "http"
+    return servidor, f"{esquema}://127.0.0.1:{servidor.server_address[1]}/casasbahia/123/summary", pasta
+
+
+def medir(obter, url, requisicoes, threads):
+    """Latência (ms) de cada requisição, com `threads` requisições em paralelo."""
+    def uma(pagina):
+        inicio = time.perf_counter()
+        resposta = obter(f"{url}?page={pagina}")
+        resposta.raise_for_status()
+        resposta.json()
+        return (time.perf_counter() - inicio) * 1000
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        latencias = np.array(list(executor.map(uma, range(requisicoes))))
+    return latencias, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requisicoes", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--rtt-ms", type=float, default=20.0, help="RTT simulado até o servidor.")
+    parser.add_argument("--tamanho-kb", type=int, default=50, help="Tamanho aproximado de cada resposta.")
+    parser.add_argument("--sem-tls", action="store_true")
+    args = parser.parse_args()
+
+    tls = not args.sem_tls and shutil.which("openssl") is not None
+    servidor, url, pasta = criar_servidor(args.tamanho_kb, args.rtt_ms / 1000, tls)
+    print(f"Servidor local em {url} (TLS: {'sim' if tls else 'não'}, RTT simulado: {args.rtt_ms} ms), "
+          f"{args.requisicoes} requisições com {args.threads} threads.")
+
+    sessao = criar_sessao(args.threads)
+    modos = {
+        "requests.get (nova conexão)": lambda u: requests.get(u, timeout=15, verify=False),
+        "criar_sessao (keep-alive)": lambda u: sessao.get(u, timeout=15, verify=False),
+    }
+
+    resultados = {}
+    try:
+        for nome, obter in modos.items():
+            latencias, total = medir(obter, url, args.requisicoes, args.threads)
+            resultados[nome] = latencias
+            print(f"  {nome:<28} média {latencias.mean():7.1f} ms | p50 {np.percentile(latencias, 50):7.1f} ms"
+                  f" | p95 {np.percentile(latencias, 95):7.1f} ms | {args.requisicoes / total:7.1f} req/s")
+    finally:
+        servidor.shutdown()
+        if pasta:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+    sem_pool, com_pool = resultados.values()
+    economia = sem_pool.mean() - com_pool.mean()
+    print(f"Economia por requisição: {economia:.1f} ms ({economia / sem_pool.mean():.0%}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compara o tempo por página dos extratores de `src/scrapping/extratores.py`.
+
+Usa as páginas de produto guardadas no cache HTTP (data/cache/http) quando
+existirem; caso contrário, gera uma página sintética do tamanho de uma
+página real da Casas Bahia (alguns MB de HTML).
+
+    python benchmarks/bench_extratores.py [--paginas 20] [--repeticoes 5]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(project_root, 'src', 'scrapping'))
+
+from cache_http import CacheHTTP
+from extratores import EXTRATORES
+
+
+def pagina_sintetica(tamanho_mb=3):
+    json_ld = json.dumps({
+        "@context": "https://schema.org",
+        "@type": "Product",
+        "name": "Smartphone de teste",
+        "offers": {"@type": "Offer", "price": "1299.90", "seller": {"@type": "Organization", "name": "Casas Bahia"}},
+        "aggregateRating": {"@type": "AggregateRating", "ratingValue": 4.6, "reviewCount": 1532},
+    })
+    bloco = '<div class="card"><a href="/produto/1"><span class="preco">R$ 10,00</span></a><p>Texto de vitrine</p></div>\n'
+    repeticoes = (tamanho_mb * 1024 * 1024) // len(bloco)
+    metade = repeticoes // 2
+    return (
+        "<html><head><title>Produto</title>"
+        f'<script type="application/ld+json">{json_ld}</script></head><body>'
+        + bloco * metade
+        + '<div class="konfidency-reviews-summary" data-sku="1234567"></div>'
+        + bloco * (repeticoes - metade)
+        + "</body></html>"
+    )
+
+
+def paginas_do_cache(limite):
+    diretorio = os.path.join(project_root, 'data', 'cache', 'http')
+    if not os.path.exists(os.path.join(diretorio, 'indice.db')):
+        return []
+    cache = CacheHTTP(diretorio, offline=True)
+    urls = [
+        linha[0] for linha in sqlite3.connect(os.path.join(diretorio, 'indice.db')).execute(
+            "SELECT url FROM respostas WHERE fonte = 'produtos' LIMIT ?", (limite,)
+        )
+    ]
+    return [cache.obter(url, "produtos").text for url in urls]
+
+
+def medir(funcao, paginas, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        for html in paginas:
+            funcao(html)
+    return (time.perf_counter() - inicio) / (repeticoes * len(paginas))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paginas", type=int, default=20)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    paginas = paginas_do_cache(args.paginas)
+    origem = "cache HTTP"
+    if not paginas:
+        paginas = [pagina_sintetica()]
+        origem = "página sintética"
+
+    tamanho_medio = sum(len(html) for html in paginas) / len(paginas) / 1024 / 1024
+    print(f"{len(paginas)} página(s) de {origem}, {tamanho_medio:.1f} MB em média.")
+
+    for html in paginas:
+        resultados = {nome: funcao(html) for nome, funcao in EXTRATORES.items()}
+        if resultados["lxml"] != resultados["bs4"]:
+            print(f"Divergência entre extratores: {resultados}")
+
+    tempos = {nome: medir(funcao, paginas, args.repeticoes) for nome, funcao in EXTRATORES.items()}
+    for nome, tempo in tempos.items():
+        print(f"{nome:>5}: {tempo * 1000:8.1f} ms/página")
+    print(f"Aceleração do lxml: {tempos['bs4'] / tempos['lxml']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Compara a memória dos DataFrames do processamento na representação antiga
+(colunas de objetos Python, `comentario_limpo` como segunda cópia do texto e
+`topicos` como uma lista Python por linha) e na compacta de
+`src/comum/compacto.py` (categóricos, inteiros pequenos, strings do Arrow e
+tópicos como vocabulário + índices + offsets), sobre um corpus sintético
+(ver `corpus_sintetico.py`).
+
+Cada coluna é montada nas duas representações a partir do mesmo corpus e
+medida à parte: a memória do Python e do NumPy pelo tracemalloc e a do Arrow
+pelo `pyarrow.total_allocated_bytes`. Os tópicos vêm de uma regra simples
+sobre o texto limpo (palavras longas), no lugar do spaCy, e o sentimento
+vem da nota, no lugar do LeIA: só a representação é medida, não o NLP.
+
+    python benchmarks/bench_memoria.py [--linhas 1000000]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from corpus_sintetico import gerar_corpus
+from comum.compacto import aplicar_nos_unicos, codificar_topicos, codigos_e_unicos, compactar
+from comum.normalizacao import limpar_serie
+
+
+def medir(construir):
+    """Executa `construir()` e retorna (resultado, bytes que o resultado mantém alocados)."""
+    gc.collect()
+    tracemalloc.start()
+    arrow_antes = pa.total_allocated_bytes()
+    resultado = construir()
+    gc.collect()
+    python = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return resultado, python + pa.total_allocated_bytes() - arrow_antes
+
+
+def topicos_sinteticos(texto):
+    """Substitui o spaCy: até 4 palavras de 6 letras ou mais do texto limpo."""
+    return sorted({palavra for palavra in texto.split() if len(palavra) >= 6})[:4]
+
+
+def sentimento_da_nota(notas):
+    return np.select([notas >= 4, notas <= 2], ['Positivo', 'Negativo'], default='Neutro')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memória dos DataFrames do processamento: antes e depois.")
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    tabela = pa.Table.from_pandas(gerar_corpus(args.linhas, args.semente), preserve_index=False)
+    print(f"Corpus de {args.linhas:,} avaliações gerado em {time.perf_counter() - inicio:.1f} s.")
+
+    def objetos(coluna):
+        # Um objeto Python novo por linha, como nas colunas `object` lidas do CSV
+        return pd.Series(tabela[coluna].to_numpy(zero_copy_only=False), dtype=object)
+
+    def limpar_objetos(serie):
+        # O pandas 3 já devolveria strings do Arrow: força a coluna `object` de antes
+        return pd.Series(limpar_serie(serie).to_numpy(dtype=object), dtype=object)
+
+    notas = tabela['rating_do_comentario'].to_numpy()
+    comentarios = objetos('comentario_about_produto')
+    limpos_antes = limpar_objetos(comentarios)
+    # Resultado do NLP por texto distinto, igual ao cache usado nas duas representações
+    cache_topicos = {texto: topicos_sinteticos(texto) for texto in pd.unique(limpos_antes)}
+
+    antes = {
+        'id_produto': lambda: objetos('id_produto'),
+        'id_avaliacoes': lambda: objetos('id_avaliacoes'),
+        'id_comentario': lambda: objetos('id_comentario'),
+        'rating_do_comentario': lambda: pd.Series(notas.astype(np.int64)),
+        'comentario_about_produto': lambda: objetos('comentario_about_produto'),
+        'comentario_limpo': lambda: limpar_objetos(comentarios),
+        'sentimento': lambda: pd.Series(sentimento_da_nota(notas).astype(object), dtype=object),
+        'topicos': lambda: pd.Series([list(cache_topicos[texto]) for texto in limpos_antes], dtype=object),
+        'data_coleta': lambda: objetos('data_coleta'),
+    }
+
+    def compacta(coluna):
+        return compactar(pd.DataFrame({coluna: objetos(coluna)}))[coluna]
+
+    def topicos_compactos():
+        codigos, unicos = codigos_e_unicos(limpos_depois)
+        return codificar_topicos(codigos, [cache_topicos[texto] for texto in unicos])
+
+    comentarios_depois = compacta('comentario_about_produto')
+    limpos_depois = aplicar_nos_unicos(comentarios_depois, limpar_serie)
+    depois = {
+        'id_produto': lambda: compacta('id_produto'),
+        'id_avaliacoes': lambda: compacta('id_avaliacoes'),
+        'id_comentario': lambda: compacta('id_comentario'),
+        'rating_do_comentario': lambda: compactar(pd.DataFrame({'rating_do_comentario': notas}))['rating_do_comentario'],
+        'comentario_about_produto': lambda: compacta('comentario_about_produto'),
+        'comentario_limpo': lambda: aplicar_nos_unicos(comentarios_depois, limpar_serie),
+        'sentimento': lambda: compactar(pd.DataFrame({'sentimento': sentimento_da_nota(notas)}))['sentimento'],
+        'topicos': topicos_compactos,
+        'data_coleta': lambda: compacta('data_coleta'),
+    }
+
+    total_antes = total_depois = 0
+    print(f"\n  {'coluna':<26} {'antes':>10} {'depois':>10} {'redução':>8}   tipo compacto")
+    for coluna in antes:
+        _, bytes_antes = medir(antes[coluna])
+        serie, bytes_depois = medir(depois[coluna])
+        total_antes += bytes_antes
+        total_depois += bytes_depois
+        print(f"  {coluna:<26} {bytes_antes / 2**20:8.1f} MB {bytes_depois / 2**20:8.1f} MB "
+              f"{1 - bytes_depois / bytes_antes:7.0%}   {serie.dtype}")
+        del serie
+    print(f"  {'total':<26} {total_antes / 2**20:8.1f} MB {total_depois / 2**20:8.1f} MB "
+          f"{1 - total_depois / total_antes:7.0%}")
+    print(f"\n{len(cache_topicos):,} textos limpos distintos em {args.linhas:,} comentários.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Mede o tempo e a memória de cada etapa de `src/processing` sobre corpora
+sintéticos (ver `corpus_sintetico.py`) e grava os resultados em JSON, para
+comparar execuções ao longo do tempo.
+
+Etapas: limpar_texto, classificar_sentimento, extrair_topicos (em lote),
+extract_words (explode_words), salvar_no_banco_de_dados e o pipeline
+completo (`executar_pipeline`, do CSV até o DuckDB). Cada etapa roda uma vez
+para medir o tempo e, por padrão, mais uma sob o tracemalloc para medir o
+pico de memória. O cache de NLP é zerado antes de cada etapa. Roda offline;
+sem o modelo do spaCy instalado, a extração de tópicos devolve listas vazias
+e isso fica registrado no JSON.
+
+    python benchmarks/bench_processamento.py [--tamanhos 10000 100000 1000000]
+        [--comparar benchmarks/resultados/processamento-<data>.json]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+import duckdb
+import numpy as np
+import pandas as pd
+import spacy
+
+from corpus_sintetico import gerar_corpus, salvar_corpus
+from comum.normalizacao import limpar_serie
+from processing import text_processor
+from processing.text_processor import (
+    classificar_sentimento,
+    extrair_topicos_em_lote,
+    salvar_no_banco_de_dados,
+    configurar_cache,
+)
+from processing.extract_words_from_comments import explode_words
+from processing.pipeline import executar_pipeline
+
+RESULTADOS_DIR = os.path.join(project_root, 'benchmarks', 'resultados')
+
+
+def medir(funcao, com_memoria):
+    """Executa `funcao()` e retorna (resultado, segundos, pico de memória em MB ou None)."""
+    configurar_cache()
+    inicio = time.perf_counter()
+    resultado = funcao()
+    segundos = time.perf_counter() - inicio
+
+    pico = None
+    if com_memoria:
+        configurar_cache()
+        tracemalloc.start()
+        funcao()
+        pico = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+    return resultado, segundos, pico
+
+
+def medir_corpus(linhas, semente, pasta, com_memoria):
+    """Roda todas as etapas sobre um corpus de `linhas` avaliações e retorna {etapa: métricas}."""
+    corpus = gerar_corpus(linhas, semente)
+    etapas = {}
+
+    def registrar(nome, funcao):
+        resultado, segundos, pico = medir(funcao, com_memoria)
+        etapas[nome] = {
+            "segundos": round(segundos, 4),
+            "linhas_por_segundo": round(linhas / segundos, 1) if segundos else None,
+            "pico_memoria_mb": None if pico is None else round(pico, 2),
+        }
+        memoria = "" if pico is None else f", pico {pico:8.1f} MB"
+        print(f"  {nome:<26} {segundos:9.3f} s ({linhas / segundos:12,.0f} linhas/s{memoria})")
+        return resultado
+
+    limpos = registrar("limpar_texto", lambda: limpar_serie(corpus['comentario_about_produto']))
+    df = corpus.assign(comentario_limpo=limpos)
+
+    df = registrar("classificar_sentimento", lambda: classificar_sentimento(df.copy()))
+    df['topicos'] = registrar("extrair_topicos", lambda: extrair_topicos_em_lote(df['comentario_limpo']))
+    registrar("extract_words", lambda: explode_words(df))
+
+    banco = os.path.join(pasta, f"etapa_{linhas}.duckdb")
+    registrar("salvar_no_banco_de_dados", lambda: salvar_no_banco_de_dados(
+        df[['id_produto', 'id_avaliacoes', 'id_comentario', 'rating_do_comentario',
+            'comentario_about_produto', 'sentimento', 'topicos', 'data_coleta']],
+        banco, modo="replace",
+    ))
+
+    entrada = os.path.join(pasta, f"corpus_{linhas}.csv")
+    salvar_corpus(corpus, entrada)
+
+    def pipeline_completo():
+        banco_pipeline = os.path.join(pasta, f"pipeline_{linhas}.duckdb")
+        if os.path.exists(banco_pipeline):
+            os.remove(banco_pipeline)
+        return executar_pipeline(entrada, banco_pipeline, recomecar=True)
+
+    registrar("pipeline_completo", pipeline_completo)
+    return etapas
+
+
+def ambiente():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=project_root,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    modelo = text_processor._modelo("spacy")
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "duckdb": duckdb.__version__,
+        "spacy": spacy.__version__,
+        "modelo_spacy": None if modelo is None else f"{modelo.meta['lang']}_{modelo.meta['name']}-{modelo.meta['version']}",
+    }
+
+
+def comparar(atual, caminho_anterior):
+    """Imprime a variação de tempo de cada etapa em relação a uma execução anterior."""
+    with open(caminho_anterior, encoding="utf-8") as f:
+        anterior = json.load(f)
+    antes = {(r["linhas"], etapa): m for r in anterior["resultados"] for etapa, m in r["etapas"].items()}
+
+    print(f"\nComparação com {caminho_anterior} (commit {anterior['ambiente'].get('commit')}):")
+    for resultado in atual["resultados"]:
+        for etapa, metricas in resultado["etapas"].items():
+            base = antes.get((resultado["linhas"], etapa))
+            if not base:
+                continue
+            variacao = metricas["segundos"] / base["segundos"] - 1
+            print(f"  {resultado['linhas']:>9} {etapa:<26} {base['segundos']:9.3f} s -> "
+                  f"{metricas['segundos']:9.3f} s ({variacao:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das etapas de processamento de texto.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000],
+                        help="Quantidades de avaliações dos corpora (ex.: 10000 100000 1000000).")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--sem-memoria", action="store_true",
+                        help="Não repete as etapas sob o tracemalloc (mais rápido).")
+    parser.add_argument("--saida", help="Arquivo JSON de resultados (padrão: benchmarks/resultados/).")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior para comparar os tempos.")
+    args = parser.parse_args()
+
+    relatorio = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "ambiente": ambiente(),
+        "semente": args.semente,
+        "resultados": [],
+    }
+
+    with tempfile.TemporaryDirectory() as pasta:
+        for linhas in args.tamanhos:
+            print(f"\nCorpus de {linhas:,} avaliações:")
+            etapas = medir_corpus(linhas, args.semente, pasta, not args.sem_memoria)
+            relatorio["resultados"].append({"linhas": linhas, "etapas": etapas})
+
+    # ru_maxrss é em KB no Linux
+    relatorio["pico_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    saida = args.saida or os.path.join(
+        RESULTADOS_DIR, f"processamento-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados gravados em '{saida}' (pico de RSS: {relatorio['pico_rss_mb']} MB).")
+
+    if args.comparar:
+        comparar(relatorio, args.comparar)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Gera corpora sintéticos e reprodutíveis de avaliações em português, no mesmo
+formato de `data/raw/comentarios_produtos.csv`.
+
+A distribuição das notas segue o formato em "J" das lojas online (muitas
+notas 5, algumas 1), o tamanho dos comentários segue uma lognormal (a
+maioria curta, com uma cauda de textos longos) e parte dos comentários
+repete frases prontas ("Ótimo produto!"), como acontece na coleta real.
+
+    python benchmarks/corpus_sintetico.py --linhas 100000 --saida data/raw/sintetico.csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+COLUNAS = [
+    "id_produto", "id_avaliacoes", "id_comentario", "rating_do_comentario",
+    "quantidade_avaliacoes_do_produto", "comentario_about_produto", "data_coleta",
+]
+
+# Probabilidade de cada nota (1 a 5)
+PROBABILIDADE_NOTAS = [0.12, 0.05, 0.08, 0.20, 0.55]
+
+# Fração dos comentários que são frases prontas repetidas
+FRACAO_REPETIDOS = 0.15
+
+FRASES_PRONTAS = {
+    1: ["Péssimo.", "Não recomendo", "Produto veio com defeito", "Horrível!!"],
+    2: ["Deixa a desejar", "Esperava mais", "Não gostei"],
+    3: ["Ok", "Razoável", "Cumpre o que promete, nada demais"],
+    4: ["Bom produto", "Gostei", "Muito bom, recomendo"],
+    5: ["Ótimo produto!", "Excelente", "Amei!", "Perfeito, chegou antes do prazo", "Show"],
+}
+
+PALAVRAS_POSITIVAS = [
+    "ótimo", "excelente", "bom", "maravilhoso", "perfeito", "adorei", "rápido",
+    "bonito", "resistente", "confortável", "recomendo", "satisfeito", "incrível",
+    "funciona", "prático", "eficiente", "qualidade", "barato", "lindo", "show",
+]
+PALAVRAS_NEGATIVAS = [
+    "péssimo", "ruim", "defeito", "quebrou", "atrasou", "horrível", "frágil",
+    "caro", "demorou", "decepcionado", "problema", "lento", "esquenta", "falhou",
+    "devolvi", "pior", "barulhento", "trava", "arranhado", "faltando",
+]
+PALAVRAS_NEUTRAS = [
+    "produto", "entrega", "celular", "bateria", "tela", "câmera", "geladeira",
+    "fogão", "televisão", "notebook", "preço", "loja", "caixa", "manual", "cor",
+    "tamanho", "som", "imagem", "instalação", "montagem", "uso", "dia", "semana",
+    "mês", "família", "casa", "cozinha", "sala", "presente", "marca", "modelo",
+]
+CONECTIVOS = [
+    "o", "a", "de", "que", "e", "com", "para", "muito", "bem", "não", "mas",
+    "já", "é", "foi", "está", "meu", "minha", "um", "uma", "no", "na", "pelo",
+]
+
+
+def _vocabulario_da_nota(nota):
+    """Palavras e pesos usados nos comentários de uma nota (notas altas puxam palavras positivas)."""
+    peso_positivo = {1: 0.05, 2: 0.15, 3: 0.3, 4: 0.6, 5: 0.8}[nota]
+    palavras = PALAVRAS_POSITIVAS + PALAVRAS_NEGATIVAS + PALAVRAS_NEUTRAS + CONECTIVOS
+    pesos = np.concatenate([
+        np.full(len(PALAVRAS_POSITIVAS), 0.25 * peso_positivo / len(PALAVRAS_POSITIVAS)),
+        np.full(len(PALAVRAS_NEGATIVAS), 0.25 * (1 - peso_positivo) / len(PALAVRAS_NEGATIVAS)),
+        np.full(len(PALAVRAS_NEUTRAS), 0.35 / len(PALAVRAS_NEUTRAS)),
+        np.full(len(CONECTIVOS), 0.40 / len(CONECTIVOS)),
+    ])
+    return np.array(palavras, dtype=object), pesos / pesos.sum()
+
+
+def _montar_comentario(palavras, pontuacao):
+    texto = " ".join(palavras)
+    return texto[:1].upper() + texto[1:] + pontuacao
+
+
+def gerar_corpus(linhas, semente=42, produtos=None):
+    """
+    Retorna um DataFrame com `linhas` avaliações sintéticas. A mesma `semente`
+    gera sempre o mesmo corpus. `produtos` controla quantos produtos distintos
+    existem (por padrão, um para cada 50 avaliações), com popularidade em Zipf.
+    """
+    rng = np.random.default_rng(semente)
+    produtos = produtos or max(1, linhas // 50)
+
+    notas = rng.choice(np.arange(1, 6), size=linhas, p=PROBABILIDADE_NOTAS)
+    tamanhos = np.clip(rng.lognormal(mean=2.3, sigma=0.8, size=linhas).astype(int), 1, 300)
+    repetidos = rng.random(linhas) < FRACAO_REPETIDOS
+    pontuacoes = rng.choice(np.array([".", "!", "", "!!", "..."], dtype=object), size=linhas,
+                            p=[0.4, 0.25, 0.2, 0.1, 0.05])
+
+    comentarios = np.empty(linhas, dtype=object)
+    for nota in range(1, 6):
+        da_nota = np.flatnonzero(notas == nota)
+
+        prontos = da_nota[repetidos[da_nota]]
+        frases = np.array(FRASES_PRONTAS[nota], dtype=object)
+        comentarios[prontos] = frases[rng.integers(0, len(frases), size=len(prontos))]
+
+        livres = da_nota[~repetidos[da_nota]]
+        vocabulario, pesos = _vocabulario_da_nota(nota)
+        palavras = rng.choice(vocabulario, size=int(tamanhos[livres].sum()), p=pesos)
+        fim = np.cumsum(tamanhos[livres])
+        inicio = fim - tamanhos[livres]
+        for i, a, b in zip(livres, inicio, fim):
+            comentarios[i] = _montar_comentario(palavras[a:b], pontuacoes[i])
+
+    indice_produto = (rng.zipf(1.3, size=linhas) - 1) % produtos
+    ids_produto = np.array([f"{7_000_000 + i}" for i in range(produtos)], dtype=object)
+    ids_avaliacoes = np.array([f"sku-{1_000_000 + i}" for i in range(produtos)], dtype=object)
+    quantidade_por_produto = np.bincount(indice_produto, minlength=produtos)
+
+    segundos = rng.integers(0, 30 * 24 * 3600, size=linhas)
+    datas = pd.Timestamp("2025-01-01") + pd.to_timedelta(np.sort(segundos), unit="s")
+
+    return pd.DataFrame({
+        "id_produto": ids_produto[indice_produto],
+        "id_avaliacoes": ids_avaliacoes[indice_produto],
+        "id_comentario": [f"{semente:04d}{i:010d}" for i in range(linhas)],
+        "rating_do_comentario": notas,
+        "quantidade_avaliacoes_do_produto": quantidade_por_produto[indice_produto],
+        "comentario_about_produto": comentarios,
+        "data_coleta": datas.strftime("%Y-%m-%d %H:%M:%S"),
+    }, columns=COLUNAS)
+
+
+def salvar_corpus(df, caminho):
+    """Grava o corpus como CSV separado por '|' (igual ao scraper) ou como Parquet, pela extensão."""
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    if caminho.endswith(".parquet"):
+        df.to_parquet(caminho, index=False)
+    else:
+        df.to_csv(caminho, sep="|", index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera um corpus sintético de avaliações.")
+    parser.add_argument("--linhas", type=int, default=10_000)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", required=True, help="Arquivo .csv (separado por '|') ou .parquet.")
+    args = parser.parse_args()
+
+    df = gerar_corpus(args.linhas, args.semente)
+    salvar_corpus(df, args.saida)
+    print(f"{len(df)} avaliações gravadas em '{args.saida}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import hashlib
+import os
+import time
+import uuid
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Schemas tipados dos arquivos gerados pelos scrapers
+SCHEMA_AVALIACOES = pa.schema([
+    ("categoria", pa.string()),
+    ("pesquisa", pa.string()),
+    ("titulo", pa.string()),
+    ("id_produto", pa.string()),
+    ("id_avaliacoes", pa.string()),
+    ("preco", pa.float64()),
+    ("vendedor", pa.string()),
+    ("nota_media", pa.float32()),
+    ("quantidade_avaliacoes", pa.int32()),
+])
+
+SCHEMA_COMENTARIOS = pa.schema([
+    ("id_produto", pa.string()),
+    ("id_avaliacoes", pa.string()),
+    ("id_comentario", pa.string()),
+    ("rating_do_comentario", pa.int8()),
+    ("quantidade_avaliacoes_do_produto", pa.int32()),
+    ("comentario_about_produto", pa.string()),
+    ("data_coleta", pa.timestamp("s")),
+])
+
+COLUNA_PARTICAO = "dia_coleta"
+
+
+def eh_parquet(caminho):
+    """Um caminho é tratado como Parquet se for um diretório (dataset particionado) ou terminar em .parquet."""
+    return os.path.isdir(caminho) or str(caminho).endswith(".parquet")
+
+
+def _coluna(valores, tipo):
+    """Converte uma lista de valores vindos do scraper (strings, 'N/A', '') para o tipo da coluna."""
+    if pa.types.is_string(tipo):
+        return pa.array([None if v is None else str(v) for v in valores], pa.string())
+    if pa.types.is_timestamp(tipo):
+        return pa.array([v or None for v in valores], pa.string()).cast(tipo)
+
+    convertidos = []
+    for v in valores:
+        try:
+            convertidos.append(None if v in (None, "", "N/A") else float(v))
+        except (TypeError, ValueError):
+            convertidos.append(None)
+    if pa.types.is_integer(tipo):
+        convertidos = [None if v is None else int(v) for v in convertidos]
+    return pa.array(convertidos, tipo)
+
+
+class EscritorParquet:
+    """
+    Grava linhas num dataset Parquet comprimido (zstd), particionado por dia
+    de coleta: `diretorio/dia_coleta=AAAA-MM-DD/parte-<ns>-<id>.parquet`,
+    com o horário da gravação em nanossegundos no nome, para que a ordem dos
+    nomes siga a ordem de gravação.
+
+    Tem a mesma interface dos `csv.writer`/`csv.DictWriter` usados pelos
+    scrapers (`writerow`, `writerows`, `writeheader`), aceitando listas na
+    ordem do schema ou dicionários. As linhas ficam num buffer e viram um
+    arquivo a cada `tamanho_lote` linhas; `ao_gravar` é chamado depois de cada
+    `flush` (por exemplo, para só então confirmar o estado da coleta), mesmo
+    com o buffer vazio, já que aí tudo o que foi escrito já está no disco.
+    """
+
+    def __init__(self, diretorio, schema, coluna_data=None, tamanho_lote=50_000, ao_gravar=None):
+        self.diretorio = diretorio
+        self.schema = schema
+        self.coluna_data = coluna_data
+        self.tamanho_lote = tamanho_lote
+        self.ao_gravar = ao_gravar
+        self._buffer = []
+
+    def writeheader(self):
+        pass
+
+    def writerow(self, linha):
+        if isinstance(linha, dict):
+            linha = [linha.get(campo) for campo in self.schema.names]
+        self._buffer.append(linha)
+        if len(self._buffer) >= self.tamanho_lote:
+            self.flush()
+
+    def writerows(self, linhas):
+        for linha in linhas:
+            self.writerow(linha)
+
+    def _dia(self, linha):
+        if self.coluna_data is not None:
+            valor = linha[self.schema.names.index(self.coluna_data)]
+            if valor:
+                return str(valor)[:10]
+        return datetime.now().strftime("%Y-%m-%d")
+
+    def flush(self):
+        """Grava o buffer atual (um arquivo por dia de coleta presente no buffer)."""
+        por_dia = {}
+        for linha in self._buffer:
+            por_dia.setdefault(self._dia(linha), []).append(linha)
+
+        for dia, linhas in por_dia.items():
+            colunas = [
+                _coluna([linha[i] for linha in linhas], campo.type)
+                for i, campo in enumerate(self.schema)
+            ]
+            tabela = pa.Table.from_arrays(colunas, schema=self.schema)
+            pasta = os.path.join(self.diretorio, f"{COLUNA_PARTICAO}={dia}")
+            os.makedirs(pasta, exist_ok=True)
+            nome = f"parte-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet"
+            pq.write_table(tabela, os.path.join(pasta, nome), compression="zstd")
+
+        self._buffer = []
+        if self.ao_gravar:
+            self.ao_gravar()
+
+    def close(self):
+        self.flush()
+
+
+def ler_tabela(caminho, colunas=None, dtype=None):
+    """
+    Lê um CSV separado por '|' ou um arquivo/dataset Parquet como DataFrame.
+    Com `colunas`, só essas colunas são lidas (no Parquet, as demais nem saem do disco).
+    `dtype` só se aplica ao CSV (o Parquet já guarda os tipos).
+    """
+    if eh_parquet(caminho):
+        return pd.read_parquet(caminho, columns=colunas)
+    return pd.read_csv(caminho, sep='|', on_bad_lines='skip', usecols=colunas, dtype=dtype)
+
+
+def ler_em_chunks(caminho, tamanho_chunk, colunas=None):
+    """Gera DataFrames de até `tamanho_chunk` linhas de um CSV '|' ou de um dataset Parquet."""
+    if eh_parquet(caminho):
+        dataset = ds.dataset(caminho, format="parquet", partitioning="hive")
+        for lote in dataset.to_batches(columns=colunas, batch_size=tamanho_chunk):
+            if lote.num_rows:
+                yield lote.to_pandas()
+    else:
+        yield from pd.read_csv(caminho, sep='|', on_bad_lines='skip', usecols=colunas, chunksize=tamanho_chunk)
+
+
+# Bytes do início de um CSV usados na sua impressão digital
+_PREFIXO_IMPRESSAO = 1 << 20
+
+
+def _impressao_prefixo(caminho, tamanho):
+    with open(caminho, "rb") as arquivo:
+        return hashlib.sha256(arquivo.read(tamanho)).hexdigest()
+
+
+def _arquivos_parquet(caminho):
+    if os.path.isdir(caminho):
+        return sorted(
+            os.path.relpath(os.path.join(raiz, nome), caminho)
+            for raiz, _, nomes in os.walk(caminho) for nome in nomes if nome.endswith(".parquet")
+        )
+    return [os.path.basename(caminho)]
+
+
+def partes_da_entrada(caminho):
+    """
+    Divide a entrada em partes com identidade estável, para checkpoints que
+    não dependem da ordem de leitura. Retorna [(parte, impressao)]:
+
+    - um CSV é uma parte só, com o tamanho e o hash dos primeiros bytes como
+      impressão (linhas acrescentadas no fim não a invalidam, ver
+      `impressao_confere`);
+    - um dataset Parquet tem uma parte por arquivo (o caminho relativo, em
+      ordem de nome), com tamanho e data de modificação como impressão.
+    """
+    if not eh_parquet(caminho):
+        tamanho = os.path.getsize(caminho)
+        prefixo = min(tamanho, _PREFIXO_IMPRESSAO)
+        return [("", f"{tamanho}:{prefixo}:{_impressao_prefixo(caminho, prefixo)}")]
+    base = caminho if os.path.isdir(caminho) else os.path.dirname(caminho)
+    partes = []
+    for parte in _arquivos_parquet(caminho):
+        info = os.stat(os.path.join(base, parte))
+        partes.append((parte, f"{info.st_size}:{info.st_mtime_ns}"))
+    return partes
+
+
+def impressao_confere(caminho, salva, atual):
+    """
+    Se uma parte de `caminho` ainda é a mesma de quando a impressão `salva`
+    foi tirada, dada a impressão `atual` (ambas de `partes_da_entrada`). Um
+    arquivo Parquet precisa estar intacto; um CSV confere se não encolheu e
+    os mesmos primeiros bytes continuam lá, mesmo que tenha crescido.
+    """
+    if salva == atual:
+        return True
+    if eh_parquet(caminho):
+        return False
+    tamanho, prefixo, hash_prefixo = salva.split(":")
+    return (os.path.getsize(caminho) >= int(tamanho)
+            and _impressao_prefixo(caminho, int(prefixo)) == hash_prefixo)
+
+
+def ler_parte_em_chunks(caminho, parte, tamanho_chunk, colunas=None):
+    """Gera os DataFrames de até `tamanho_chunk` linhas de uma parte de `partes_da_entrada`."""
+    if not eh_parquet(caminho):
+        yield from ler_em_chunks(caminho, tamanho_chunk, colunas)
+        return
+    if os.path.isdir(caminho):
+        dataset = ds.dataset([os.path.join(caminho, parte)], format="parquet", partitioning="hive",
+                             partition_base_dir=caminho)
+    else:
+        dataset = ds.dataset(caminho, format="parquet")
+    for lote in dataset.to_batches(columns=colunas, batch_size=tamanho_chunk):
+        if lote.num_rows:
+            yield lote.to_pandas()
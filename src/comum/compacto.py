@@ -0,0 +1,127 @@
+"""
+Tipos compactos para os DataFrames de comentários do processamento.
+
+- Campos de poucos valores distintos (`sentimento`, ids de produto,
+  `categoria`) viram categóricos: um código inteiro por linha e cada texto
+  guardado uma vez só.
+- Notas e quantidades viram inteiros pequenos (`Int8`, `Int32`).
+- Textos usam o tipo de string do pandas sobre o Arrow (um buffer contínuo,
+  sem um objeto Python por linha). Textos derivados de outro, como
+  `comentario_limpo`, são codificados por dicionário: um índice por linha e
+  cada texto distinto guardado uma vez, em vez de uma segunda cópia inteira.
+- `topicos` é uma lista do Arrow com valores codificados por dicionário: um
+  vocabulário com cada tópico uma vez, um array de índices e um array de
+  offsets por linha, no lugar de uma lista Python de strings por comentário.
+  O DuckDB lê a coluna direto como VARCHAR[].
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+SENTIMENTOS = ['Positivo', 'Neutro', 'Negativo']
+
+TIPO_TEXTO = pd.StringDtype("pyarrow")
+TIPO_TEXTO_CODIFICADO = pd.ArrowDtype(pa.dictionary(pa.int32(), pa.string()))
+TIPO_SENTIMENTO = pd.CategoricalDtype(SENTIMENTOS)
+TIPO_TOPICOS = pd.ArrowDtype(pa.list_(pa.dictionary(pa.int32(), pa.string())))
+
+COLUNAS_CATEGORICAS = ['id_produto', 'id_avaliacoes', 'categoria', 'pesquisa', 'vendedor']
+COLUNAS_TEXTO = ['id_comentario', 'comentario_about_produto', 'titulo', 'data_coleta']
+COLUNAS_INTEIRAS = {'rating_do_comentario': 'Int8', 'quantidade_avaliacoes_do_produto': 'Int32'}
+
+
+def categorica(serie):
+    """Series categórica com as categorias em string do Arrow (valores numéricos viram texto)."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie
+    return serie.astype(TIPO_TEXTO).astype("category")
+
+
+def compactar(df):
+    """
+    Converte as colunas conhecidas de `df` (as que existirem) para os tipos
+    compactos. Colunas que já estão no tipo certo não são copiadas.
+    """
+    convertidas = {}
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna in df.columns:
+            convertidas[coluna] = categorica(df[coluna])
+    for coluna in COLUNAS_TEXTO:
+        if coluna in df.columns and df[coluna].dtype != TIPO_TEXTO:
+            convertidas[coluna] = df[coluna].astype(TIPO_TEXTO)
+    for coluna, tipo in COLUNAS_INTEIRAS.items():
+        if coluna in df.columns and df[coluna].dtype != tipo:
+            convertidas[coluna] = pd.to_numeric(df[coluna], errors='coerce').astype(tipo)
+    if 'sentimento' in df.columns and df['sentimento'].dtype != TIPO_SENTIMENTO:
+        convertidas['sentimento'] = df['sentimento'].astype(TIPO_SENTIMENTO)
+    return df.assign(**convertidas) if convertidas else df
+
+
+def _eh_codificado(serie):
+    return isinstance(serie.dtype, pd.ArrowDtype) and pa.types.is_dictionary(serie.dtype.pyarrow_dtype)
+
+
+def codigos_e_unicos(serie):
+    """
+    Retorna (códigos, únicos): os valores distintos que aparecem em `serie`
+    (uma Series de texto do Arrow) e a posição de cada linha entre eles.
+    Numa Series codificada por dicionário, vem direto dos índices, sem
+    decodificar o texto de cada linha. Nulos contam como um valor distinto.
+    """
+    if _eh_codificado(serie):
+        pedacos = serie.array.__arrow_array__().chunks
+        if len(pedacos) == 1 and pedacos[0].null_count == 0:
+            usados, codigos = np.unique(pedacos[0].indices.to_numpy(), return_inverse=True)
+            unicos = pedacos[0].dictionary.take(pa.array(usados, pa.int64()))
+            return codigos.astype(np.int64), pd.Series(unicos.to_pandas(), dtype=TIPO_TEXTO)
+    codigos, unicos = pd.factorize(serie.to_numpy(dtype=object), use_na_sentinel=False)
+    return codigos, pd.Series(unicos, dtype=TIPO_TEXTO)
+
+
+def por_valor_unico(serie, funcao):
+    """
+    Aplica `funcao` (de uma Series de valores distintos em um array alinhado
+    com ela) uma vez por valor distinto de `serie` e devolve o resultado de
+    cada linha. Textos repetidos ("Ótimo produto!") são processados uma vez só.
+    """
+    codigos, unicos = codigos_e_unicos(serie)
+    return np.asarray(funcao(unicos))[codigos]
+
+
+def aplicar_nos_unicos(serie, funcao):
+    """
+    Aplica `funcao` (de Series de texto em Series de texto) só aos valores
+    distintos de `serie` e devolve o resultado codificado por dicionário
+    (`TIPO_TEXTO_CODIFICADO`), alinhado com a entrada.
+    """
+    codigos, unicos = codigos_e_unicos(serie)
+    codigos_resultado, valores = pd.factorize(funcao(unicos).to_numpy(dtype=object))
+    indices = codigos_resultado[codigos]
+    codificado = pa.DictionaryArray.from_arrays(
+        pa.array(indices, pa.int32(), mask=indices < 0), pa.array(valores, pa.string())
+    )
+    return pd.Series(pd.arrays.ArrowExtensionArray(codificado), index=serie.index)
+
+
+def codificar_topicos(codigos, topicos_unicos, index=None):
+    """
+    Monta a coluna `topicos` a partir dos tópicos de cada texto distinto
+    (`topicos_unicos`, uma lista de listas) e do código do texto de cada linha
+    (`codigos`, posições em `topicos_unicos`). Nenhuma lista é criada por
+    linha: os índices de cada linha são copiados dos do seu texto em bloco.
+    """
+    codigos = np.asarray(codigos, dtype=np.int64)
+    tamanhos_unicos = np.fromiter(map(len, topicos_unicos), dtype=np.int64, count=len(topicos_unicos))
+    planos = [topico for topicos in topicos_unicos for topico in topicos]
+    indices_unicos, vocabulario = pd.factorize(pd.Series(planos, dtype=object))
+    inicios_unicos = np.concatenate(([0], np.cumsum(tamanhos_unicos)[:-1]))
+
+    tamanhos = tamanhos_unicos[codigos] if len(codigos) else np.zeros(0, dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(tamanhos)))
+    posicoes = (np.repeat(inicios_unicos[codigos] - offsets[:-1], tamanhos)
+                + np.arange(offsets[-1], dtype=np.int64))
+    valores = pa.DictionaryArray.from_arrays(
+        pa.array(indices_unicos[posicoes], pa.int32()), pa.array(vocabulario.astype(object), pa.string())
+    )
+    lista = pa.ListArray.from_arrays(pa.array(offsets, pa.int32()), valores)
+    return pd.Series(pd.arrays.ArrowExtensionArray(lista), index=index, dtype=TIPO_TOPICOS)
@@ -0,0 +1,269 @@
+import functools
+import json
+import os
+import resource
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# Limites superiores (ms) das faixas do histograma de latência; a última faixa é "acima de 30 s"
+LIMITES_LATENCIA_MS = [10, 25, 50, 100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000, 7500, 10000, 15000, 30000]
+
+TABELA_RESUMO = "resumo_execucoes"
+
+_COLUNAS_RESUMO = """
+    execucao VARCHAR, programa VARCHAR, inicio TIMESTAMP, fim TIMESTAMP, tipo VARCHAR, nome VARCHAR,
+    quantidade BIGINT, em_cache BIGINT, falhas BIGINT, novas_tentativas BIGINT, bytes BIGINT,
+    custo_proxy DOUBLE, latencia_media_ms DOUBLE, latencia_p50_ms DOUBLE, latencia_p95_ms DOUBLE,
+    latencia_max_ms DOUBLE, histograma_latencia JSON, status JSON, linhas BIGINT, segundos DOUBLE,
+    linhas_por_segundo DOUBLE, pico_memoria_mb DOUBLE
+"""
+
+
+def _pico_rss_mb():
+    """Pico de memória residente do processo até agora (ru_maxrss é em KB no Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentil(histograma, total, fracao):
+    """Estimativa do percentil pelo limite superior da faixa do histograma em que ele cai."""
+    alvo = fracao * total
+    acumulado = 0
+    for limite, quantidade in zip(LIMITES_LATENCIA_MS + [None], histograma):
+        acumulado += quantidade
+        if acumulado >= alvo:
+            return limite
+    return None
+
+
+class Metricas:
+    """
+    Coleta as métricas de uma execução (de um scraper ou do pipeline):
+    latência, status, tentativas e bytes de cada requisição HTTP, com o custo
+    do proxy, e linhas/s e pico de memória de cada etapa de processamento.
+
+    Cada evento vira uma linha JSON em `diretorio_logs/<execucao>.jsonl`
+    (quando informado); `finalizar` imprime o resumo e grava uma linha por
+    fonte/etapa na tabela `resumo_execucoes` de um banco DuckDB.
+    """
+
+    def __init__(self, programa="", diretorio_logs=None, custo_por_requisicao=0.0):
+        self.programa = programa
+        self.execucao = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.inicio = datetime.now()
+        self.custo_por_requisicao = custo_por_requisicao
+        self.requisicoes = {}
+        self.etapas = {}
+        self._trava = threading.Lock()
+        self._log = None
+        if diretorio_logs:
+            os.makedirs(diretorio_logs, exist_ok=True)
+            self.caminho_log = os.path.join(diretorio_logs, f"{programa or 'execucao'}-{self.execucao}.jsonl")
+            self._log = open(self.caminho_log, "a", encoding="utf-8")
+
+    def _registrar_log(self, evento):
+        if self._log is None:
+            return
+        evento = {"ts": datetime.now().isoformat(timespec="milliseconds"), "execucao": self.execucao, **evento}
+        linha = json.dumps(evento, ensure_ascii=False)
+        with self._trava:
+            self._log.write(linha + "\n")
+            self._log.flush()
+
+    # --- Requisições HTTP ---
+
+    def registrar_requisicao(self, fonte, url, latencia, status=None, tentativa=1, tamanho=0,
+                             erro=None, em_cache=False, proxy=False, por_tentativa=False):
+        """
+        Registra uma requisição (ou um acerto no cache, com `em_cache`).
+        `latencia` é em segundos. `tentativa` é o número de tentativas que a
+        requisição levou até esta resposta (1 + o histórico de novas
+        tentativas do urllib3) e soma `tentativa - 1` novas tentativas. Com
+        `por_tentativa`, o chamador registra cada tentativa à parte (o laço de
+        novas tentativas é dele), e cada uma com `tentativa` > 1 soma uma só.
+        Com `proxy`, respostas bem-sucedidas somam `custo_por_requisicao`.
+        """
+        latencia_ms = latencia * 1000
+        with self._trava:
+            dados = self.requisicoes.setdefault(fonte, {
+                "requisicoes": 0, "em_cache": 0, "falhas": 0, "novas_tentativas": 0, "bytes": 0,
+                "custo": 0.0, "latencia_total_ms": 0.0, "latencia_max_ms": 0.0,
+                "histograma": [0] * (len(LIMITES_LATENCIA_MS) + 1), "status": Counter(),
+            })
+            if em_cache:
+                dados["em_cache"] += 1
+            else:
+                dados["requisicoes"] += 1
+                dados["novas_tentativas"] += int(tentativa > 1) if por_tentativa else tentativa - 1
+                dados["bytes"] += tamanho
+                dados["latencia_total_ms"] += latencia_ms
+                dados["latencia_max_ms"] = max(dados["latencia_max_ms"], latencia_ms)
+                faixa = next((i for i, limite in enumerate(LIMITES_LATENCIA_MS) if latencia_ms <= limite),
+                             len(LIMITES_LATENCIA_MS))
+                dados["histograma"][faixa] += 1
+                dados["status"][str(status) if status is not None else "erro"] += 1
+                if erro is not None or (status is not None and status >= 400):
+                    dados["falhas"] += 1
+                elif proxy:
+                    dados["custo"] += self.custo_por_requisicao
+
+        self._registrar_log({
+            "evento": "requisicao", "fonte": fonte, "url": url, "status": status, "tentativa": tentativa,
+            "latencia_ms": round(latencia_ms, 1), "bytes": tamanho, "em_cache": em_cache,
+            "erro": None if erro is None else str(erro),
+        })
+
+    # --- Etapas de processamento ---
+
+    def registrar_etapa(self, nome, linhas, segundos):
+        pico = _pico_rss_mb()
+        with self._trava:
+            dados = self.etapas.setdefault(nome, {"chamadas": 0, "linhas": 0, "segundos": 0.0, "pico_memoria_mb": 0.0})
+            dados["chamadas"] += 1
+            dados["linhas"] += linhas
+            dados["segundos"] += segundos
+            dados["pico_memoria_mb"] = max(dados["pico_memoria_mb"], pico)
+
+        self._registrar_log({
+            "evento": "etapa", "nome": nome, "linhas": linhas, "segundos": round(segundos, 4),
+            "linhas_por_segundo": round(linhas / segundos, 1) if segundos else None,
+            "pico_memoria_mb": round(pico, 1),
+        })
+
+    @contextmanager
+    def etapa(self, nome, linhas=0):
+        """
+        Mede o tempo de um bloco. O dicionário devolvido pode ter `linhas`
+        atualizado dentro do bloco, quando o total só é conhecido no fim.
+        """
+        registro = {"linhas": linhas}
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        finally:
+            self.registrar_etapa(nome, registro["linhas"], time.perf_counter() - inicio)
+
+    # --- Resumo ---
+
+    def resumo(self):
+        """Uma linha (dicionário) por fonte de requisições e por etapa, no formato da tabela de resumo."""
+        base = {"execucao": self.execucao, "programa": self.programa, "inicio": self.inicio, "fim": datetime.now()}
+        linhas = []
+        with self._trava:
+            for fonte, dados in self.requisicoes.items():
+                total = dados["requisicoes"]
+                linhas.append({
+                    **base, "tipo": "requisicao", "nome": fonte, "quantidade": total,
+                    "em_cache": dados["em_cache"], "falhas": dados["falhas"],
+                    "novas_tentativas": dados["novas_tentativas"], "bytes": dados["bytes"],
+                    "custo_proxy": round(dados["custo"], 6),
+                    "latencia_media_ms": dados["latencia_total_ms"] / total if total else None,
+                    "latencia_p50_ms": _percentil(dados["histograma"], total, 0.50) if total else None,
+                    "latencia_p95_ms": _percentil(dados["histograma"], total, 0.95) if total else None,
+                    "latencia_max_ms": dados["latencia_max_ms"] if total else None,
+                    "histograma_latencia": json.dumps(dict(zip(
+                        [str(limite) for limite in LIMITES_LATENCIA_MS] + ["inf"], dados["histograma"]
+                    ))),
+                    "status": json.dumps(dict(dados["status"])),
+                    "linhas": None, "segundos": None, "linhas_por_segundo": None, "pico_memoria_mb": None,
+                })
+            for nome, dados in self.etapas.items():
+                linhas.append({
+                    **base, "tipo": "etapa", "nome": nome, "quantidade": dados["chamadas"],
+                    "em_cache": None, "falhas": None, "novas_tentativas": None, "bytes": None,
+                    "custo_proxy": None, "latencia_media_ms": None, "latencia_p50_ms": None,
+                    "latencia_p95_ms": None, "latencia_max_ms": None, "histograma_latencia": None,
+                    "status": None, "linhas": dados["linhas"], "segundos": dados["segundos"],
+                    "linhas_por_segundo": dados["linhas"] / dados["segundos"] if dados["segundos"] else None,
+                    "pico_memoria_mb": dados["pico_memoria_mb"],
+                })
+        return linhas
+
+    def imprimir_resumo(self):
+        print(f"\nMétricas da execução {self.execucao}:")
+        for linha in self.resumo():
+            if linha["tipo"] == "requisicao":
+                latencia = ""
+                if linha["quantidade"]:
+                    latencia = f", p50 <= {linha['latencia_p50_ms']} ms, p95 <= {linha['latencia_p95_ms']} ms"
+                print(f"  [{linha['nome']}] {linha['quantidade']} requisições ({linha['em_cache']} em cache), "
+                      f"{linha['falhas']} falhas, {linha['novas_tentativas']} novas tentativas, "
+                      f"{linha['bytes'] / 1024 / 1024:.1f} MB{latencia}, custo do proxy {linha['custo_proxy']:.4f}, "
+                      f"status {linha['status']}")
+            else:
+                velocidade = linha["linhas_por_segundo"] or 0
+                print(f"  [{linha['nome']}] {linha['linhas']} linhas em {linha['segundos']:.2f} s "
+                      f"({velocidade:,.0f} linhas/s), pico de memória {linha['pico_memoria_mb']:.0f} MB")
+
+    def gravar_resumo(self, db_path, tabela=TABELA_RESUMO):
+        """Acrescenta o resumo desta execução à tabela `tabela` do banco DuckDB `db_path`."""
+        import duckdb
+        import pandas as pd
+
+        linhas = self.resumo()
+        if not linhas:
+            return 0
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        df = pd.DataFrame(linhas)
+        with duckdb.connect(db_path) as con:
+            con.register("resumo_df", df)
+            con.execute(f'CREATE TABLE IF NOT EXISTS "{tabela}" ({_COLUNAS_RESUMO})')
+            con.execute(f'INSERT INTO "{tabela}" BY NAME SELECT * FROM resumo_df')
+            con.unregister("resumo_df")
+        return len(linhas)
+
+    def finalizar(self, db_path=None, tentativas=10):
+        """
+        Imprime o resumo, grava-o no DuckDB (se `db_path`) e fecha o log. O
+        DuckDB aceita um processo escritor por vez: se outro programa (por
+        exemplo, uma etapa paralela do orquestrador) estiver com o banco
+        aberto, tenta de novo até `tentativas` vezes.
+        """
+        self.imprimir_resumo()
+        if db_path:
+            for tentativa in range(1, tentativas + 1):
+                try:
+                    self.gravar_resumo(db_path)
+                    break
+                except Exception as e:
+                    if "lock" in str(e).lower() and tentativa < tentativas:
+                        time.sleep(0.5 * tentativa)
+                        continue
+                    print(f"Não foi possível gravar o resumo das métricas em '{db_path}': {e}")
+                    break
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+# Métricas da execução atual (só em memória até `configurar_metricas` ser chamada)
+_atual = Metricas()
+
+
+def configurar_metricas(programa, diretorio_logs=None, custo_por_requisicao=0.0):
+    """Inicia as métricas de uma nova execução, gravando o log estruturado em `diretorio_logs`."""
+    global _atual
+    _atual = Metricas(programa, diretorio_logs, custo_por_requisicao)
+    return _atual
+
+
+def obter_metricas():
+    return _atual
+
+
+def medir_etapa(nome):
+    """
+    Decorador que registra o tempo de uma função de processamento como a etapa
+    `nome`; o número de linhas é o tamanho do primeiro argumento (DataFrame ou Series).
+    """
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            linhas = len(args[0]) if args and hasattr(args[0], "__len__") else 0
+            with _atual.etapa(nome, linhas):
+                return funcao(*args, **kwargs)
+        return envoltorio
+    return decorador
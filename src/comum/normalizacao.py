@@ -0,0 +1,108 @@
+import re
+
+from unidecode import unidecode
+
+# Caracteres mantidos por `filtrar_palavras`: letras (inclusive acentuadas) e espaços
+_regex_nao_palavra = re.compile(r'[^a-záéíóúãõçà\s]')
+_regex_nao_letra = re.compile(r'[^a-z\s]')
+
+
+class TabelaTraducao(dict):
+    """
+    Tabela para `str.translate` que calcula a tradução de cada caractere na
+    primeira vez em que ele aparece e guarda o resultado.
+
+    `funcao` recebe um caractere e devolve a string que o substitui. Como o
+    `str.translate` consulta a tabela pelo código do caractere, o resultado de
+    `texto.translate(tabela)` é o mesmo de aplicar `funcao` a cada caractere,
+    mas sem regex nem chamadas em Python para os caracteres já vistos.
+
+    `traduzir` ainda tem um caminho mais rápido para textos em Latin-1 (o caso
+    comum em português): os 256 primeiros caracteres viram uma tabela de
+    `bytes.translate`, que roda inteira em C.
+    """
+
+    def __init__(self, funcao):
+        super().__init__()
+        self.funcao = funcao
+
+        saidas = {codigo: self[codigo] for codigo in range(256)}
+        ocupados = {ord(v) for v in saidas.values() if v is not None and len(v) == 1 and ord(v) < 256}
+        # Marca os caracteres que viram mais de um (ex.: 'ß' -> 'ss'); esses textos usam o dicionário
+        self._sentinela = next(v for v in range(255, -1, -1) if v not in ocupados)
+        tabela = bytearray(range(256))
+        remover = bytearray()
+        for codigo, valor in saidas.items():
+            if valor is None:
+                remover.append(codigo)
+            elif len(valor) == 1 and ord(valor) < 256:
+                tabela[codigo] = ord(valor)
+            else:
+                tabela[codigo] = self._sentinela
+        self._tabela_bytes = bytes(tabela)
+        self._remover_bytes = bytes(remover)
+
+    def __missing__(self, codigo):
+        # None (e não '') para remoções: mantém o caminho rápido do translate para textos ASCII
+        valor = self.funcao(chr(codigo)) or None
+        self[codigo] = valor
+        return valor
+
+    def traduzir(self, texto):
+        """Equivale a `texto.translate(self)`."""
+        try:
+            convertido = texto.encode("latin-1").translate(self._tabela_bytes, self._remover_bytes)
+        except UnicodeEncodeError:
+            return texto.translate(self)
+        if self._sentinela in convertido:
+            return texto.translate(self)
+        return convertido.decode("latin-1")
+
+
+def _limpar_caractere(caractere):
+    return _regex_nao_letra.sub('', unidecode(caractere.lower()))
+
+
+def _filtrar_caractere(caractere):
+    return _regex_nao_palavra.sub('', caractere.lower())
+
+
+# Minúsculas, sem acentos e só com letras a-z e espaços (mesmo resultado do `limpar_texto` original)
+TABELA_LIMPEZA = TabelaTraducao(_limpar_caractere)
+
+# Minúsculas, mantendo as letras acentuadas do português (usada na extração de palavras)
+TABELA_PALAVRAS = TabelaTraducao(_filtrar_caractere)
+
+# Remove o delimitador '|' do CSV (quebras de linha são tratadas junto com os espaços)
+TABELA_SANITIZACAO = {ord('|'): None}
+
+
+def limpar_texto(texto):
+    """Converte para minúsculas, remove acentos e tudo que não for letra ou espaço."""
+    return TABELA_LIMPEZA.traduzir(str(texto))
+
+
+def filtrar_palavras(texto):
+    """Converte para minúsculas e remove pontuação, mantendo as letras acentuadas."""
+    return TABELA_PALAVRAS.traduzir(texto)
+
+
+def sanitizar_texto(texto):
+    """Remove '|' e quebras de linha e colapsa espaços, deixando o texto numa linha só."""
+    if texto is None:
+        return ""
+    return " ".join(str(texto).translate(TABELA_SANITIZACAO).split())
+
+
+def limpar_serie(serie):
+    """Versão em lote de `limpar_texto` para uma Series inteira (valores nulos viram 'nan', como antes)."""
+    return serie.map(limpar_texto)
+
+
+def filtrar_palavras_serie(serie):
+    """
+    Versão em lote de `filtrar_palavras`; valores que não são texto viram NaN.
+    Usa o acessor `.str`, que no tipo de texto do pandas (Arrow) já roda
+    vetorizado e é mais rápido que o translate; o resultado é o mesmo.
+    """
+    return serie.str.lower().str.replace(_regex_nao_palavra, '', regex=True)
@@ -0,0 +1,355 @@
+"""
+Executa a atualização completa, da coleta até as tabelas do BI, sem
+intervenção: cada etapa (scrapers, classificação de sentimento, extração de
+palavras e de tópicos) é um nó de um grafo de dependências com entradas e
+saídas declaradas.
+
+- Etapas independentes rodam em paralelo (até `--paralelo` ao mesmo tempo):
+  a coleta de avaliações dos produtos já resolvidos acompanha a coleta das
+  páginas de produtos, e a extração de palavras acompanha a de tópicos. O
+  tempo total fica próximo ao do caminho crítico do grafo.
+- Uma etapa de processamento é pulada quando as suas entradas (tamanho e
+  data de modificação de cada arquivo) e o comando são os mesmos da última
+  execução bem-sucedida e as saídas existem. As etapas de coleta dependem do
+  site e sempre rodam (os próprios scrapers pulam o que já foi coletado).
+- A saída de cada etapa vai para `data/logs/orquestrador-<etapa>.log`. Se uma
+  etapa falha, as que dependem dela são canceladas e o programa termina com
+  código 1.
+
+    python src/orquestrador.py [--paralelo 4] [--sem-coleta] [--apenas sentimento palavras] [--forcar]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, List, Optional
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(script_dir, '..'))
+
+from comum.metricas import configurar_metricas
+
+raw_dir = os.path.join(project_root, 'data', 'raw')
+output_dir = os.path.join(project_root, 'data', 'output')
+logs_dir = os.path.join(project_root, 'data', 'logs')
+estado_json = os.path.join(output_dir, 'orquestrador.json')
+metricas_db = os.path.join(output_dir, 'metricas.duckdb')
+
+GET_PRODUCTS = os.path.join(script_dir, 'scrapping', 'get_products.py')
+GET_REVIEWS = os.path.join(script_dir, 'scrapping', 'get_reviews.py')
+PIPELINE = os.path.join(script_dir, 'processing', 'pipeline.py')
+EXTRACT_WORDS = os.path.join(script_dir, 'processing', 'extract_words_from_comments.py')
+
+CONCLUIDA = "concluída"
+PULADA = "pulada"
+FALHOU = "falhou"
+CANCELADA = "cancelada"
+
+
+@dataclass
+class Etapa:
+    """
+    Um nó do grafo. Roda `comando` (um script Python e seus argumentos) ou,
+    para passos triviais, `funcao` no próprio processo. `depende` lista as
+    etapas que precisam terminar antes; `entradas` e `saidas` definem quando
+    a etapa pode ser pulada. Etapas `externas` (coleta) nunca são puladas.
+    """
+    nome: str
+    entradas: List[str]
+    saidas: List[str]
+    comando: Optional[List[str]] = None
+    funcao: Optional[Callable[[], None]] = None
+    depende: List[str] = field(default_factory=list)
+    externa: bool = False
+
+    def descricao(self):
+        if self.comando:
+            return " ".join(os.path.relpath(parte, project_root) if os.path.isabs(parte) else parte
+                            for parte in self.comando)
+        return self.funcao.__name__
+
+
+def copiar_atomico(origem, destino):
+    """
+    Copia um arquivo (ou diretório Parquet) para `destino` trocando-o de uma
+    vez no fim. Sem a origem, cria um CSV vazio: não há produtos resolvidos.
+    """
+    temporario = f"{destino}.tmp"
+    shutil.rmtree(temporario, ignore_errors=True)
+    if os.path.isdir(origem):
+        shutil.copytree(origem, temporario)
+        shutil.rmtree(destino, ignore_errors=True)
+    elif os.path.exists(origem):
+        shutil.copyfile(origem, temporario)
+    else:
+        open(temporario, "w", encoding="utf-8").close()
+    os.replace(temporario, destino)
+
+
+def definir_etapas(formato="csv"):
+    """O grafo da atualização completa, com os caminhos do `formato` de saída dos scrapers."""
+    extensao = "" if formato == "parquet" else ".csv"
+    produtos = os.path.join(raw_dir, 'produtos_casasbahia.csv')
+    avaliacoes = os.path.join(raw_dir, f'avaliacoes_casasbahia{extensao}')
+    # Cópia dos produtos já resolvidos, lida enquanto get_products reescreve `avaliacoes`
+    resolvidos = os.path.join(raw_dir, f'avaliacoes_resolvidas{extensao}')
+    comentarios = os.path.join(raw_dir, f'comentarios_produtos{extensao}')
+    classificados = os.path.join(output_dir, 'comentarios_classificados.parquet')
+    banco = os.path.join(output_dir, 'reviews.duckdb')
+    formato_scrapers = ["--formato", formato]
+
+    def copiar_resolvidos():
+        copiar_atomico(avaliacoes, resolvidos)
+
+    return [
+        Etapa("copiar_resolvidos", [avaliacoes], [resolvidos], funcao=copiar_resolvidos),
+        Etapa("produtos", [produtos], [avaliacoes], [GET_PRODUCTS, *formato_scrapers],
+              depende=["copiar_resolvidos"], externa=True),
+        Etapa("avaliacoes_resolvidas", [resolvidos], [comentarios],
+              [GET_REVIEWS, *formato_scrapers, "--entrada", resolvidos],
+              depende=["copiar_resolvidos"], externa=True),
+        # Os produtos já verificados por avaliacoes_resolvidas são pulados (--ignorar-recentes)
+        Etapa("avaliacoes_novas", [avaliacoes], [comentarios], [GET_REVIEWS, *formato_scrapers],
+              depende=["produtos", "avaliacoes_resolvidas"], externa=True),
+        Etapa("sentimento", [comentarios], [classificados],
+              [PIPELINE, "--etapa", "sentimento", "--entrada", comentarios, "--saida", classificados,
+               "--incremental"],
+              depende=["avaliacoes_novas"]),
+        Etapa("palavras", [classificados],
+              [os.path.join(output_dir, nome) for nome in (
+                  'palavras_positivas.csv', 'palavras_negativas.csv',
+                  'palavras_por_sentimento.parquet', 'palavras_por_produto.parquet',
+              )],
+              [EXTRACT_WORDS, "--agregado", "parquet"],
+              depende=["sentimento"]),
+        Etapa("topicos", [classificados, avaliacoes], [banco],
+              [PIPELINE, "--entrada", classificados, "--produtos", avaliacoes, "--incremental"],
+              depende=["sentimento", "produtos"]),
+    ]
+
+
+def impressao_digital(etapa):
+    """Resumo das entradas (tamanho e data de modificação de cada arquivo) e do comando da etapa."""
+    arquivos = []
+    for caminho in etapa.entradas:
+        if os.path.isdir(caminho):
+            for raiz, _, nomes in os.walk(caminho):
+                for nome in nomes:
+                    arquivos.append(os.path.join(raiz, nome))
+        else:
+            arquivos.append(caminho)
+    partes = [etapa.descricao()]
+    for arquivo in sorted(arquivos):
+        if os.path.exists(arquivo):
+            info = os.stat(arquivo)
+            partes.append(f"{os.path.relpath(arquivo, project_root)}:{info.st_size}:{info.st_mtime_ns}")
+        else:
+            partes.append(f"{os.path.relpath(arquivo, project_root)}:ausente")
+    return hashlib.sha256("\n".join(partes).encode("utf-8")).hexdigest()
+
+
+def validar_grafo(etapas):
+    """Confere que as dependências existem e não formam ciclos."""
+    por_nome = {etapa.nome: etapa for etapa in etapas}
+    visitando, visitadas = set(), set()
+
+    def visitar(nome, caminho):
+        if nome in visitadas:
+            return
+        if nome in visitando:
+            raise ValueError(f"Ciclo entre as etapas: {' -> '.join(caminho + [nome])}")
+        visitando.add(nome)
+        for dependencia in por_nome[nome].depende:
+            if dependencia not in por_nome:
+                raise ValueError(f"A etapa '{nome}' depende de '{dependencia}', que não existe.")
+            visitar(dependencia, caminho + [nome])
+        visitando.discard(nome)
+        visitadas.add(nome)
+
+    for etapa in etapas:
+        visitar(etapa.nome, [])
+
+
+def caminho_critico(etapas, duracoes):
+    """A sequência de dependências de maior duração somada (etapas puladas contam 0). Retorna (nomes, segundos)."""
+    por_nome = {etapa.nome: etapa for etapa in etapas}
+    melhor = {}
+
+    def calcular(nome):
+        if nome not in melhor:
+            anteriores = [calcular(dependencia) for dependencia in por_nome[nome].depende if dependencia in por_nome]
+            total, caminho = max(anteriores, default=(0.0, []))
+            melhor[nome] = (total + duracoes.get(nome, 0.0), caminho + [nome])
+        return melhor[nome]
+
+    total, caminho = max((calcular(etapa.nome) for etapa in etapas), default=(0.0, []))
+    return caminho, total
+
+
+class Orquestrador:
+    def __init__(self, etapas, paralelo=4, forcar=False, caminho_estado=estado_json):
+        self.etapas = etapas
+        self.paralelo = paralelo
+        self.forcar = forcar
+        self.caminho_estado = caminho_estado
+        self.estado = {}
+        if os.path.exists(caminho_estado):
+            with open(caminho_estado, encoding="utf-8") as arquivo:
+                self.estado = json.load(arquivo)
+        self.situacao = {}
+        self.duracoes = {}
+        self._trava = threading.Lock()
+
+    def _avisar(self, mensagem):
+        # Etapas paralelas escrevem no terminal ao mesmo tempo
+        with self._trava:
+            print(mensagem, flush=True)
+
+    def _gravar_estado(self, nome, impressao):
+        with self._trava:
+            self.estado[nome] = {"impressao": impressao, "concluida_em": datetime.now().isoformat(timespec="seconds")}
+            os.makedirs(os.path.dirname(self.caminho_estado), exist_ok=True)
+            temporario = f"{self.caminho_estado}.tmp"
+            with open(temporario, "w", encoding="utf-8") as arquivo:
+                json.dump(self.estado, arquivo, ensure_ascii=False, indent=2)
+            os.replace(temporario, self.caminho_estado)
+
+    def pode_pular(self, etapa, impressao):
+        if self.forcar or etapa.externa:
+            return False
+        anterior = self.estado.get(etapa.nome, {}).get("impressao")
+        return anterior == impressao and all(os.path.exists(saida) for saida in etapa.saidas)
+
+    def executar_etapa(self, etapa):
+        """Roda uma etapa (ou a pula). Retorna a situação final."""
+        impressao = impressao_digital(etapa)
+        if self.pode_pular(etapa, impressao):
+            self._avisar(f"[{etapa.nome}] entradas sem mudança, pulada.")
+            return PULADA
+
+        self._avisar(f"[{etapa.nome}] iniciando: {etapa.descricao()}")
+        inicio = time.perf_counter()
+        if etapa.funcao is not None:
+            try:
+                etapa.funcao()
+                sucesso = True
+            except Exception as e:
+                self._avisar(f"[{etapa.nome}] erro: {e}")
+                sucesso = False
+        else:
+            os.makedirs(logs_dir, exist_ok=True)
+            caminho_log = os.path.join(logs_dir, f"orquestrador-{etapa.nome}.log")
+            with open(caminho_log, "w", encoding="utf-8") as log:
+                processo = subprocess.run([sys.executable, *etapa.comando], cwd=project_root,
+                                          stdout=log, stderr=subprocess.STDOUT)
+            sucesso = processo.returncode == 0
+            if not sucesso:
+                self._avisar(f"[{etapa.nome}] código de saída {processo.returncode}; veja '{caminho_log}'.")
+        self.duracoes[etapa.nome] = time.perf_counter() - inicio
+
+        if not sucesso:
+            return FALHOU
+        # A impressão é das entradas lidas no início: mudanças durante a execução não passam despercebidas
+        self._gravar_estado(etapa.nome, impressao)
+        self._avisar(f"[{etapa.nome}] concluída em {self.duracoes[etapa.nome]:.1f} s.")
+        return CONCLUIDA
+
+    def executar(self):
+        """Executa o grafo inteiro. Retorna True se nenhuma etapa falhou."""
+        nomes = {etapa.nome for etapa in self.etapas}
+        # Dependências fora da seleção (--apenas, --sem-coleta) são consideradas satisfeitas
+        pendentes = {etapa.nome: {d for d in etapa.depende if d in nomes} for etapa in self.etapas}
+        por_nome = {etapa.nome: etapa for etapa in self.etapas}
+        em_execucao = {}
+
+        with ThreadPoolExecutor(self.paralelo) as executor:
+            while pendentes or em_execucao:
+                prontas = [nome for nome, dependencias in pendentes.items() if not dependencias]
+                for nome in prontas:
+                    del pendentes[nome]
+                    em_execucao[executor.submit(self.executar_etapa, por_nome[nome])] = nome
+
+                concluidas, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+                for futuro in concluidas:
+                    nome = em_execucao.pop(futuro)
+                    self.situacao[nome] = futuro.result()
+                    if self.situacao[nome] == FALHOU:
+                        self._cancelar_dependentes(nome, pendentes)
+                    else:
+                        for dependencias in pendentes.values():
+                            dependencias.discard(nome)
+
+        return FALHOU not in self.situacao.values()
+
+    def _cancelar_dependentes(self, nome, pendentes):
+        for dependente in [d for d, dependencias in pendentes.items() if nome in dependencias]:
+            if dependente in pendentes:
+                del pendentes[dependente]
+                self.situacao[dependente] = CANCELADA
+                self._avisar(f"[{dependente}] cancelada: depende de '{nome}', que não terminou.")
+                self._cancelar_dependentes(dependente, pendentes)
+
+    def imprimir_resumo(self, segundos):
+        print("\nResumo:")
+        for etapa in self.etapas:
+            duracao = self.duracoes.get(etapa.nome)
+            tempo = f"{duracao:8.1f} s" if duracao is not None else " " * 10
+            print(f"  {etapa.nome:<22} {self.situacao.get(etapa.nome, '-'):<10} {tempo}")
+        caminho, total = caminho_critico(self.etapas, self.duracoes)
+        soma = sum(self.duracoes.values())
+        print(f"Tempo total: {segundos:.1f} s (soma das etapas: {soma:.1f} s; "
+              f"caminho crítico: {total:.1f} s, {' -> '.join(caminho)}).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Atualização completa, da coleta ao BI, como um grafo de etapas.")
+    parser.add_argument("--paralelo", type=int, default=4, help="Máximo de etapas rodando ao mesmo tempo.")
+    parser.add_argument("--formato", choices=["csv", "parquet"], default="csv",
+                        help="Formato de saída dos scrapers.")
+    parser.add_argument("--sem-coleta", action="store_true",
+                        help="Roda só as etapas de processamento, sobre os arquivos já coletados.")
+    parser.add_argument("--apenas", nargs="+", metavar="ETAPA",
+                        help="Roda só estas etapas (as dependências fora da lista não são executadas).")
+    parser.add_argument("--forcar", action="store_true", help="Roda as etapas mesmo com as entradas sem mudança.")
+    parser.add_argument("--listar", action="store_true", help="Mostra as etapas e as dependências e termina.")
+    args = parser.parse_args()
+
+    etapas = definir_etapas(args.formato)
+    validar_grafo(etapas)
+    if args.listar:
+        for etapa in etapas:
+            dependencias = f" (depois de: {', '.join(etapa.depende)})" if etapa.depende else ""
+            print(f"{etapa.nome}{dependencias}\n    {etapa.descricao()}")
+        return
+
+    if args.apenas:
+        desconhecidas = set(args.apenas) - {etapa.nome for etapa in etapas}
+        if desconhecidas:
+            parser.error(f"etapas desconhecidas: {', '.join(sorted(desconhecidas))}")
+        etapas = [etapa for etapa in etapas if etapa.nome in args.apenas]
+    if args.sem_coleta:
+        etapas = [etapa for etapa in etapas if not etapa.externa]
+
+    metricas = configurar_metricas("orquestrador", logs_dir)
+    orquestrador = Orquestrador(etapas, args.paralelo, args.forcar)
+    inicio = time.perf_counter()
+    sucesso = orquestrador.executar()
+    segundos = time.perf_counter() - inicio
+    for nome, duracao in orquestrador.duracoes.items():
+        metricas.registrar_etapa(nome, 0, duracao)
+    orquestrador.imprimir_resumo(segundos)
+    metricas.finalizar(metricas_db)
+    if not sucesso:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
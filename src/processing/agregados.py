@@ -0,0 +1,219 @@
+"""
+Tabelas para o BI mantidas junto com `reviews_classificadas` no DuckDB.
+
+- `review_topicos`: a coluna `topicos` normalizada, uma linha por
+  (comentário, tópico), com índices em `topico` e `id_comentario`.
+- `agg_sentimento_produto_dia`, `agg_sentimento_categoria_dia`,
+  `agg_topicos_sentimento` e `agg_notas_produto`: contagens pré-calculadas
+  para os painéis, que deixam de varrer a tabela inteira a cada consulta.
+
+As agregações são atualizadas de forma incremental dentro da mesma
+transação que grava as avaliações: as contagens das linhas substituídas são
+subtraídas e as das linhas novas somadas, então o custo acompanha o tamanho
+do lote e não o histórico. `reconstruir_agregados` recalcula tudo do zero
+(usado quando a tabela é recriada, quando as categorias mudam ou num banco
+de uma versão anterior, cuja coluna `topicos` é migrada de texto para lista
+por `migrar_topicos`).
+"""
+import os
+
+TABELA_TOPICOS = "review_topicos"
+TABELA_PRODUTOS = "produtos"
+
+# Colunas de `reviews_classificadas` usadas pelas agregações
+COLUNAS_NECESSARIAS = {
+    'id_produto', 'id_avaliacoes', 'id_comentario', 'rating_do_comentario',
+    'sentimento', 'topicos', 'data_coleta',
+}
+
+_DIA = "TRY_CAST(CAST(r.data_coleta AS VARCHAR) AS TIMESTAMP)::DATE"
+
+# nome: (colunas de agrupamento com tipos, SELECT dessas colunas sobre as avaliações `{fonte} r`)
+AGREGADOS = {
+    "agg_sentimento_produto_dia": (
+        ["id_produto VARCHAR", "dia DATE", "sentimento VARCHAR"],
+        f"SELECT CAST(r.id_produto AS VARCHAR), {_DIA}, r.sentimento FROM {{fonte}} r",
+    ),
+    "agg_sentimento_categoria_dia": (
+        ["categoria VARCHAR", "dia DATE", "sentimento VARCHAR"],
+        f"""
+        SELECT coalesce(p.categoria, 'N/A'), {_DIA}, r.sentimento
+        FROM {{fonte}} r LEFT JOIN {TABELA_PRODUTOS} p ON p.id_avaliacoes = CAST(r.id_avaliacoes AS VARCHAR)
+        """,
+    ),
+    "agg_topicos_sentimento": (
+        ["topico VARCHAR", "sentimento VARCHAR"],
+        "SELECT t.topico, r.sentimento FROM {fonte} r, unnest(r.topicos) AS t(topico)",
+    ),
+    "agg_notas_produto": (
+        ["id_produto VARCHAR", "rating_do_comentario INTEGER"],
+        "SELECT CAST(r.id_produto AS VARCHAR), TRY_CAST(r.rating_do_comentario AS INTEGER) FROM {fonte} r",
+    ),
+}
+
+# Índices para as consultas por valor (ART do DuckDB)
+INDICES = {
+    TABELA_TOPICOS: ["topico", "id_comentario"],
+    "agg_sentimento_produto_dia": ["id_produto"],
+    "agg_sentimento_categoria_dia": ["categoria"],
+    "agg_topicos_sentimento": ["topico"],
+    "agg_notas_produto": ["id_produto"],
+}
+
+
+def _colunas(definicoes):
+    return [definicao.split()[0] for definicao in definicoes]
+
+
+def _criar_tabelas(con):
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABELA_PRODUTOS} (
+            id_avaliacoes VARCHAR, categoria VARCHAR, pesquisa VARCHAR, titulo VARCHAR
+        )
+    """)
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABELA_TOPICOS} (
+            id_comentario VARCHAR, id_produto VARCHAR, sentimento VARCHAR, topico VARCHAR
+        )
+    """)
+    for nome, (definicoes, _) in AGREGADOS.items():
+        con.execute(f"CREATE TABLE IF NOT EXISTS {nome} ({', '.join(definicoes)}, quantidade BIGINT)")
+    for tabela, colunas in INDICES.items():
+        for coluna in colunas:
+            con.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_{coluna} ON {tabela} ({coluna})")
+
+
+def existem(con):
+    """Se o banco já tem as tabelas de BI (bancos de versões anteriores não têm)."""
+    return con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name IN ?",
+        [[TABELA_TOPICOS, *AGREGADOS]],
+    ).fetchone()[0] == len(AGREGADOS) + 1
+
+
+def migrar_topicos(con, table_name="reviews_classificadas"):
+    """
+    Converte para VARCHAR[] a coluna `topicos` de uma tabela gravada pela
+    versão antiga (`to_sql`), que guardava a lista como texto ("['a', 'b']").
+    Textos que não são uma lista válida viram NULL. Retorna se migrou.
+    """
+    tipo = con.execute(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = ? AND column_name = 'topicos'",
+        [table_name],
+    ).fetchone()
+    if tipo is None or tipo[0].endswith("[]"):
+        return False
+    con.execute(f'ALTER TABLE "{table_name}" ALTER topicos TYPE VARCHAR[] USING TRY_CAST(topicos AS VARCHAR[])')
+    print(f"Coluna 'topicos' de '{table_name}' convertida de {tipo[0]} para VARCHAR[].")
+    return True
+
+
+def tem_colunas_necessarias(colunas):
+    return COLUNAS_NECESSARIAS.issubset(colunas)
+
+
+def _inserir_topicos(con, fonte):
+    con.execute(f"""
+        INSERT INTO {TABELA_TOPICOS}
+        SELECT CAST(r.id_comentario AS VARCHAR), CAST(r.id_produto AS VARCHAR), r.sentimento, t.topico
+        FROM {fonte} r, unnest(r.topicos) AS t(topico)
+    """)
+
+
+def atualizar_agregados(con, novas, antigas=None):
+    """
+    Aplica às tabelas de BI a troca das avaliações `antigas` (linhas
+    substituídas ou None) pelas `novas`; ambos são nomes de tabelas ou views
+    com as colunas de `reviews_classificadas`. Deve rodar dentro da transação
+    que grava as avaliações.
+    """
+    _criar_tabelas(con)
+
+    con.execute(f"""
+        DELETE FROM {TABELA_TOPICOS}
+        WHERE id_comentario IN (SELECT CAST(id_comentario AS VARCHAR) FROM {novas})
+    """)
+    _inserir_topicos(con, novas)
+
+    for nome, (definicoes, consulta) in AGREGADOS.items():
+        colunas = _colunas(definicoes)
+        lista = ", ".join(colunas)
+        partes = [f"SELECT *, 1 AS sinal FROM ({consulta.format(fonte=novas)})"]
+        if antigas:
+            partes.append(f"SELECT *, -1 AS sinal FROM ({consulta.format(fonte=antigas)})")
+        con.execute(f"""
+            CREATE OR REPLACE TEMP TABLE delta_agregado AS
+            SELECT {lista}, SUM(sinal) AS quantidade
+            FROM ({' UNION ALL '.join(partes)}) AS d({lista}, sinal)
+            GROUP BY ALL HAVING SUM(sinal) != 0
+        """)
+        iguais = " AND ".join(f"a.{coluna} IS NOT DISTINCT FROM d.{coluna}" for coluna in colunas)
+        con.execute(f"""
+            UPDATE {nome} AS a SET quantidade = a.quantidade + d.quantidade
+            FROM delta_agregado d WHERE {iguais}
+        """)
+        con.execute(f"""
+            INSERT INTO {nome}
+            SELECT d.* FROM delta_agregado d
+            WHERE NOT EXISTS (SELECT 1 FROM {nome} a WHERE {iguais})
+        """)
+        con.execute(f"DELETE FROM {nome} WHERE quantidade = 0")
+    con.execute("DROP TABLE IF EXISTS delta_agregado")
+
+
+def reconstruir_agregados(con, table_name="reviews_classificadas"):
+    """Recria `review_topicos` e as agregações a partir da tabela inteira."""
+    for tabela in [TABELA_TOPICOS, *AGREGADOS]:
+        con.execute(f"DROP TABLE IF EXISTS {tabela}")
+    _criar_tabelas(con)
+    fonte = f'"{table_name}"'
+    _inserir_topicos(con, fonte)
+    for nome, (definicoes, consulta) in AGREGADOS.items():
+        lista = ", ".join(_colunas(definicoes))
+        con.execute(f"""
+            INSERT INTO {nome}
+            SELECT {lista}, COUNT(*) FROM ({consulta.format(fonte=fonte)}) AS d({lista}) GROUP BY ALL
+        """)
+
+
+def carregar_produtos(db_path, produtos, table_name="reviews_classificadas"):
+    """
+    Grava a dimensão `produtos` (id_avaliacoes -> categoria, pesquisa, titulo)
+    a partir do DataFrame da coleta de produtos. Se ela mudou, as agregações
+    são recalculadas, já que a categoria de avaliações já gravadas pode ter
+    mudado; senão nada é reescrito. Num banco de uma versão anterior (sem as
+    tabelas de BI), elas são calculadas sobre a tabela existente.
+    Retorna se a dimensão mudou.
+    """
+    import duckdb
+
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    colunas = ['id_avaliacoes', 'categoria', 'pesquisa', 'titulo']
+    produtos = produtos.reindex(columns=colunas).astype("string")
+    produtos = produtos[produtos['id_avaliacoes'].notna() & (produtos['id_avaliacoes'] != 'N/A')]
+    with duckdb.connect(db_path) as con:
+        con.register("produtos_novos", produtos)
+        con.execute("BEGIN TRANSACTION")
+        faltam_agregados = not existem(con)
+        _criar_tabelas(con)
+        con.execute("""
+            CREATE OR REPLACE TEMP TABLE dimensao_nova AS
+            SELECT id_avaliacoes, min(categoria) AS categoria, min(pesquisa) AS pesquisa, min(titulo) AS titulo
+            FROM produtos_novos GROUP BY id_avaliacoes
+        """)
+        mudou = con.execute(f"""
+            SELECT EXISTS (SELECT * FROM dimensao_nova EXCEPT SELECT * FROM {TABELA_PRODUTOS})
+                OR EXISTS (SELECT * FROM {TABELA_PRODUTOS} EXCEPT SELECT * FROM dimensao_nova)
+        """).fetchone()[0]
+        if mudou:
+            con.execute(f"DELETE FROM {TABELA_PRODUTOS}")
+            con.execute(f"INSERT INTO {TABELA_PRODUTOS} SELECT * FROM dimensao_nova")
+        existe = con.execute(
+            "SELECT 1 FROM information_schema.tables WHERE table_name = ?", [table_name]
+        ).fetchone()
+        if existe and (mudou or faltam_agregados):
+            migrar_topicos(con, table_name)
+            reconstruir_agregados(con, table_name)
+        con.execute("COMMIT")
+        con.unregister("produtos_novos")
+    return mudou
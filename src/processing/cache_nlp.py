@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+def normalizar_chave(texto):
+    """Normaliza o texto para a chave do cache (espaços extras não mudam o resultado dos modelos)."""
+    return " ".join(str(texto).split())
+
+
+class CacheNLP:
+    """
+    Memoização dos resultados de NLP (scores do LeIA, tópicos do spaCy) por texto.
+
+    A chave é o hash do texto normalizado junto com um `namespace` que inclui a
+    versão do modelo; uma atualização do léxico ou do modelo muda o namespace
+    e invalida as entradas antigas naturalmente. Uma camada LRU em memória fica
+    na frente de um banco SQLite opcional (`caminho`), que persiste entre execuções.
+    """
+
+    def __init__(self, caminho=None, tamanho_lru=100_000):
+        self.tamanho_lru = tamanho_lru
+        self._lru = OrderedDict()
+        self._trava = threading.Lock()
+        self.conn = None
+        if caminho:
+            os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(caminho, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS memo (chave TEXT PRIMARY KEY, valor TEXT)")
+            self.conn.commit()
+
+    @staticmethod
+    def chave(namespace, texto):
+        conteudo = f"{namespace}\0{normalizar_chave(texto)}"
+        return hashlib.sha1(conteudo.encode("utf-8")).hexdigest()
+
+    def _guardar_lru(self, chave, valor):
+        self._lru[chave] = valor
+        self._lru.move_to_end(chave)
+        if len(self._lru) > self.tamanho_lru:
+            self._lru.popitem(last=False)
+
+    def obter_muitos(self, namespace, textos):
+        """
+        Retorna {texto: valor} para os textos de `textos` que já estão no cache.
+        Textos diferentes com a mesma chave (que só diferem nos espaços) recebem
+        todos o mesmo valor.
+        """
+        chaves = {}
+        for texto in textos:
+            chaves.setdefault(self.chave(namespace, texto), []).append(texto)
+        encontrados = {}
+        faltantes = []
+        with self._trava:
+            for chave, originais in chaves.items():
+                if chave in self._lru:
+                    self._lru.move_to_end(chave)
+                    encontrados.update(dict.fromkeys(originais, self._lru[chave]))
+                else:
+                    faltantes.append(chave)
+
+            if self.conn is not None:
+                for inicio in range(0, len(faltantes), 500):
+                    lote = faltantes[inicio:inicio + 500]
+                    marcadores = ",".join("?" * len(lote))
+                    for chave, valor in self.conn.execute(
+                        f"SELECT chave, valor FROM memo WHERE chave IN ({marcadores})", lote
+                    ):
+                        valor = json.loads(valor)
+                        self._guardar_lru(chave, valor)
+                        encontrados.update(dict.fromkeys(chaves[chave], valor))
+        return encontrados
+
+    def salvar_muitos(self, namespace, valores):
+        """Guarda {texto: valor} (valores serializáveis em JSON)."""
+        linhas = [(self.chave(namespace, texto), valor) for texto, valor in valores.items()]
+        with self._trava:
+            for chave, valor in linhas:
+                self._guardar_lru(chave, valor)
+            if self.conn is not None and linhas:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO memo VALUES (?, ?)",
+                    [(chave, json.dumps(valor, ensure_ascii=False)) for chave, valor in linhas],
+                )
+                self.conn.commit()
+
+    def fechar(self):
+        if self.conn is not None:
+            self.conn.close()
@@ -0,0 +1,306 @@
+"""
+Detecção de comentários quase duplicados com MinHash e LSH.
+
+A API do Konfidency devolve a mesma avaliação em vários SKUs e variações, e
+muitos comentários são textos-padrão quase idênticos. Antes do NLP, cada
+comentário limpo vira uma assinatura MinHash (shingles de caracteres) e é
+comparado, por bandas LSH, com os comentários canônicos já vistos: os que
+têm similaridade estimada acima do limiar são mapeados para o canônico.
+As duplicatas continuam indo para o banco, com o seu próprio produto, nota
+e data, mas recebem o texto limpo do canônico; como o LeIA e o spaCy rodam
+uma vez por texto distinto, elas não custam NLP a mais (ver
+`pipeline.deduplicar_chunk`). O mapeamento vai para `review_canonica`.
+
+O índice de assinaturas fica em disco (`IndiceMinHash`), em segmentos de
+arrays NumPy ordenados e abertos com memmap: cada lote novo é consultado com
+busca binária, sem carregar o histórico inteiro na memória, e grava um
+segmento próprio. Quando os segmentos passam de `MAX_SEGMENTOS`, são
+compactados num só.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+TABELA_CANONICA = "review_canonica"
+
+MAX_SEGMENTOS = 16
+
+_BASE_SHINGLE = np.uint64(257)
+_MULTIPLICADOR_BANDA = np.uint64(0x100000001B3)
+_MISTURA_BANDA = np.uint64(0x9E3779B97F4A7C15)
+
+
+class IndiceMinHash:
+    """
+    Índice persistente de assinaturas MinHash dos comentários canônicos.
+
+    `num_permutacoes` funções de hash formam a assinatura, dividida em
+    `bandas` bandas: dois comentários viram candidatos quando coincidem em
+    alguma banda, e a duplicata só é aceita se a fração de posições iguais
+    da assinatura (estimativa da similaridade de Jaccard entre os shingles de
+    `tamanho_shingle` caracteres) for de pelo menos `limiar`. Os parâmetros
+    ficam gravados com o índice; abrir um índice com outros levanta ValueError.
+
+    Sem `diretorio`, o índice vive só em memória.
+    """
+
+    def __init__(self, diretorio=None, num_permutacoes=64, bandas=16, tamanho_shingle=5, limiar=0.8,
+                 semente=42):
+        if num_permutacoes % bandas:
+            raise ValueError("num_permutacoes deve ser múltiplo de bandas.")
+        self.diretorio = diretorio
+        self.num_permutacoes = num_permutacoes
+        self.bandas = bandas
+        self.tamanho_shingle = tamanho_shingle
+        self.limiar = limiar
+        self.semente = semente
+
+        rng = np.random.default_rng(semente)
+        # Hash multiplicativo (multiply-shift) com aritmética de 64 bits que dá a volta
+        self._a = rng.integers(1, 2**63, size=num_permutacoes, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=num_permutacoes, dtype=np.uint64)
+
+        self._segmentos = []
+        self._pendentes = []
+        if diretorio:
+            self._carregar()
+
+    # --- Assinaturas ---
+
+    def assinaturas(self, textos):
+        """Assinaturas MinHash (n, num_permutacoes) uint32 dos textos."""
+        k = self.tamanho_shingle
+        codificados = [str(texto).encode("utf-8").ljust(k) for texto in textos]
+        n = len(codificados)
+        if n == 0:
+            return np.empty((0, self.num_permutacoes), dtype=np.uint32)
+
+        tamanhos = np.fromiter(map(len, codificados), dtype=np.int64, count=n)
+        dados = np.frombuffer(b"".join(codificados), dtype=np.uint8).astype(np.uint64)
+
+        # Hash polinomial de todas as janelas de k bytes do texto concatenado
+        janelas = len(dados) - k + 1
+        hashes = np.zeros(janelas, dtype=np.uint64)
+        for i in range(k):
+            hashes = hashes * _BASE_SHINGLE + dados[i:i + janelas]
+
+        # Só as janelas inteiras dentro de cada texto
+        quantidades = tamanhos - k + 1
+        inicios_texto = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+        inicios_shingles = np.concatenate(([0], np.cumsum(quantidades)[:-1]))
+        posicoes = np.arange(quantidades.sum()) + np.repeat(inicios_texto - inicios_shingles, quantidades)
+        shingles = hashes[posicoes]
+
+        assinaturas = np.empty((n, self.num_permutacoes), dtype=np.uint32)
+        for p in range(self.num_permutacoes):
+            valores = (shingles * self._a[p] + self._b[p]) >> np.uint64(32)
+            assinaturas[:, p] = np.minimum.reduceat(valores, inicios_shingles)
+        return assinaturas
+
+    def chaves_bandas(self, assinaturas):
+        """Uma chave uint64 por banda de cada assinatura, já distinta entre bandas: (n, bandas)."""
+        linhas = self.num_permutacoes // self.bandas
+        partes = assinaturas.reshape(len(assinaturas), self.bandas, linhas).astype(np.uint64)
+        chaves = np.zeros((len(assinaturas), self.bandas), dtype=np.uint64)
+        for i in range(linhas):
+            chaves = chaves * _MULTIPLICADOR_BANDA + partes[:, :, i]
+        return chaves ^ (np.arange(self.bandas, dtype=np.uint64) * _MISTURA_BANDA)
+
+    def _similaridade(self, a, b):
+        return np.count_nonzero(a == b, axis=-1) / self.num_permutacoes
+
+    # --- Deduplicação ---
+
+    def deduplicar(self, ids, textos):
+        """
+        Mapeia cada comentário para o seu canônico: ele mesmo, um canônico já
+        indexado ou um comentário anterior do mesmo lote. Os novos canônicos
+        ficam pendentes até `salvar`. Retorna um DataFrame com `id_comentario`,
+        `id_canonico` e `similaridade` (estimada), na ordem da entrada.
+        """
+        ids = np.asarray(ids, dtype=str)
+        assinaturas = self.assinaturas(textos)
+        chaves = self.chaves_bandas(assinaturas)
+        n = len(ids)
+
+        canonicos = ids.astype(object)
+        similaridades = np.ones(n)
+        no_indice = np.zeros(n, dtype=bool)
+
+        # 1. Contra os canônicos já indexados (busca binária em cada segmento)
+        melhor = np.zeros(n)
+        for segmento in self._segmentos + self._pendentes:
+            posicoes = np.searchsorted(segmento["chaves"], chaves.ravel())
+            posicoes = np.minimum(posicoes, len(segmento["chaves"]) - 1)
+            achou = segmento["chaves"][posicoes] == chaves.ravel()
+            if not achou.any():
+                continue
+            linhas = np.nonzero(achou)[0] // self.bandas
+            candidatos = segmento["linhas"][posicoes[achou]]
+            ids_candidatos = segmento["ids"][candidatos]
+            sims = self._similaridade(assinaturas[linhas], segmento["assinaturas"][candidatos])
+            # O próprio comentário já indexado (lote reprocessado) continua canônico
+            sims = np.where(ids_candidatos == ids[linhas], 2.0, sims)
+
+            # O candidato mais similar de cada linha, se passar do limiar e do melhor até aqui
+            ordem = np.lexsort((-sims, linhas))
+            linhas, sims, ids_candidatos = linhas[ordem], sims[ordem], ids_candidatos[ordem]
+            _, primeiros = np.unique(linhas, return_index=True)
+            linhas, sims, ids_candidatos = linhas[primeiros], sims[primeiros], ids_candidatos[primeiros]
+            aceitos = (sims >= self.limiar) & (sims > melhor[linhas])
+            linhas, sims = linhas[aceitos], sims[aceitos]
+            melhor[linhas] = sims
+            canonicos[linhas] = ids_candidatos[aceitos]
+            similaridades[linhas] = np.minimum(sims, 1.0)
+            no_indice[linhas] = True
+
+        # 2. Dentro do lote, entre os que não casaram com o índice
+        restantes = np.nonzero(~no_indice)[0]
+        eh_canonico = np.zeros(n, dtype=bool)
+        eh_canonico[restantes] = True
+        if len(restantes) > 1:
+            primeiros = np.empty((len(restantes), self.bandas), dtype=np.int64)
+            for banda in range(self.bandas):
+                _, primeiro, inverso = np.unique(chaves[restantes, banda], return_index=True, return_inverse=True)
+                primeiros[:, banda] = restantes[primeiro][inverso.ravel()]
+            indice_canonico = np.arange(n)
+            for posicao in np.nonzero((primeiros < restantes[:, None]).any(axis=1))[0]:
+                linha = restantes[posicao]
+                escolhido, maior = None, 0.0
+                for candidato in np.unique(primeiros[posicao]):
+                    candidato = indice_canonico[candidato]
+                    if candidato == linha:
+                        continue
+                    sim = self._similaridade(assinaturas[linha], assinaturas[candidato])
+                    if sim >= self.limiar and sim > maior:
+                        escolhido, maior = candidato, sim
+                if escolhido is not None:
+                    indice_canonico[linha] = escolhido
+                    canonicos[linha] = ids[escolhido]
+                    similaridades[linha] = maior
+                    eh_canonico[linha] = False
+
+        if eh_canonico.any():
+            self._pendentes.append(self._montar_segmento(ids[eh_canonico], assinaturas[eh_canonico]))
+
+        return pd.DataFrame({
+            "id_comentario": ids,
+            "id_canonico": canonicos,
+            "similaridade": similaridades,
+        })
+
+    # --- Persistência ---
+
+    def _montar_segmento(self, ids, assinaturas):
+        chaves = self.chaves_bandas(assinaturas).ravel()
+        ordem = np.argsort(chaves, kind="stable")
+        return {
+            "chaves": chaves[ordem],
+            "linhas": (ordem // self.bandas).astype(np.int64),
+            "assinaturas": assinaturas,
+            "ids": np.asarray(ids, dtype=str),
+        }
+
+    def _parametros(self):
+        return {
+            "num_permutacoes": self.num_permutacoes,
+            "bandas": self.bandas,
+            "tamanho_shingle": self.tamanho_shingle,
+            "semente": self.semente,
+        }
+
+    def _carregar(self):
+        caminho = os.path.join(self.diretorio, "parametros.json")
+        if not os.path.exists(caminho):
+            return
+        with open(caminho, encoding="utf-8") as arquivo:
+            parametros = json.load(arquivo)
+        if parametros != self._parametros():
+            raise ValueError(f"Índice em '{self.diretorio}' criado com outros parâmetros: {parametros}")
+        for nome in sorted(os.listdir(self.diretorio)):
+            pasta = os.path.join(self.diretorio, nome)
+            if nome.startswith("segmento-") and os.path.isdir(pasta):
+                self._segmentos.append({
+                    campo: np.load(os.path.join(pasta, f"{campo}.npy"), mmap_mode="r")
+                    for campo in ("chaves", "linhas", "assinaturas", "ids")
+                })
+
+    def _gravar_segmento(self, segmento, nome):
+        temporaria = os.path.join(self.diretorio, f".{nome}.tmp")
+        shutil.rmtree(temporaria, ignore_errors=True)
+        os.makedirs(temporaria)
+        for campo, valores in segmento.items():
+            np.save(os.path.join(temporaria, f"{campo}.npy"), valores)
+        os.replace(temporaria, os.path.join(self.diretorio, nome))
+
+    def salvar(self):
+        """Grava os canônicos pendentes como um novo segmento (e compacta se houver segmentos demais)."""
+        if not self.diretorio or not self._pendentes:
+            self._segmentos += self._pendentes
+            self._pendentes = []
+            return
+        os.makedirs(self.diretorio, exist_ok=True)
+        with open(os.path.join(self.diretorio, "parametros.json"), "w", encoding="utf-8") as arquivo:
+            json.dump(self._parametros(), arquivo)
+
+        novo = self._montar_segmento(
+            np.concatenate([s["ids"] for s in self._pendentes]),
+            np.concatenate([s["assinaturas"] for s in self._pendentes]),
+        )
+        self._pendentes = []
+        numeros = [int(nome.split("-")[1]) for nome in os.listdir(self.diretorio) if nome.startswith("segmento-")]
+        proximo = max(numeros, default=0) + 1
+        self._gravar_segmento(novo, f"segmento-{proximo:06d}")
+        self._segmentos = []
+        self._carregar()
+
+        if len(self._segmentos) > MAX_SEGMENTOS:
+            self._compactar(proximo + 1)
+
+    def _compactar(self, numero):
+        antigos = [nome for nome in os.listdir(self.diretorio) if nome.startswith("segmento-")]
+        unico = self._montar_segmento(
+            np.concatenate([s["ids"] for s in self._segmentos]),
+            np.concatenate([s["assinaturas"] for s in self._segmentos]),
+        )
+        self._gravar_segmento(unico, f"segmento-{numero:06d}")
+        for nome in antigos:
+            shutil.rmtree(os.path.join(self.diretorio, nome))
+        self._segmentos = []
+        self._carregar()
+
+    def __len__(self):
+        return sum(len(s["ids"]) for s in self._segmentos + self._pendentes)
+
+
+def salvar_mapeamento(db_path, mapeamento):
+    """
+    Grava (upsert por `id_comentario`) o mapeamento comentário -> canônico na
+    tabela `review_canonica`, para o BI atribuir as duplicatas ao comentário
+    classificado em `reviews_classificadas`.
+    """
+    import duckdb
+
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    with duckdb.connect(db_path) as con:
+        con.register("mapeamento_novo", mapeamento)
+        con.execute("BEGIN TRANSACTION")
+        con.execute(f"""
+            CREATE TABLE IF NOT EXISTS {TABELA_CANONICA} (
+                id_comentario VARCHAR, id_canonico VARCHAR, similaridade DOUBLE
+            )
+        """)
+        con.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABELA_CANONICA}_id_canonico ON {TABELA_CANONICA} (id_canonico)")
+        con.execute(f"""
+            DELETE FROM {TABELA_CANONICA}
+            WHERE id_comentario IN (SELECT id_comentario FROM mapeamento_novo)
+        """)
+        con.execute(f"""
+            INSERT INTO {TABELA_CANONICA}
+            SELECT id_comentario, id_canonico, similaridade FROM mapeamento_novo
+        """)
+        con.execute("COMMIT")
+        con.unregister("mapeamento_novo")
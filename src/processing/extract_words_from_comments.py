@@ -1,8 +1,27 @@
 import pandas as pd
+import argparse
+import duckdb
 import os
-import re
+import sys
 from pathlib import Path
 
+# Permite executar como script (python src/processing/extract_words_from_comments.py)
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from comum.armazenamento import ler_tabela
+from comum.compacto import compactar
+from comum.normalizacao import filtrar_palavras, filtrar_palavras_serie
+
+# Colunas lidas do arquivo de comentários classificados
+_colunas_entrada = ['id_comentario', 'id_produto', 'sentimento', 'comentario_about_produto']
+
+# Arquivo de saída de cada sentimento
+_saidas_por_sentimento = {
+    'Positivo': 'palavras_positivas.csv',
+    'Negativo': 'palavras_negativas.csv',
+}
+
 def extract_words(text):
     """
     Extrai palavras de um texto, removendo pontuação e convertendo para minúsculas.
@@ -16,10 +35,8 @@ def extract_words(text):
     if not isinstance(text, str):
         return []
     
-    # Remove pontuação e converte para minúsculas
-    text = text.lower()
-    # Remove pontuação mantendo apenas letras, números e espaços
-    text = re.sub(r'[^a-záéíóúãõçà\s]', '', text)
+    # Converte para minúsculas e remove pontuação, mantendo apenas letras e espaços
+    text = filtrar_palavras(text)
     # Divide o texto em palavras
     words = text.split()
     # Remove palavras vazias
@@ -28,79 +45,113 @@ def extract_words(text):
     return words
 
 
-def process_comments():
+def explode_words(df, text_column='comentario_about_produto'):
+    """
+    Versão vetorizada de `extract_words` para um DataFrame inteiro.
+    
+    Args:
+        df (pd.DataFrame): Comentários com 'id_comentario', 'id_produto' e 'sentimento'
+        text_column (str): Coluna com o texto do comentário
+        
+    Returns:
+        pd.DataFrame: Uma linha por palavra, com as colunas 'palavra',
+        'id_comentario', 'id_produto' e 'sentimento', na ordem dos comentários
+    """
+    palavras = filtrar_palavras_serie(df[text_column]).str.split()
+    
+    result = df[['id_comentario', 'id_produto', 'sentimento']].assign(palavra=palavras)
+    result = result.explode('palavra').dropna(subset=['palavra'])
+    return result[['palavra', 'id_comentario', 'id_produto', 'sentimento']]
+
+
+def aggregate_words(words_df):
+    """
+    Agrega as palavras extraídas em contagens, para que o BI não precise
+    reprocessar uma linha por palavra.
+    
+    Returns:
+        tuple: (palavras_por_sentimento, palavras_por_produto)
+    """
+    por_sentimento = (
+        words_df.groupby(['palavra', 'sentimento'], observed=True)
+        .size().reset_index(name='contagem')
+        .sort_values('contagem', ascending=False, ignore_index=True)
+    )
+    por_produto = (
+        words_df.groupby(['id_produto', 'palavra', 'sentimento'], observed=True)
+        .size().reset_index(name='contagem')
+    )
+    return por_sentimento, por_produto
+
+
+def save_aggregates(por_sentimento, por_produto, output_dir, formato):
+    """Grava as tabelas agregadas em Parquet ou no banco DuckDB do pipeline."""
+    if formato == 'parquet':
+        por_sentimento.to_parquet(output_dir / "palavras_por_sentimento.parquet", index=False)
+        por_produto.to_parquet(output_dir / "palavras_por_produto.parquet", index=False)
+    elif formato == 'duckdb':
+        with duckdb.connect(str(output_dir / "reviews.duckdb")) as con:
+            con.register("por_sentimento", por_sentimento)
+            con.register("por_produto", por_produto)
+            con.execute("CREATE OR REPLACE TABLE palavras_por_sentimento AS SELECT * FROM por_sentimento")
+            con.execute("CREATE OR REPLACE TABLE palavras_por_produto AS SELECT * FROM por_produto")
+    else:
+        raise ValueError(f"Formato de agregado desconhecido: {formato}")
+
+
+def process_comments(aggregate_format=None):
     """
     Processa o arquivo de comentários classificados e cria dois CSVs:
     - palavras_positivas.csv: palavras dos comentários positivos
     - palavras_negativas.csv: palavras dos comentários negativos
+    
+    Args:
+        aggregate_format (str, optional): 'parquet' ou 'duckdb' para gravar também
+            as contagens de palavra x sentimento e de palavra x produto
     """
     
-    # Caminho do arquivo de entrada
-    input_file = Path(__file__).parent.parent.parent / "data" / "output" / "comentarios_classificados.csv"
+    # Caminho do arquivo de entrada (a versão em Parquet tem preferência, se existir)
+    input_file = Path(__file__).parent.parent.parent / "data" / "output" / "comentarios_classificados.parquet"
+    if not input_file.exists():
+        input_file = input_file.with_suffix(".csv")
     
     # Caminho dos arquivos de saída
     output_dir = Path(__file__).parent.parent.parent / "data" / "output"
-    positive_output = output_dir / "palavras_positivas.csv"
-    negative_output = output_dir / "palavras_negativas.csv"
     
     # Verificar se o arquivo de entrada existe
     if not input_file.exists():
         print(f"Erro: Arquivo não encontrado: {input_file}")
         return
     
-    # Ler o CSV com separador pipe
+    # Ler só as colunas usadas (CSV com separador pipe ou Parquet), com ids e sentimento categóricos
     print(f"Lendo arquivo: {input_file}")
-    df = pd.read_csv(input_file, sep='|')
+    df = compactar(ler_tabela(str(input_file), _colunas_entrada))
     
-    # Separar comentários positivos e negativos
-    positive_comments = df[df['sentimento'] == 'Positivo']
-    negative_comments = df[df['sentimento'] == 'Negativo']
-    
-    print(f"Total de comentários positivos: {len(positive_comments)}")
-    print(f"Total de comentários negativos: {len(negative_comments)}")
-    
-    # Processar comentários positivos
-    positive_data = []
-    for idx, row in positive_comments.iterrows():
-        id_comentario = row['id_comentario']
-        texto = row['comentario_about_produto']
-        palavras = extract_words(texto)
-        
-        for palavra in palavras:
-            positive_data.append({
-                'palavra': palavra,
-                'id_comentario': id_comentario
-            })
-    
-    # Processar comentários negativos
-    negative_data = []
-    for idx, row in negative_comments.iterrows():
-        id_comentario = row['id_comentario']
-        texto = row['comentario_about_produto']
-        palavras = extract_words(texto)
-        
-        for palavra in palavras:
-            negative_data.append({
-                'palavra': palavra,
-                'id_comentario': id_comentario
-            })
-    
-    # Criar DataFrames e salvar como CSV
-    positive_df = pd.DataFrame(positive_data)
-    negative_df = pd.DataFrame(negative_data)
-    
-    # Salvar CSVs
-    positive_df.to_csv(positive_output, index=False, sep=',')
-    negative_df.to_csv(negative_output, index=False, sep=',')
+    # Extrair as palavras de todos os comentários de uma só vez
+    words_df = explode_words(df)
     
+    # Salvar um CSV por sentimento
     print(f"\nTotal de palavras extraídas:")
-    print(f"  Positivas: {len(positive_df)}")
-    print(f"  Negativas: {len(negative_df)}")
+    for sentimento, nome_arquivo in _saidas_por_sentimento.items():
+        total_comentarios = (df['sentimento'] == sentimento).sum()
+        palavras = words_df.loc[words_df['sentimento'] == sentimento, ['palavra', 'id_comentario']]
+        palavras.to_csv(output_dir / nome_arquivo, index=False, sep=',')
+        print(f"  {sentimento}: {len(palavras)} palavras de {total_comentarios} comentários")
+    
+    if aggregate_format:
+        por_sentimento, por_produto = aggregate_words(words_df)
+        save_aggregates(por_sentimento, por_produto, output_dir, aggregate_format)
+        print(f"\nAgregados gravados em formato {aggregate_format}: "
+              f"{len(por_sentimento)} linhas por sentimento, {len(por_produto)} por produto.")
     
     print(f"\nArquivos gerados com sucesso:")
-    print(f"  {positive_output}")
-    print(f"  {negative_output}")
+    for nome_arquivo in _saidas_por_sentimento.values():
+        print(f"  {output_dir / nome_arquivo}")
 
 
 if __name__ == "__main__":
-    process_comments()
+    parser = argparse.ArgumentParser(description="Extrai as palavras dos comentários classificados.")
+    parser.add_argument("--agregado", choices=["parquet", "duckdb"],
+                        help="Grava também as contagens agregadas de palavras no formato escolhido.")
+    args = parser.parse_args()
+    process_comments(args.agregado)
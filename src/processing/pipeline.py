@@ -0,0 +1,421 @@
+import argparse
+import os
+import sys
+from datetime import datetime
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Permite executar como script (python src/processing/pipeline.py)
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from comum.armazenamento import (
+    impressao_confere, ler_em_chunks, ler_parte_em_chunks, ler_tabela, partes_da_entrada,
+)
+from comum.compacto import TIPO_TEXTO, aplicar_nos_unicos, compactar, por_valor_unico
+from comum.metricas import configurar_metricas, obter_metricas
+from comum.normalizacao import limpar_serie
+from processing.agregados import carregar_produtos
+from processing.deduplicacao import IndiceMinHash, salvar_mapeamento
+from processing.text_processor import (
+    classificar_sentimento,
+    extrair_topicos_em_lote,
+    salvar_no_banco_de_dados,
+    configurar_cache,
+    aquecer_modelos,
+)
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
+
+ENTRADA_PADRAO = os.path.join(project_root, 'data', 'raw', 'comentarios_produtos.csv')
+PRODUTOS_PADRAO = os.path.join(project_root, 'data', 'raw', 'avaliacoes_casasbahia.csv')
+BANCO_PADRAO = os.path.join(project_root, 'data', 'output', 'reviews.duckdb')
+CACHE_PADRAO = os.path.join(project_root, 'data', 'output', 'cache_nlp.db')
+CLASSIFICADOS_PADRAO = os.path.join(project_root, 'data', 'output', 'comentarios_classificados.parquet')
+INDICE_MINHASH_PADRAO = os.path.join(project_root, 'data', 'output', 'indice_minhash')
+LOGS_PADRAO = os.path.join(project_root, 'data', 'logs')
+METRICAS_PADRAO = os.path.join(project_root, 'data', 'output', 'metricas.duckdb')
+
+COLUNAS_PARA_SALVAR = [
+    'id_produto', 'id_avaliacoes', 'id_comentario', 'rating_do_comentario',
+    'comentario_about_produto', 'sentimento', 'topicos', 'data_coleta'
+]
+
+# Arquivo intermediário da etapa de sentimento (entrada das etapas de palavras e de tópicos)
+SCHEMA_CLASSIFICADOS = pa.schema([
+    ("id_produto", pa.string()),
+    ("id_avaliacoes", pa.string()),
+    ("id_comentario", pa.string()),
+    ("rating_do_comentario", pa.int8()),
+    ("comentario_about_produto", pa.string()),
+    ("sentimento", pa.dictionary(pa.int8(), pa.string())),
+    ("data_coleta", pa.string()),
+])
+
+
+def limpar_chunk(df):
+    """
+    Converte o pedaço para os tipos compactos (`comum.compacto`), limpa o
+    texto dos comentários e descarta os que ficam vazios. `comentario_limpo`
+    é codificado por dicionário: cada texto distinto é limpo e guardado uma
+    vez só, em vez de uma segunda cópia inteira da coluna de comentários.
+    """
+    df = compactar(df.dropna(subset=['comentario_about_produto']))
+    with obter_metricas().etapa("limpar_texto", len(df)):
+        df['comentario_limpo'] = aplicar_nos_unicos(df['comentario_about_produto'], limpar_serie)
+    vazio = por_valor_unico(
+        df['comentario_limpo'], lambda unicos: (unicos.str.strip() == '').to_numpy(dtype=bool, na_value=False)
+    )
+    return df[~vazio]
+
+
+def _textos_canonicos(db_path, table_name, ids):
+    """Texto limpo dos canônicos `ids` já gravados na tabela (de pedaços ou execuções anteriores)."""
+    if not ids or not db_path or not os.path.exists(db_path):
+        return pd.Series(dtype=object)
+    with duckdb.connect(db_path) as con:
+        existe = con.execute(
+            "SELECT 1 FROM information_schema.tables WHERE table_name = ?", [table_name]
+        ).fetchone()
+        if not existe:
+            return pd.Series(dtype=object)
+        linhas = con.execute(
+            f'SELECT CAST(id_comentario AS VARCHAR), comentario_about_produto FROM "{table_name}" '
+            f'WHERE CAST(id_comentario AS VARCHAR) IN (SELECT unnest(?))',
+            [sorted(ids)],
+        ).fetchall()
+    ids_gravados = [linha[0] for linha in linhas]
+    textos = pd.Series([linha[1] for linha in linhas], dtype=TIPO_TEXTO)
+    return pd.Series(limpar_serie(textos).to_numpy(dtype=object), index=ids_gravados)
+
+
+def deduplicar_chunk(df, indice, db_path=None, table_name="reviews_classificadas"):
+    """
+    Remove repetições de `id_comentario` e mapeia os comentários quase
+    idênticos para o seu canônico (ver `deduplicacao.py`). As duplicatas
+    continuam no pedaço, com os seus próprios produto, nota e data, mas com
+    `comentario_limpo` trocado pelo texto do canônico: como o NLP roda uma vez
+    por texto distinto, elas não custam nada a mais, e o sentimento continua
+    considerando a nota de cada uma. O texto de canônicos de pedaços
+    anteriores vem da tabela; uma duplicata cujo canônico não é encontrado
+    fica com o próprio texto. Retorna (pedaço, mapeamento de cada comentário
+    para o seu canônico).
+    """
+    with obter_metricas().etapa("deduplicar", len(df)):
+        df = df.drop_duplicates(subset=['id_comentario'], keep='last')
+        mapeamento = indice.deduplicar(df['id_comentario'].astype(str), df['comentario_limpo'])
+        ids = mapeamento['id_comentario'].to_numpy(dtype=object)
+        canonicos = mapeamento['id_canonico'].to_numpy(dtype=object)
+        duplicata = canonicos != ids
+        if duplicata.any():
+            proprios = df['comentario_limpo'].to_numpy(dtype=object)
+            anteriores = _textos_canonicos(db_path, table_name, set(canonicos[duplicata]) - set(ids))
+            textos = pd.concat([pd.Series(proprios, index=ids), anteriores])
+            textos = textos[~textos.index.duplicated()]
+            substitutos = textos.reindex(canonicos).to_numpy(dtype=object)
+            limpos = np.where(duplicata & pd.notna(substitutos), substitutos, proprios)
+            df['comentario_limpo'] = aplicar_nos_unicos(
+                pd.Series(limpos, index=df.index, dtype=TIPO_TEXTO), lambda unicos: unicos
+            )
+    return df, mapeamento
+
+
+def enriquecer_chunk(df, batch_size=1000, n_process=1):
+    """
+    Classifica o sentimento e extrai os tópicos de comentários já limpos. Se
+    o pedaço já tem `sentimento` (lido de `comentarios_classificados.parquet`),
+    só os tópicos são extraídos.
+    """
+    if 'sentimento' not in df.columns:
+        df = classificar_sentimento(df, processos=n_process)
+    df['topicos'] = extrair_topicos_em_lote(df['comentario_limpo'], batch_size, n_process)
+    return df[COLUNAS_PARA_SALVAR]
+
+
+def processar_chunk(df, batch_size=1000, n_process=1):
+    """Executa limpeza, classificação de sentimento e extração de tópicos em um pedaço do CSV."""
+    return enriquecer_chunk(limpar_chunk(df), batch_size, n_process)
+
+
+def _manter_novos(df, con, fonte, chave):
+    """Anti-join das chaves de `df` com `fonte` (tabela ou `read_parquet`) na conexão `con`."""
+    con.register("chaves_chunk", df[[chave]].astype(str))
+    novos = {linha[0] for linha in con.execute(
+        f'SELECT c."{chave}" FROM chaves_chunk c '
+        f'ANTI JOIN {fonte} t ON c."{chave}" = CAST(t."{chave}" AS VARCHAR)'
+    ).fetchall()}
+    con.unregister("chaves_chunk")
+    return df[df[chave].astype(str).isin(novos)]
+
+
+def filtrar_novos(df, db_path, table_name="reviews_classificadas", chave="id_comentario"):
+    """
+    Mantém só as linhas de `df` cujo `chave` ainda não está na tabela, com um
+    anti-join no DuckDB (repetições dentro de `df` ficam só com a última).
+    As duplicatas da deduplicação também são gravadas na tabela, então ela
+    basta para saber o que já foi processado.
+    """
+    df = df.drop_duplicates(subset=[chave], keep="last")
+    if df.empty or not os.path.exists(db_path):
+        return df
+    with duckdb.connect(db_path) as con:
+        existe = con.execute(
+            "SELECT 1 FROM information_schema.tables WHERE table_name = ?", [table_name]
+        ).fetchone()
+        if not existe:
+            return df
+        return _manter_novos(df, con, f'"{table_name}"', chave)
+
+
+def filtrar_novos_parquet(df, caminho, chave="id_comentario"):
+    """Como `filtrar_novos`, comparando com as linhas de um arquivo Parquet em vez de uma tabela."""
+    df = df.drop_duplicates(subset=[chave], keep="last")
+    if df.empty:
+        return df
+    with duckdb.connect() as con:
+        caminho_sql = caminho.replace("'", "''")
+        return _manter_novos(df, con, f"read_parquet('{caminho_sql}')", chave)
+
+
+def exportar_sentimentos(entrada=ENTRADA_PADRAO, saida=CLASSIFICADOS_PADRAO, tamanho_chunk=50_000, n_process=1,
+                         incremental=False):
+    """
+    Só a limpeza e a classificação de sentimento, pedaço a pedaço, gravando
+    `saida` em Parquet. É a entrada de `extract_words_from_comments.py` e da
+    extração de tópicos (que reaproveita o sentimento já calculado), o que
+    permite rodar as duas em paralelo. O arquivo é escrito num temporário e
+    só substitui o anterior no fim. Retorna o total de linhas classificadas.
+
+    Com `incremental=True` e um `saida` de uma execução anterior, as linhas
+    dele são copiadas para o novo arquivo e só os comentários que ainda não
+    estão nele passam pelo LeIA: `saida` continua com o histórico inteiro
+    (a etapa de palavras precisa dele), mas o custo acompanha os novos.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    anterior = saida if incremental and os.path.exists(saida) else None
+    temporario = f"{saida}.tmp"
+    total = 0
+    with pq.ParquetWriter(temporario, SCHEMA_CLASSIFICADOS, compression="zstd") as escritor:
+        if anterior:
+            copiadas = 0
+            for lote in pq.ParquetFile(anterior).iter_batches(batch_size=tamanho_chunk):
+                escritor.write_table(pa.Table.from_batches([lote]).cast(SCHEMA_CLASSIFICADOS))
+                copiadas += lote.num_rows
+            print(f"{copiadas} comentários já classificados mantidos de '{anterior}'.")
+        for numero, chunk in enumerate(ler_em_chunks(entrada, tamanho_chunk), start=1):
+            if anterior:
+                lidas, chunk = len(chunk), filtrar_novos_parquet(chunk, anterior)
+                print(f"Chunk {numero}: {len(chunk)} de {lidas} comentários ainda não classificados.")
+                if chunk.empty:
+                    continue
+            df = classificar_sentimento(limpar_chunk(chunk), processos=n_process)
+            df = df[SCHEMA_CLASSIFICADOS.names].astype({'id_produto': 'string', 'id_avaliacoes': 'string'})
+            escritor.write_table(pa.Table.from_pandas(df, SCHEMA_CLASSIFICADOS, preserve_index=False))
+            total += len(df)
+            print(f"Chunk {numero}: {len(df)} comentários classificados ({total} no total).")
+    os.replace(temporario, saida)
+    return total
+
+
+def _criar_tabela_checkpoint(con):
+    # Formato anterior: um contador de pedaços por arquivo, que dependia da ordem de leitura
+    con.execute("DROP TABLE IF EXISTS pipeline_checkpoint")
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS pipeline_checkpoint_partes (
+            arquivo VARCHAR, parte VARCHAR, impressao VARCHAR, chunks_concluidos INTEGER,
+            concluida BOOLEAN, atualizado_em TIMESTAMP, PRIMARY KEY (arquivo, parte)
+        )
+    """)
+
+
+def _ler_checkpoint(db_path, arquivo):
+    """
+    Retorna o progresso de `arquivo` numa execução interrompida:
+    {parte: (impressao, chunks_concluidos, concluida)}.
+    """
+    if not os.path.exists(db_path):
+        return {}
+    with duckdb.connect(db_path) as con:
+        _criar_tabela_checkpoint(con)
+        linhas = con.execute(
+            "SELECT parte, impressao, chunks_concluidos, concluida FROM pipeline_checkpoint_partes WHERE arquivo = ?",
+            [arquivo],
+        ).fetchall()
+    return {parte: (impressao, chunks, concluida) for parte, impressao, chunks, concluida in linhas}
+
+
+def _gravar_checkpoint(db_path, arquivo, parte=None, impressao=None, chunks_concluidos=0, concluida=False):
+    """Grava o progresso de uma parte de `arquivo` (sem `parte`, apaga o progresso do arquivo inteiro)."""
+    with duckdb.connect(db_path) as con:
+        _criar_tabela_checkpoint(con)
+        if parte is None:
+            con.execute("DELETE FROM pipeline_checkpoint_partes WHERE arquivo = ?", [arquivo])
+        else:
+            con.execute(
+                "INSERT OR REPLACE INTO pipeline_checkpoint_partes VALUES (?, ?, ?, ?, ?, ?)",
+                [arquivo, parte, impressao, chunks_concluidos, concluida, datetime.now()],
+            )
+
+
+def executar_pipeline(entrada_csv=ENTRADA_PADRAO, db_path=BANCO_PADRAO, table_name="reviews_classificadas",
+                      tamanho_chunk=50_000, batch_size=1000, n_process=1, recomecar=False, incremental=False,
+                      indice=None):
+    """
+    Processa `entrada_csv` (CSV '|' ou dataset Parquet da coleta) em pedaços
+    de `tamanho_chunk` linhas, do arquivo bruto até o DuckDB: limpar_texto -> classificar_sentimento -> extrair_topicos ->
+    upsert na tabela. Só um pedaço fica em memória por vez, então o consumo
+    não cresce com o volume de avaliações.
+
+    Depois de cada pedaço gravado, o progresso é salvo na tabela
+    `pipeline_checkpoint_partes`, por parte da entrada (o CSV inteiro ou cada
+    arquivo do dataset Parquet, ver `partes_da_entrada`) com a sua impressão
+    digital; uma execução interrompida pula as partes concluídas e retoma as
+    demais do pedaço seguinte. Arquivos novos no dataset não deslocam o
+    progresso, e uma parte que mudou desde a interrupção é refeita do início
+    (o upsert por `id_comentario` torna seguro refazer um pedaço).
+
+    Com `incremental=True`, cada pedaço é comparado com a tabela e só os
+    comentários que ainda não estão nela passam pela limpeza e pelo NLP; o
+    resultado é acrescentado numa transação, sem reescrever a tabela. O custo
+    de uma atualização diária passa a acompanhar os comentários novos, não o
+    histórico inteiro.
+
+    Com um `IndiceMinHash` em `indice`, cada pedaço limpo é deduplicado antes
+    do NLP: só o texto dos comentários canônicos é classificado, as duplicatas
+    são gravadas com o resultado do canônico (e a sua própria nota, produto e
+    data), e o mapeamento de todos para o canônico vai para a tabela
+    `review_canonica`.
+    Retorna o total de linhas gravadas nesta execução.
+    """
+    arquivo = os.path.abspath(entrada_csv)
+    progresso = {} if recomecar else _ler_checkpoint(db_path, arquivo)
+    partes = partes_da_entrada(entrada_csv)
+    concluidas = sum(
+        1 for parte, impressao in partes
+        if parte in progresso and progresso[parte][2]
+        and impressao_confere(entrada_csv, progresso[parte][0], impressao)
+    )
+    if progresso:
+        print(f"Retomando a execução interrompida ({concluidas} de {len(partes)} partes já concluídas).")
+
+    total = 0
+    numero = 0
+    for parte, impressao in partes:
+        pular = 0
+        if parte in progresso:
+            impressao_salva, chunks_concluidos, concluida = progresso[parte]
+            if not impressao_confere(entrada_csv, impressao_salva, impressao):
+                print(f"'{parte or entrada_csv}' mudou desde a execução interrompida: processando do início.")
+            elif concluida:
+                continue
+            else:
+                pular = chunks_concluidos
+                print(f"Retomando '{parte or entrada_csv}' a partir do chunk {pular + 1}.")
+
+        for numero_parte, chunk in enumerate(ler_parte_em_chunks(entrada_csv, parte, tamanho_chunk), start=1):
+            if numero_parte <= pular:
+                continue
+            numero += 1
+
+            if incremental:
+                with obter_metricas().etapa("filtrar_novos", len(chunk)):
+                    lidas, chunk = len(chunk), filtrar_novos(chunk, db_path, table_name)
+                print(f"Chunk {numero}: {len(chunk)} de {lidas} comentários ainda não processados.")
+                if chunk.empty:
+                    _gravar_checkpoint(db_path, arquivo, parte, impressao, numero_parte)
+                    continue
+
+            if indice is None:
+                df = processar_chunk(chunk, batch_size, n_process)
+            else:
+                df, mapeamento = deduplicar_chunk(limpar_chunk(chunk), indice, db_path, table_name)
+                duplicatas = (mapeamento['id_canonico'] != mapeamento['id_comentario']).sum()
+                print(f"Chunk {numero}: {duplicatas} duplicatas de {len(mapeamento)} comentários.")
+                df = enriquecer_chunk(df, batch_size, n_process)
+            # No modo incremental as linhas já são novas: acrescentar evita varrer a tabela atrás de duplicatas
+            sucesso, mensagem = salvar_no_banco_de_dados(df, db_path, table_name,
+                                                         modo="append" if incremental else "upsert")
+            if not sucesso:
+                raise RuntimeError(f"Erro ao salvar o chunk {numero} no DuckDB: {mensagem}")
+            if indice is not None:
+                salvar_mapeamento(db_path, mapeamento)
+                indice.salvar()
+
+            total += len(df)
+            _gravar_checkpoint(db_path, arquivo, parte, impressao, numero_parte)
+            print(f"Chunk {numero}: {len(df)} linhas gravadas ({total} nesta execução, {mensagem} na tabela).")
+
+        _gravar_checkpoint(db_path, arquivo, parte, impressao, concluida=True)
+
+    # Execução completa: a próxima começa do início do arquivo
+    _gravar_checkpoint(db_path, arquivo)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline de NLP do CSV de comentários até o DuckDB.")
+    parser.add_argument("--etapa", choices=["completo", "sentimento"], default="completo",
+                        help="'sentimento' só classifica e grava --saida em Parquet, sem tópicos nem DuckDB.")
+    parser.add_argument("--saida", default=CLASSIFICADOS_PADRAO,
+                        help="Parquet gravado pela etapa 'sentimento'.")
+    parser.add_argument("--entrada", default=ENTRADA_PADRAO,
+                        help="CSV de comentários (separado por '|') ou diretório Parquet da coleta.")
+    parser.add_argument("--banco", default=BANCO_PADRAO, help="Arquivo DuckDB de saída.")
+    parser.add_argument("--tabela", default="reviews_classificadas")
+    parser.add_argument("--tamanho-chunk", type=int, default=50_000, help="Linhas lidas do CSV por vez.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Tamanho do lote do spaCy.")
+    parser.add_argument("--n-process", type=int, default=1, help="Processos do spaCy e do LeIA (-1 usa todos os núcleos).")
+    parser.add_argument("--recomecar", action="store_true", help="Ignora o checkpoint e processa o arquivo inteiro.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Processa só os comentários que ainda não estão na tabela (na etapa 'sentimento', em --saida).")
+    parser.add_argument("--deduplicar", action="store_true",
+                        help="Roda o NLP só no texto de um comentário de cada grupo de quase duplicatas (MinHash/LSH).")
+    parser.add_argument("--limiar-similaridade", type=float, default=0.8,
+                        help="Similaridade de Jaccard estimada a partir da qual dois comentários são duplicatas.")
+    parser.add_argument("--indice-minhash", default=INDICE_MINHASH_PADRAO,
+                        help="Diretório do índice persistente de assinaturas MinHash.")
+    parser.add_argument("--produtos", default=PRODUTOS_PADRAO,
+                        help="CSV (ou dataset Parquet) da coleta de produtos, com as categorias usadas nas tabelas de BI.")
+    parser.add_argument("--sem-cache", action="store_true", help="Não persiste o cache de resultados de NLP.")
+    args = parser.parse_args()
+
+    if not args.sem_cache:
+        configurar_cache(CACHE_PADRAO)
+    metricas = configurar_metricas("pipeline", LOGS_PADRAO)
+
+    if args.etapa == "sentimento":
+        with metricas.etapa("carregar_modelos"):
+            aquecer_modelos(spacy=False, preparar_fork=args.n_process != 1, processos=args.n_process)
+        with metricas.etapa("exportar_sentimentos") as etapa:
+            total = exportar_sentimentos(args.entrada, args.saida, args.tamanho_chunk, args.n_process,
+                                         args.incremental)
+            etapa["linhas"] = total
+        metricas.finalizar(METRICAS_PADRAO)
+        print(f"\n{total} comentários classificados gravados em '{args.saida}'.")
+        return
+
+    with metricas.etapa("carregar_modelos"):
+        aquecer_modelos(preparar_fork=args.n_process != 1, processos=args.n_process)
+
+    if os.path.exists(args.produtos):
+        with metricas.etapa("carregar_produtos"):
+            colunas = ['id_avaliacoes', 'categoria', 'pesquisa', 'titulo']
+            carregar_produtos(args.banco, ler_tabela(args.produtos, colunas, dtype=str), args.tabela)
+
+    indice = IndiceMinHash(args.indice_minhash, limiar=args.limiar_similaridade) if args.deduplicar else None
+
+    with metricas.etapa("pipeline") as etapa:
+        total = executar_pipeline(args.entrada, args.banco, args.tabela, args.tamanho_chunk,
+                                  args.batch_size, args.n_process, args.recomecar, args.incremental, indice)
+        etapa["linhas"] = total
+    metricas.finalizar(METRICAS_PADRAO)
+    print(f"\nPipeline concluído! {total} linhas gravadas em '{args.banco}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,92 @@
 import re
+import gc
+import atexit
+import hashlib
+import multiprocessing
+import threading
+from itertools import chain
+import numpy as np
 import pandas as pd
-from unidecode import unidecode
-from LeIA import SentimentIntensityAnalyzer
-import spacy
-from sqlalchemy import create_engine, text
+import pyarrow as pa
 import os
+from .cache_nlp import CacheNLP
+from comum.metricas import medir_etapa
+from comum import normalizacao
+from comum.compacto import TIPO_SENTIMENTO, codificar_topicos, codigos_e_unicos, por_valor_unico
 
 # --- CARREGAMENTO DOS MODELOS ---
 
-try:
-    _s = SentimentIntensityAnalyzer()
-except Exception as e:
-    print(f"Aviso: Não foi possível carregar o modelo LeIA. Erro: {e}")
+# Os modelos (e o próprio spaCy/LeIA) só são importados e carregados no
+# primeiro uso, uma única vez por processo, mesmo com várias threads.
+_modelos = {}
+_trava_modelos = threading.Lock()
 
-try:
-    _nlp = spacy.load("pt_core_news_sm", disable=["ner", "parser"])
-except IOError:
-    print("-------------------------------------------------------------------")
-    print("Aviso: Modelo 'pt_core_news_sm' do spaCy não encontrado.")
-    print("Por favor, execute a célula de instalação no notebook para baixá-lo.")
-    print("-------------------------------------------------------------------")
-    _nlp = None
+def _carregar_leia():
+    try:
+        from LeIA import SentimentIntensityAnalyzer
+        return SentimentIntensityAnalyzer()
+    except Exception as e:
+        print(f"Aviso: Não foi possível carregar o modelo LeIA. Erro: {e}")
+        return None
+
+def _carregar_spacy():
+    import spacy
+    try:
+        return spacy.load("pt_core_news_sm", disable=["ner", "parser"])
+    except IOError:
+        print("-------------------------------------------------------------------")
+        print("Aviso: Modelo 'pt_core_news_sm' do spaCy não encontrado.")
+        print("Por favor, execute a célula de instalação no notebook para baixá-lo.")
+        print("-------------------------------------------------------------------")
+        return None
+
+_carregadores = {"leia": _carregar_leia, "spacy": _carregar_spacy}
+
+def _modelo(nome):
+    """Retorna o modelo `nome` ('leia' ou 'spacy'), carregando-o no primeiro uso (None se indisponível)."""
+    try:
+        return _modelos[nome]
+    except KeyError:
+        pass
+    with _trava_modelos:
+        if nome not in _modelos:
+            _modelos[nome] = _carregadores[nome]()
+        return _modelos[nome]
+
+def aquecer_modelos(leia=True, spacy=True, preparar_fork=False, processos=1):
+    """
+    Carrega os modelos antes do primeiro uso (por exemplo, no início de um
+    pipeline, para não pagar o carregamento no meio da primeira etapa).
+
+    Com `preparar_fork=True`, os objetos já carregados são congelados
+    (`gc.freeze`), para que processos criados depois com fork compartilhem as
+    páginas de memória dos modelos em vez de copiá-las quando o coletor de
+    lixo passar por elas. Com `processos` > 1 (-1 usa todos os núcleos), o
+    pool de `pontuar_sentimentos` também é criado aqui, com fork, logo depois
+    do LeIA e antes do spaCy, de conexões com o banco ou de outras threads:
+    um fork no meio da execução pode herdar uma trava presa por outra thread.
+    Deve ser chamada no início do programa. Retorna {modelo: carregado com sucesso}.
+    """
+    disponiveis = {}
+    if leia:
+        disponiveis["leia"] = _modelo("leia") is not None
+        if disponiveis["leia"]:
+            _namespace("leia")
+            processos = _resolver_processos(processos)
+            if preparar_fork and processos > 1:
+                _obter_pool(processos, fork=True)
+    if spacy:
+        disponiveis["spacy"] = _modelo("spacy") is not None
+        if disponiveis["spacy"]:
+            _namespace("topicos")
+    if preparar_fork:
+        gc.collect()
+        gc.freeze()
+    return disponiveis
+
+# Cache dos resultados de NLP por texto (só em memória até `configurar_cache` ser chamada)
+_cache = CacheNLP()
+_namespaces = {}
 
 # Lista de termos que forçam uma classificação positiva (para corrigir notas erradas)
 _termos_positivos_fortes = [
@@ -28,21 +94,68 @@ _termos_positivos_fortes = [
     'maravilhosa', 'maravilhoso', 'adorei', 'amei', 'show', 'incrivel'
 ]
 
+# Casa qualquer um dos termos como palavra inteira (mesmo critério de `texto.split()`)
+_regex_termos_positivos_fortes = re.compile(
+    r'(?:^|\s)(?:' + '|'.join(_termos_positivos_fortes) + r')(?=\s|$)'
+)
+
+# --- CACHE DE RESULTADOS ---
+
+def configurar_cache(caminho=None, tamanho_lru=100_000):
+    """
+    Define onde os scores de sentimento e os tópicos já calculados são guardados.
+    Com `caminho`, os resultados persistem em um banco SQLite entre execuções;
+    sem ele, ficam apenas num LRU em memória com `tamanho_lru` entradas.
+    """
+    global _cache
+    _cache.fechar()
+    _cache = CacheNLP(caminho, tamanho_lru)
+
+def _namespace(modelo):
+    """Identificador do modelo e da sua versão, usado como prefixo das chaves do cache."""
+    if modelo not in _namespaces:
+        if modelo == "leia":
+            import LeIA
+            pasta = os.path.dirname(LeIA.__file__)
+            arquivos = [os.path.join(pasta, "leia.py")] + sorted(
+                os.path.join(pasta, "lexicons", nome) for nome in os.listdir(os.path.join(pasta, "lexicons"))
+            )
+            h = hashlib.sha1()
+            for arquivo in arquivos:
+                with open(arquivo, "rb") as f:
+                    h.update(f.read())
+            _namespaces[modelo] = f"leia:{h.hexdigest()}"
+        else:
+            import spacy
+            meta = _modelo("spacy").meta
+            _namespaces[modelo] = f"topicos:{meta['lang']}_{meta['name']}-{meta['version']}:spacy-{spacy.__version__}"
+    return _namespaces[modelo]
+
+def _memoizar(modelo, textos_unicos, calcular):
+    """
+    Retorna {texto: resultado} para `textos_unicos`, buscando primeiro no cache
+    e chamando `calcular(lista_de_textos)` apenas para os textos ainda não vistos.
+    """
+    namespace = _namespace(modelo)
+    resultados = _cache.obter_muitos(namespace, [t for t in textos_unicos if isinstance(t, str)])
+    faltantes = [t for t in textos_unicos if t not in resultados]
+    if faltantes:
+        novos = dict(zip(faltantes, calcular(faltantes)))
+        _cache.salvar_muitos(namespace, {t: v for t, v in novos.items() if isinstance(t, str)})
+        resultados.update(novos)
+    return resultados
+
 # --- FUNÇÕES DE LIMPEZA E CLASSIFICAÇÃO ---
 
 def limpar_texto(texto):
     """
     Realiza a limpeza e normalização de um texto: converte para minúsculas,
     remove acentos e caracteres não-alfabéticos.
+    Para uma Series inteira, use `comum.normalizacao.limpar_serie`.
     """
-    texto = str(texto).lower()
-    texto = unidecode(texto)
-    texto = re.sub(r'[^a-z\s]', '', texto)
-    return texto
+    return normalizacao.limpar_texto(texto)
 
-def _analisar_sentimento_texto(texto):
-    """Função interna para classificar um único texto."""
-    score = _s.polarity_scores(texto)['compound']
+def _rotulo_do_score(score):
     if score > 0.05:
         return 'Positivo'
     elif score < -0.05:
@@ -50,47 +163,152 @@ def _analisar_sentimento_texto(texto):
     else:
         return 'Neutro'
 
-def classificar_sentimento(df):
+def _analisar_sentimento_texto(texto):
+    """Função interna para classificar um único texto."""
+    return _rotulo_do_score(_scores_compound([texto])[0])
+
+# --- PONTUAÇÃO DE SENTIMENTO EM VÁRIOS PROCESSOS ---
+
+_pool = None
+_processos_pool = 0
+
+def _pontuar_lote(textos):
+    """Scores 'compound' de uma lista de textos (roda no processo atual ou num processo do pool)."""
+    analisador = _modelo("leia")
+    return [analisador.polarity_scores(texto)['compound'] for texto in textos]
+
+def _resolver_processos(processos):
+    if processos in (None, -1):
+        return os.cpu_count() or 1
+    return processos
+
+def _obter_pool(processos, fork=False):
+    """
+    Pool de processos reaproveitado entre chamadas.
+
+    Com `fork=True` (em `aquecer_modelos`, no início do programa, onde há
+    fork), o léxico do LeIA já carregado é herdado pelos processos (páginas
+    compartilhadas, congeladas para o coletor de lixo não copiá-las). Criado
+    no meio da execução, quando já pode haver outras threads e conexões
+    abertas, o pool usa forkserver (ou spawn), e cada processo carrega o
+    LeIA uma vez.
+    """
+    global _pool, _processos_pool
+    if _pool is not None and _processos_pool == processos:
+        return _pool
+
+    encerrar_pool()
+    metodos = multiprocessing.get_all_start_methods()
+    usa_fork = fork and "fork" in metodos
+    if usa_fork:
+        contexto = multiprocessing.get_context("fork")
+    else:
+        contexto = multiprocessing.get_context("forkserver" if "forkserver" in metodos else "spawn")
+    # Se os modelos já foram congelados por `aquecer_modelos`, continuam congelados
+    congelar = usa_fork and not gc.get_freeze_count()
+    if congelar:
+        gc.collect()
+        gc.freeze()
+    try:
+        _pool = contexto.Pool(processos)
+    finally:
+        if congelar:
+            gc.unfreeze()
+    _processos_pool = processos
+    return _pool
+
+def encerrar_pool():
+    """Encerra o pool de processos de `pontuar_sentimentos`, se houver um."""
+    global _pool, _processos_pool
+    if _pool is not None:
+        _pool.close()
+        _pool.join()
+        _pool = None
+        _processos_pool = 0
+
+atexit.register(encerrar_pool)
+
+def pontuar_sentimentos(textos, processos=1, tamanho_lote=2000):
+    """
+    Calcula o score 'compound' do LeIA para cada texto de `textos` e retorna
+    um array do NumPy alinhado com a entrada.
+
+    Com `processos` > 1 (-1 usa todos os núcleos), os textos são divididos em
+    lotes de `tamanho_lote` e pontuados em paralelo num pool de processos; os
+    scores são os mesmos do `polarity_scores` do LeIA, texto a texto. Entradas
+    pequenas demais para compensar o paralelismo rodam no processo atual.
+    """
+    textos = list(textos)
+    processos = _resolver_processos(processos)
+    if processos <= 1 or len(textos) < 2 * tamanho_lote:
+        return np.array(_pontuar_lote(textos), dtype=float)
+
+    lotes = [textos[inicio:inicio + tamanho_lote] for inicio in range(0, len(textos), tamanho_lote)]
+    resultados = _obter_pool(processos).map(_pontuar_lote, lotes)
+    return np.fromiter(chain.from_iterable(resultados), dtype=float, count=len(textos))
+
+def _scores_compound(textos, processos=1):
+    """
+    Calcula o score 'compound' do LeIA para um array de textos, rodando o
+    modelo uma única vez por texto distinto (e nunca para textos já no cache).
+    Retorna um array alinhado com a entrada.
+    """
+    codigos, unicos = pd.factorize(np.asarray(textos, dtype=object), use_na_sentinel=False)
+    scores = _memoizar(
+        "leia", list(unicos),
+        lambda faltantes: pontuar_sentimentos(faltantes, processos).tolist(),
+    )
+    scores_unicos = np.array([scores[texto] for texto in unicos], dtype=float)
+    return scores_unicos[codigos]
+
+@medir_etapa("classificar_sentimento")
+def classificar_sentimento(df, processos=1):
     """
     Aplica a lógica de classificação de sentimento completa (híbrida) a um DataFrame.
     O DF de entrada deve conter 'comentario_limpo' e 'rating_do_comentario'.
+    `processos` é repassado a `pontuar_sentimentos` (-1 usa todos os núcleos).
+    A regex e o LeIA rodam uma vez por texto distinto (ver `comum.compacto`).
     """
-    
-    # Camada 1 e 2: Classificação híbrida inicial
-    def classificar_hibrido(row):
-        if row['rating_do_comentario'] >= 4:
-            return 'Positivo'
-        elif row['rating_do_comentario'] <= 2:
-            return 'Negativo'
-        else: # rating == 3
-            return _analisar_sentimento_texto(row['comentario_limpo'])
-
-    df['sentimento_inicial'] = df.apply(classificar_hibrido, axis=1)
-
-    # Camada 3: Correção de inconsistências (ex: nota 1, texto "ótimo")
-    def corrigir_negativos(row):
-        if row['sentimento_inicial'] == 'Negativo':
-            if any(termo in row['comentario_limpo'].split() for termo in _termos_positivos_fortes):
-                return 'Positivo'
-            if _analisar_sentimento_texto(row['comentario_limpo']) == 'Positivo':
-                return 'Positivo'
-        return row['sentimento_inicial']
-
-    df['sentimento'] = df.apply(corrigir_negativos, axis=1)
-    df.drop(columns=['sentimento_inicial'], inplace=True)
-    
+    nota = df['rating_do_comentario']
+    texto = df['comentario_limpo']
+
+    # Camada 1: Classificação pela nota
+    positivo = (nota >= 4).to_numpy(dtype=bool, na_value=False)
+    negativo = (nota <= 2).to_numpy(dtype=bool, na_value=False)
+    ambiguo = ~(positivo | negativo)  # rating == 3
+
+    # Camada 3 (parte 1): termos fortemente positivos, só onde o rótulo pode virar 'Negativo'
+    tem_termo_forte = np.zeros(len(df), dtype=bool)
+    candidatos = negativo | ambiguo
+    tem_termo_forte[candidatos] = por_valor_unico(
+        texto[candidatos],
+        lambda unicos: unicos.str.contains(_regex_termos_positivos_fortes, na=False).to_numpy(dtype=bool),
+    )
+
+    # Camada 2 e Camada 3 (parte 2): o LeIA roda uma vez por texto, só nas linhas que precisam dele
+    precisa_score = ambiguo | (negativo & ~tem_termo_forte)
+    score = np.full(len(df), np.nan)
+    score[precisa_score] = por_valor_unico(
+        texto[precisa_score], lambda unicos: _scores_compound(unicos.to_numpy(dtype=object), processos)
+    )
+
+    df['sentimento'] = pd.Categorical(np.select(
+        [
+            positivo,
+            tem_termo_forte & (negativo | (score < -0.05)),
+            score > 0.05,
+            negativo | (score < -0.05),
+        ],
+        ['Positivo', 'Positivo', 'Positivo', 'Negativo'],
+        default='Neutro',
+    ), dtype=TIPO_SENTIMENTO)
+
     return df
 
-def extrair_topicos(texto):
-    """
-    Processa um texto e extrai apenas os substantivos (tópicos).
-    """
-    if _nlp is None:
-        print("Modelo spaCy não carregado. Pulando extração de tópicos.")
-        return []
-        
-    doc = _nlp(texto)
-    
+# Componentes do spaCy necessários para obter o `pos_` dos tokens
+_pipes_topicos = ["tok2vec", "morphologizer", "attribute_ruler"]
+
+def _topicos_do_doc(doc):
     # Filtra palavras que são substantivos (NOUN) ou substantivos próprios (PROPN)
     # e que não sejam stopwords (palavras comuns como 'a', 'o', 'de').
     topicos = [
@@ -101,31 +319,128 @@ def extrair_topicos(texto):
     # Retorna uma lista de tópicos únicos
     return list(set(topicos))
 
-def salvar_no_banco_de_dados(df, db_path, table_name="reviews_classificadas"):
+def extrair_topicos(texto):
+    """
+    Processa um texto e extrai apenas os substantivos (tópicos).
+    """
+    nlp = _modelo("spacy")
+    if nlp is None:
+        print("Modelo spaCy não carregado. Pulando extração de tópicos.")
+        return []
+        
+    topicos = _memoizar("topicos", [texto], lambda faltantes: [_topicos_do_doc(nlp(faltantes[0]))])
+    return list(topicos[texto])
+
+@medir_etapa("extrair_topicos")
+def extrair_topicos_em_lote(textos, batch_size=1000, n_process=1):
+    """
+    Versão em lote de `extrair_topicos` para uma Series de textos, usando o
+    `nlp.pipe` do spaCy (lotes de `batch_size` textos, em `n_process` processos;
+    -1 usa todos os núcleos). Só os componentes necessários para a classe
+    gramatical ficam ativos; textos repetidos ou já no cache não passam pelo modelo.
+    Retorna uma Series com o mesmo índice da entrada, no formato compacto de
+    `comum.compacto.codificar_topicos` (vocabulário + índices + offsets).
+    """
+    nlp = _modelo("spacy")
+    if nlp is None:
+        print("Modelo spaCy não carregado. Pulando extração de tópicos.")
+        return codificar_topicos(np.zeros(len(textos), dtype=np.int64), [[]], textos.index)
+
+    def calcular(faltantes):
+        ativos = [nome for nome in _pipes_topicos if nome in nlp.pipe_names]
+        with nlp.select_pipes(enable=ativos):
+            docs = nlp.pipe(faltantes, batch_size=batch_size, n_process=n_process)
+            return [_topicos_do_doc(doc) for doc in docs]
+
+    codigos, unicos = codigos_e_unicos(textos)
+    unicos = [texto if isinstance(texto, str) else str(texto) for texto in unicos]
+    topicos = _memoizar("topicos", unicos, calcular)
+    return codificar_topicos(codigos, [topicos[texto] for texto in unicos], textos.index)
+
+@medir_etapa("salvar_no_banco_de_dados")
+def salvar_no_banco_de_dados(df, db_path, table_name="reviews_classificadas", modo="replace", chave="id_comentario",
+                             agregados=True):
     """
     Salva o DataFrame final em um banco de dados DuckDB.
+    O DataFrame é lido diretamente pelo DuckDB (sem cópia nem inserção linha a
+    linha) e a coluna 'topicos' é gravada como lista nativa (VARCHAR[]).
+
+    modo='replace' recria a tabela, modo='append' acrescenta as linhas e
+    modo='upsert' substitui as linhas cujo `chave` já existe na tabela (e
+    mantém só a última de cada `chave` repetida no próprio DataFrame). Uma
+    tabela existente com `topicos` em texto (versão antiga) é migrada antes.
+
+    Com `agregados=True` (e as colunas de `reviews_classificadas`), a mesma
+    transação mantém as tabelas de BI de `agregados.py`: `review_topicos` e
+    as contagens pré-calculadas, recriadas no modo 'replace' e atualizadas
+    só com a diferença nos demais.
     Retorna (True, contagem_de_linhas) em caso de sucesso.
     Retorna (False, erro) em caso de falha.
     """
+    if modo not in ("replace", "append", "upsert"):
+        return False, f"Modo inválido: {modo}"
+
+    import duckdb
+    from . import agregados as bi
+
+    agregados = agregados and bi.tem_colunas_necessarias(df.columns)
+
     try:
         # Garante que o diretório de saída exista
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        
-        engine = create_engine(f"duckdb:///{db_path}")
-        
-        # Converte colunas de lista (como 'topicos') para string
-        # Bando de dados SQL não armazena listas nativamente
-        df_para_salvar = df.copy()
-        if 'topicos' in df_para_salvar.columns:
-            df_para_salvar['topicos'] = df_para_salvar['topicos'].astype(str)
-            
-        df_para_salvar.to_sql(table_name, engine, if_exists='replace', index=False)
-        
-        # Verificação
-        with engine.connect() as conn:
-            query = text(f"SELECT COUNT(*) FROM {table_name}")
-            count = conn.execute(query).scalar()
+
+        if modo == "upsert":
+            # Repetições da chave dentro do próprio lote ficam só com a última
+            df = df.drop_duplicates(subset=[chave], keep="last")
+
+        if 'topicos' in df.columns and isinstance(df['topicos'].dtype, pd.ArrowDtype) \
+                and not df['topicos'].list.len().sum():
+            # O DuckDB não lê uma lista codificada por dicionário sem nenhum valor (todas vazias)
+            df = df.assign(topicos=df['topicos'].astype(pd.ArrowDtype(pa.list_(pa.string()))))
+
+        # Colunas categóricas (ENUM em algumas versões do DuckDB) e os tópicos
+        # codificados por dicionário são gravados como texto comum
+        conversoes = [f'CAST("{coluna}" AS VARCHAR) AS "{coluna}"' for coluna in df.columns
+                      if isinstance(df[coluna].dtype, pd.CategoricalDtype)]
+        if 'topicos' in df.columns:
+            conversoes.append("CAST(topicos AS VARCHAR[]) AS topicos")
+        consulta = "SELECT * FROM df_novo"
+        if conversoes:
+            consulta = f"SELECT * REPLACE ({', '.join(conversoes)}) FROM df_novo"
+
+        with duckdb.connect(db_path) as con:
+            con.register("df_novo", df)
+            con.execute("BEGIN TRANSACTION")
+            if modo == "replace":
+                con.execute(f'CREATE OR REPLACE TABLE "{table_name}" AS {consulta}')
+                if agregados:
+                    bi.reconstruir_agregados(con, table_name)
+            else:
+                con.execute(f'CREATE TABLE IF NOT EXISTS "{table_name}" AS {consulta} LIMIT 0')
+                bi.migrar_topicos(con, table_name)
+                # Sem as tabelas de BI (banco de uma versão anterior), elas são
+                # calculadas sobre a tabela inteira depois da gravação
+                reconstruir = agregados and not bi.existem(con)
+                antigas = None
+                if modo == "upsert":
+                    # Ids gravados como número por versões anteriores são comparados como texto
+                    filtro = f'WHERE CAST("{chave}" AS VARCHAR) IN (SELECT CAST("{chave}" AS VARCHAR) FROM df_novo)'
+                    if agregados and not reconstruir:
+                        antigas = "reviews_substituidas"
+                        con.execute(f'CREATE OR REPLACE TEMP TABLE {antigas} AS SELECT * FROM "{table_name}" {filtro}')
+                    con.execute(f'DELETE FROM "{table_name}" {filtro}')
+                con.execute(f'INSERT INTO "{table_name}" BY NAME {consulta}')
+                if reconstruir:
+                    bi.reconstruir_agregados(con, table_name)
+                elif agregados:
+                    con.execute(f"CREATE OR REPLACE TEMP VIEW reviews_novas AS {consulta}")
+                    bi.atualizar_agregados(con, "reviews_novas", antigas)
+            con.execute("COMMIT")
+            con.unregister("df_novo")
+
+            # Verificação
+            count = con.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
         return True, count
         
     except Exception as e:
-        return False, str(e)
\ No newline at end of file
+        return False, str(e)
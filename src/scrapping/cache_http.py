@@ -0,0 +1,172 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Validade padrão (em segundos) das respostas de cada fonte
+TTL_PADRAO = {
+    "produtos": 7 * 24 * 3600,
+    "avaliacoes": 12 * 3600,
+}
+
+TAMANHO_MAXIMO_PADRAO = 2 * 1024 ** 3
+
+
+class RespostaCache:
+    """Resposta reconstruída a partir do cache, com a mesma interface usada dos objetos `requests.Response`."""
+
+    def __init__(self, url, conteudo, status_code=200):
+        self.url = url
+        self.content = conteudo
+        self.status_code = status_code
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        pass
+
+
+class CacheHTTP:
+    """
+    Cache em disco das respostas HTTP, endereçado pelo hash da URL de destino
+    (nunca pela URL do proxy, que contém o token).
+
+    Os corpos ficam comprimidos com gzip em `diretorio/xx/<sha256>.gz` e um
+    índice SQLite guarda a fonte, a data de download e o último acesso de cada
+    entrada. Cada fonte tem seu próprio TTL; quando o tamanho total passa de
+    `tamanho_maximo`, as entradas acessadas há mais tempo são removidas (LRU).
+
+    No modo `offline`, nenhuma requisição deve ser feita: o cache devolve
+    qualquer resposta guardada, mesmo expirada, e uma ausência vira None.
+    """
+
+    def __init__(self, diretorio, ttl=None, tamanho_maximo=TAMANHO_MAXIMO_PADRAO, offline=False):
+        self.diretorio = diretorio
+        self.ttl = dict(TTL_PADRAO, **(ttl or {}))
+        self.tamanho_maximo = tamanho_maximo
+        self.offline = offline
+        self._trava = threading.Lock()
+
+        os.makedirs(diretorio, exist_ok=True)
+        # Vários scrapers podem usar o mesmo cache ao mesmo tempo (etapas paralelas do orquestrador)
+        self.conn = sqlite3.connect(os.path.join(diretorio, "indice.db"), timeout=60, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS respostas (
+                chave TEXT PRIMARY KEY,
+                url TEXT,
+                fonte TEXT,
+                tamanho INTEGER,
+                criado_em REAL,
+                ultimo_acesso REAL
+            )
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def chave(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, chave[:2], f"{chave}.gz")
+
+    def obter(self, url, fonte):
+        """Retorna uma `RespostaCache` para `url` se houver entrada válida, ou None."""
+        chave = self.chave(url)
+        with self._trava:
+            linha = self.conn.execute(
+                "SELECT criado_em FROM respostas WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha is None:
+                return None
+            if not self.offline and time.time() - linha[0] > self.ttl.get(fonte, 0):
+                return None
+            try:
+                with gzip.open(self._caminho(chave), "rb") as arquivo:
+                    conteudo = arquivo.read()
+            except OSError:
+                self._remover(chave)
+                self.conn.commit()
+                return None
+            self.conn.execute(
+                "UPDATE respostas SET ultimo_acesso = ? WHERE chave = ?", (time.time(), chave)
+            )
+            self.conn.commit()
+        return RespostaCache(url, conteudo)
+
+    def contem(self, url, fonte):
+        """Indica se `obter` devolveria uma resposta para `url`, sem ler o corpo."""
+        with self._trava:
+            linha = self.conn.execute(
+                "SELECT criado_em FROM respostas WHERE chave = ?", (self.chave(url),)
+            ).fetchone()
+        if linha is None:
+            return False
+        return self.offline or time.time() - linha[0] <= self.ttl.get(fonte, 0)
+
+    def salvar(self, url, fonte, conteudo):
+        """Guarda o corpo de uma resposta bem-sucedida (bytes ou str)."""
+        if isinstance(conteudo, str):
+            conteudo = conteudo.encode("utf-8")
+        chave = self.chave(url)
+        caminho = self._caminho(chave)
+        comprimido = gzip.compress(conteudo)
+
+        with self._trava:
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            # Outro processo pode gravar a mesma URL ao mesmo tempo: o temporário é só deste
+            temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporario, "wb") as arquivo:
+                arquivo.write(comprimido)
+            os.replace(temporario, caminho)
+
+            agora = time.time()
+            # Uma transação só: o upsert trava o índice para escrita até o commit,
+            # então o tamanho lido em `_despejar` é o de todos os processos
+            with self.conn:
+                self.conn.execute(
+                    """
+                    INSERT INTO respostas VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (chave) DO UPDATE SET
+                        url = excluded.url, fonte = excluded.fonte, tamanho = excluded.tamanho,
+                        criado_em = excluded.criado_em, ultimo_acesso = excluded.ultimo_acesso
+                    """,
+                    (chave, url, fonte, len(comprimido), agora, agora),
+                )
+                self._despejar()
+
+    def _remover(self, chave):
+        self.conn.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+        try:
+            os.remove(self._caminho(chave))
+        except FileNotFoundError:
+            pass
+
+    def _despejar(self):
+        """
+        Remove as entradas menos recentemente usadas até o cache voltar a 90%
+        do limite. O tamanho total vem do índice, não de uma conta deste
+        processo, já que outros processos também gravam e removem entradas.
+        """
+        total = self.conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()[0]
+        if total <= self.tamanho_maximo:
+            return
+        alvo = self.tamanho_maximo * 0.9
+        antigas = self.conn.execute(
+            "SELECT chave, tamanho FROM respostas ORDER BY ultimo_acesso"
+        ).fetchall()
+        for chave, tamanho in antigas:
+            if total <= alvo:
+                break
+            self._remover(chave)
+            total -= tamanho
+
+    def fechar(self):
+        self.conn.close()
@@ -0,0 +1,61 @@
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+    import h2  # noqa: F401 (necessário para o HTTP/2 do httpx)
+except ImportError:
+    httpx = None
+
+TAMANHO_POOL_PADRAO = 10
+
+URL_PROXY = "http://api.scrape.do/"
+
+# Exceções de rede/HTTP levantadas pelas sessões criadas aqui
+ERROS_HTTP = (requests.RequestException,) + ((httpx.HTTPError,) if httpx is not None else ())
+
+
+def criar_sessao(tamanho_pool=TAMANHO_POOL_PADRAO, tentativas=5, backoff=1.0, http2=False):
+    """
+    Cria uma sessão HTTP compartilhada pelas requisições de um scraper, com até
+    `tamanho_pool` conexões keep-alive por host reaproveitadas entre as
+    requisições (e entre threads), em vez de um novo handshake TCP/TLS a cada
+    `requests.get`.
+
+    Respostas 429/5xx são repetidas até `tentativas` vezes com backoff
+    exponencial (respeitando o Retry-After); use `tentativas=0` quando quem
+    chama já tem a própria política de novas tentativas.
+
+    Com `http2=True` e o `httpx[http2]` instalado, usa um cliente HTTP/2 (uma
+    conexão multiplexada por host); nesse caso só falhas de conexão são
+    repetidas. Sem o httpx, cai para a sessão HTTP/1.1 do requests.
+    """
+    if http2:
+        if httpx is not None:
+            limites = httpx.Limits(max_connections=tamanho_pool, max_keepalive_connections=tamanho_pool)
+            transporte = httpx.HTTPTransport(http2=True, retries=tentativas, limits=limites)
+            return httpx.Client(http2=True, transport=transporte, follow_redirects=True)
+        print("Aviso: httpx[http2] não instalado; usando conexões HTTP/1.1 keep-alive.")
+
+    retry = Retry(
+        total=tentativas,
+        backoff_factor=backoff,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=tamanho_pool, max_retries=retry)
+    sessao = requests.Session()
+    sessao.mount("https://", adapter)
+    sessao.mount("http://", adapter)
+    return sessao
+
+
+def url_via_proxy(url, token, geo_code="br"):
+    """Monta a URL do scrape.do para `url`, com a URL de destino codificada como parâmetro."""
+    url_codificada = urllib.parse.quote(url, safe="")
+    return f"{URL_PROXY}?token={token}&url={url_codificada}&geoCode={geo_code}"
@@ -0,0 +1,196 @@
+import sqlite3
+import csv
+import os
+from datetime import datetime, timedelta
+
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+
+
+class EstadoColeta:
+    """
+    Banco SQLite local com o estado das coletas, usado para rodar os scrapers
+    de forma incremental e retomar uma execução interrompida.
+
+    - `produtos`: para cada `id_produto`, o `id_avaliacoes` resolvido e a data da coleta.
+    - `avaliacoes`: para cada `id_avaliacoes`, a data da última coleta, o `reviewCount`,
+      o id do comentário mais recente e um hash da primeira página da API.
+    - `comentarios`: os `id_comentario` já gravados, para não duplicar linhas no CSV.
+
+    Registros feitos com `commit=False` ficam em memória e só são escritos no
+    banco no próximo `commit`, numa transação curta: assim o banco não fica
+    travado entre um lote gravado e outro e vários trabalhadores (ver
+    `fila_trabalho.py`) podem compartilhá-lo.
+    """
+
+    def __init__(self, caminho):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        # Vários trabalhadores (ver fila_trabalho.py) podem escrever no mesmo banco
+        self.conn = sqlite3.connect(caminho, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS produtos (
+                id_produto TEXT PRIMARY KEY,
+                id_avaliacoes TEXT,
+                ultima_coleta TEXT
+            );
+            CREATE TABLE IF NOT EXISTS avaliacoes (
+                id_avaliacoes TEXT PRIMARY KEY,
+                ultima_coleta TEXT,
+                quantidade_avaliacoes INTEGER,
+                ultimo_id_comentario TEXT,
+                hash TEXT
+            );
+            CREATE TABLE IF NOT EXISTS comentarios (
+                id_comentario TEXT PRIMARY KEY
+            );
+        """)
+        self.conn.commit()
+        # Escritas adiadas até o próximo commit: [(sql, linhas)]
+        self._adiados = []
+        self._produtos_adiados = {}
+        self._comentarios_adiados = set()
+
+    def _gravar(self, sql, linhas, commit):
+        self._adiados.append((sql, linhas))
+        if commit:
+            self.commit()
+
+    def fechar(self):
+        self.conn.close()
+
+    # --- Produtos (get_products) ---
+
+    def produto_resolvido(self, id_produto):
+        """Indica se o produto já teve o `id_avaliacoes` encontrado numa coleta anterior."""
+        if id_produto in self._produtos_adiados:
+            return self._produtos_adiados[id_produto] not in (None, "", "N/A")
+        linha = self.conn.execute(
+            "SELECT id_avaliacoes FROM produtos WHERE id_produto = ?", (id_produto,)
+        ).fetchone()
+        return linha is not None and linha[0] not in (None, "", "N/A")
+
+    def avaliacoes_registradas(self, id_produto):
+        """
+        Retorna o `id_avaliacoes` já gravado para o produto ("N/A" se ele foi
+        visitado sem ser resolvido), ou None se o produto nunca foi visitado.
+        """
+        if id_produto in self._produtos_adiados:
+            valor = self._produtos_adiados[id_produto]
+        else:
+            linha = self.conn.execute(
+                "SELECT id_avaliacoes FROM produtos WHERE id_produto = ?", (id_produto,)
+            ).fetchone()
+            if linha is None:
+                return None
+            valor = linha[0]
+        return "N/A" if valor in (None, "") else valor
+
+    def registrar_produto(self, id_produto, id_avaliacoes, commit=True):
+        self._produtos_adiados[id_produto] = id_avaliacoes
+        self._gravar(
+            "INSERT OR REPLACE INTO produtos VALUES (?, ?, ?)",
+            [(id_produto, id_avaliacoes, datetime.now().strftime(FORMATO_DATA))],
+            commit,
+        )
+
+    def importar_produtos_csv(self, caminho):
+        """Carrega um `avaliacoes_casasbahia.csv` já existente para um banco recém-criado."""
+        if not os.path.exists(caminho):
+            return
+        with open(caminho, newline="", encoding="utf-8") as arquivo:
+            self.importar_produtos(
+                (row["id_produto"], row.get("id_avaliacoes"))
+                for row in csv.DictReader(arquivo, delimiter="|")
+            )
+
+    def importar_produtos(self, pares):
+        """Carrega pares (id_produto, id_avaliacoes) já gravados para um banco recém-criado."""
+        if self.conn.execute("SELECT 1 FROM produtos LIMIT 1").fetchone():
+            return
+        linhas = [(id_produto, id_avaliacoes, None) for id_produto, id_avaliacoes in pares if id_produto]
+        self.conn.executemany("INSERT OR REPLACE INTO produtos VALUES (?, ?, ?)", linhas)
+        self.conn.commit()
+
+    # --- Avaliações (get_reviews) ---
+
+    def carregar_avaliacoes(self):
+        """Retorna {id_avaliacoes: (quantidade_avaliacoes, hash)} da última coleta de cada produto."""
+        return {
+            id_avaliacoes: (quantidade, hash_pagina)
+            for id_avaliacoes, quantidade, hash_pagina in self.conn.execute(
+                "SELECT id_avaliacoes, quantidade_avaliacoes, hash FROM avaliacoes"
+            )
+        }
+
+    def avaliacoes_recentes(self, horas):
+        """Conjunto dos `id_avaliacoes` coletados nas últimas `horas` horas."""
+        limite = (datetime.now() - timedelta(hours=horas)).strftime(FORMATO_DATA)
+        return {
+            linha[0] for linha in self.conn.execute(
+                "SELECT id_avaliacoes FROM avaliacoes WHERE ultima_coleta >= ?", (limite,)
+            )
+        }
+
+    def registrar_avaliacoes(self, id_avaliacoes, quantidade, ultimo_id_comentario, hash_pagina, commit=True):
+        self._gravar(
+            "INSERT OR REPLACE INTO avaliacoes VALUES (?, ?, ?, ?, ?)",
+            [(id_avaliacoes, datetime.now().strftime(FORMATO_DATA), quantidade,
+              ultimo_id_comentario, hash_pagina)],
+            commit,
+        )
+
+    def filtrar_comentarios_novos(self, linhas, indice_id):
+        """
+        Remove de `linhas` os comentários já gravados e registra os restantes.
+        O commit fica a cargo de quem chama, depois que as linhas forem escritas.
+        """
+        ids = [linha[indice_id] for linha in linhas]
+        existentes = set()
+        for inicio in range(0, len(ids), 500):
+            lote = ids[inicio:inicio + 500]
+            marcadores = ",".join("?" * len(lote))
+            existentes.update(
+                linha[0] for linha in self.conn.execute(
+                    f"SELECT id_comentario FROM comentarios WHERE id_comentario IN ({marcadores})", lote
+                )
+            )
+        novas = []
+        for linha in linhas:
+            if linha[indice_id] not in existentes and linha[indice_id] not in self._comentarios_adiados:
+                self._comentarios_adiados.add(linha[indice_id])
+                novas.append(linha)
+        self._gravar(
+            "INSERT OR IGNORE INTO comentarios VALUES (?)", [(linha[indice_id],) for linha in novas], False
+        )
+        return novas
+
+    def importar_comentarios_csv(self, caminho):
+        """Carrega os `id_comentario` de um `comentarios_produtos.csv` já existente para um banco recém-criado."""
+        if not os.path.exists(caminho):
+            return
+        with open(caminho, newline="", encoding="utf-8") as arquivo:
+            self.importar_comentarios(row["id_comentario"] for row in csv.DictReader(arquivo, delimiter="|"))
+
+    def importar_comentarios(self, ids):
+        """Carrega `id_comentario`s já gravados (de qualquer formato de saída) para um banco recém-criado."""
+        if self.conn.execute("SELECT 1 FROM comentarios LIMIT 1").fetchone():
+            return
+        self.conn.executemany("INSERT OR IGNORE INTO comentarios VALUES (?)", ((i,) for i in ids))
+        self.conn.commit()
+
+    def limpar_avaliacoes(self):
+        """Esquece as coletas de avaliações anteriores (usado para refazer a coleta do zero)."""
+        self.conn.execute("DELETE FROM avaliacoes")
+        self.conn.execute("DELETE FROM comentarios")
+        self.conn.commit()
+
+    def commit(self):
+        """Escreve os registros adiados numa única transação."""
+        if not self._adiados:
+            return
+        with self.conn:
+            for sql, linhas in self._adiados:
+                self.conn.executemany(sql, linhas)
+        self._adiados = []
+        self._produtos_adiados = {}
+        self._comentarios_adiados = set()
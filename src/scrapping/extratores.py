@@ -0,0 +1,141 @@
+import json
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+CLASSE_KONFIDENCY = "konfidency-reviews-summary"
+TAMANHO_BLOCO = 64 * 1024
+
+CAMPOS_PRODUTO = ["id_avaliacoes", "preco", "vendedor", "nota_media", "quantidade_avaliacoes"]
+
+
+def _dados_vazios():
+    return {campo: "N/A" for campo in CAMPOS_PRODUTO}
+
+
+def _eh_produto(item):
+    """Se um nó JSON-LD é do tipo Product (`@type` pode ser um texto ou uma lista de tipos)."""
+    tipo = item.get("@type")
+    return tipo == "Product" or (isinstance(tipo, list) and "Product" in tipo)
+
+
+def _ler_json_ld(texto, dados):
+    """
+    Preenche preço, vendedor e resumo de notas a partir de um bloco JSON-LD do
+    tipo Product. Retorna se encontrou o produto; JSON inválido ou de outro
+    formato (um valor solto, uma lista de valores) é ignorado.
+    """
+    try:
+        conteudo = json.loads(texto)
+    except (TypeError, ValueError):
+        return False
+
+    if isinstance(conteudo, dict):
+        itens = conteudo.get("@graph", [conteudo])
+    else:
+        itens = conteudo
+    if not isinstance(itens, list):
+        return False
+
+    for item in itens:
+        if not isinstance(item, dict) or not _eh_produto(item):
+            continue
+
+        ofertas = item.get("offers") or {}
+        if isinstance(ofertas, list):
+            ofertas = ofertas[0] if ofertas else {}
+        if not isinstance(ofertas, dict):
+            ofertas = {}
+        preco = ofertas.get("price", ofertas.get("lowPrice"))
+        if preco is not None:
+            dados["preco"] = preco
+        vendedor = ofertas.get("seller") or {}
+        if isinstance(vendedor, dict) and vendedor.get("name"):
+            dados["vendedor"] = vendedor["name"]
+
+        notas = item.get("aggregateRating") or {}
+        if not isinstance(notas, dict):
+            notas = {}
+        if notas.get("ratingValue") is not None:
+            dados["nota_media"] = notas["ratingValue"]
+        if notas.get("reviewCount") is not None:
+            dados["quantidade_avaliacoes"] = notas["reviewCount"]
+        return True
+    return False
+
+
+def extrair_com_lxml(html):
+    """
+    Caminho rápido: alimenta um parser incremental do lxml em blocos e para
+    assim que encontra o `data-sku` do Konfidency e o JSON-LD do produto,
+    sem montar a árvore do restante da página.
+    """
+    dados = _dados_vazios()
+    achou_sku = achou_json_ld = False
+    parser = etree.HTMLPullParser(events=("start", "end"), tag=("div", "script"))
+
+    for inicio in range(0, len(html), TAMANHO_BLOCO):
+        parser.feed(html[inicio:inicio + TAMANHO_BLOCO])
+        for evento, elemento in parser.read_events():
+            if evento == "start":
+                if not achou_sku and elemento.tag == "div" \
+                        and CLASSE_KONFIDENCY in (elemento.get("class") or "").split():
+                    sku = elemento.get("data-sku")
+                    if sku is not None:
+                        dados["id_avaliacoes"] = sku
+                    achou_sku = True
+            else:
+                if not achou_json_ld and elemento.tag == "script" \
+                        and elemento.get("type") == "application/ld+json":
+                    achou_json_ld = _ler_json_ld(elemento.text, dados)
+                # Libera o conteúdo já lido para não acumular a árvore inteira em memória
+                elemento.clear()
+
+        if achou_sku and achou_json_ld:
+            break
+
+    return dados
+
+
+def extrair_com_bs4(html):
+    """Caminho de referência: árvore completa do BeautifulSoup com o html.parser."""
+    dados = _dados_vazios()
+    soup = BeautifulSoup(html, "html.parser")
+
+    konfidency_div = soup.find("div", class_=CLASSE_KONFIDENCY)
+    if konfidency_div and konfidency_div.has_attr("data-sku"):
+        dados["id_avaliacoes"] = konfidency_div["data-sku"]
+
+    for script in soup.find_all("script", type="application/ld+json"):
+        if _ler_json_ld(script.string, dados):
+            break
+
+    return dados
+
+
+EXTRATORES = {
+    "lxml": extrair_com_lxml,
+    "bs4": extrair_com_bs4,
+}
+
+
+def extrair_dados_produto(html, extrator=None):
+    """
+    Extrai `id_avaliacoes`, preço, vendedor e resumo das notas de uma página de produto.
+    Usa o caminho rápido do lxml quando disponível e o BeautifulSoup caso
+    contrário (ou se o lxml falhar com a página).
+    """
+    if extrator is None:
+        extrator = "lxml" if etree is not None else "bs4"
+
+    if extrator == "lxml":
+        try:
+            return extrair_com_lxml(html)
+        except Exception as e:
+            print(f"Falha no extrator lxml, usando BeautifulSoup: {e}")
+            return extrair_com_bs4(html)
+
+    return EXTRATORES[extrator](html)
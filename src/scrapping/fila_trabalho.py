@@ -0,0 +1,302 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+PENDENTE = "pendente"
+EM_ANDAMENTO = "em_andamento"
+# Processado pelo trabalhador, aguardando as linhas chegarem ao disco para ser concluído
+PROCESSADO = "processado"
+CONCLUIDO = "concluido"
+FALHOU = "falhou"
+
+
+def identificar_trabalhador():
+    """Identificador único deste processo entre os trabalhadores (máquina + pid)."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class FilaTrabalho:
+    """
+    Fila de trabalhos em SQLite compartilhada por vários processos
+    trabalhadores (por exemplo, vários `get_reviews.py --trabalhador`, cada um
+    com a sua conta de proxy).
+
+    Cada trabalho tem uma `chave` única por `fila` (enfileirar de novo não
+    duplica) e um `dados` em JSON. Um trabalhador reivindica trabalhos com um
+    prazo (lease): enquanto o prazo vale, nenhum outro trabalhador os recebe.
+    Ao terminar, o trabalhador confirma (`concluir`) ou devolve com erro
+    (`falhar`), e o trabalho volta para a fila com espera exponencial até
+    `max_tentativas`. Trabalhos cujo prazo expirou (trabalhador morto) voltam
+    a ser entregues automaticamente, inclusive os já processados cujas linhas
+    não chegaram a ser gravadas (`marcar_processados`).
+    """
+
+    def __init__(self, caminho, max_tentativas=5, espera_base=30):
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self.max_tentativas = max_tentativas
+        self.espera_base = espera_base
+        self._trava = threading.Lock()
+        self.conn = sqlite3.connect(caminho, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA busy_timeout=60000")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS trabalhos (
+                fila TEXT,
+                chave TEXT,
+                dados TEXT,
+                estado TEXT,
+                tentativas INTEGER DEFAULT 0,
+                trabalhador TEXT,
+                disponivel_em REAL,
+                prazo REAL,
+                erro TEXT,
+                atualizado_em REAL,
+                PRIMARY KEY (fila, chave)
+            );
+            CREATE INDEX IF NOT EXISTS idx_trabalhos_disponiveis ON trabalhos (fila, estado, disponivel_em);
+        """)
+
+    def _transacao(self, funcao):
+        """Executa `funcao(cursor)` numa transação de escrita (BEGIN IMMEDIATE trava a fila entre processos)."""
+        with self._trava:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                resultado = funcao(self.conn)
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return resultado
+
+    def enfileirar(self, fila, itens):
+        """Enfileira pares (chave, dados); chaves já presentes na fila são ignoradas. Retorna quantos entraram."""
+        agora = time.time()
+        linhas = [(fila, str(chave), json.dumps(dados, ensure_ascii=False), PENDENTE, agora, agora)
+                  for chave, dados in itens]
+
+        def inserir(conn):
+            antes = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO trabalhos (fila, chave, dados, estado, disponivel_em, atualizado_em) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                linhas,
+            )
+            return conn.total_changes - antes
+
+        return self._transacao(inserir)
+
+    def reivindicar(self, fila, trabalhador, quantidade=1, prazo=600):
+        """
+        Reserva até `quantidade` trabalhos disponíveis (pendentes ou com prazo
+        expirado) para `trabalhador` por `prazo` segundos. Retorna [(chave, dados)].
+        """
+        def reservar(conn):
+            agora = time.time()
+            linhas = conn.execute(
+                """
+                SELECT chave, dados FROM trabalhos
+                WHERE fila = ? AND (
+                    (estado = ? AND disponivel_em <= ?) OR (estado IN (?, ?) AND prazo < ?)
+                )
+                ORDER BY disponivel_em LIMIT ?
+                """,
+                (fila, PENDENTE, agora, EM_ANDAMENTO, PROCESSADO, agora, quantidade),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE trabalhos SET estado = ?, trabalhador = ?, prazo = ?, atualizado_em = ? "
+                "WHERE fila = ? AND chave = ?",
+                [(EM_ANDAMENTO, trabalhador, agora + prazo, agora, fila, chave) for chave, _ in linhas],
+            )
+            return [(chave, json.loads(dados)) for chave, dados in linhas]
+
+        return self._transacao(reservar)
+
+    def renovar(self, fila, trabalhador, prazo=600):
+        """Estende o prazo de todos os trabalhos ainda reservados por `trabalhador`."""
+        agora = time.time()
+        self._transacao(lambda conn: conn.execute(
+            "UPDATE trabalhos SET prazo = ?, atualizado_em = ? WHERE fila = ? AND trabalhador = ? AND estado IN (?, ?)",
+            (agora + prazo, agora, fila, trabalhador, EM_ANDAMENTO, PROCESSADO),
+        ))
+
+    def marcar_processados(self, fila, chaves, trabalhador):
+        """
+        Marca trabalhos como processados, mas ainda não confirmados. Outros
+        trabalhadores não esperam por eles em `iterar`; se o prazo expirar
+        antes de `concluir`, voltam a ser entregues.
+        """
+        agora = time.time()
+        self._transacao(lambda conn: conn.executemany(
+            "UPDATE trabalhos SET estado = ?, atualizado_em = ? WHERE fila = ? AND chave = ? AND trabalhador = ? AND estado = ?",
+            [(PROCESSADO, agora, fila, chave, trabalhador, EM_ANDAMENTO) for chave in chaves],
+        ))
+
+    def concluir(self, fila, chaves, trabalhador):
+        """
+        Confirma trabalhos ainda reservados por `trabalhador`. Retorna as
+        chaves cujo prazo foi perdido (o trabalho já voltou para a fila ou foi
+        reivindicado por outro trabalhador) e que, portanto, não foram confirmadas.
+        """
+        def confirmar(conn):
+            agora = time.time()
+            perdidas = []
+            for chave in chaves:
+                cursor = conn.execute(
+                    "UPDATE trabalhos SET estado = ?, prazo = NULL, erro = NULL, atualizado_em = ? "
+                    "WHERE fila = ? AND chave = ? AND trabalhador = ? AND estado IN (?, ?)",
+                    (CONCLUIDO, agora, fila, chave, trabalhador, EM_ANDAMENTO, PROCESSADO),
+                )
+                if cursor.rowcount == 0:
+                    perdidas.append(chave)
+            return perdidas
+
+        return self._transacao(confirmar)
+
+    def falhar(self, fila, chave, trabalhador, erro=None):
+        """Devolve um trabalho com erro: volta a ficar pendente após uma espera exponencial, ou falha de vez."""
+        def devolver(conn):
+            agora = time.time()
+            linha = conn.execute(
+                "SELECT tentativas FROM trabalhos WHERE fila = ? AND chave = ? AND trabalhador = ? AND estado = ?",
+                (fila, chave, trabalhador, EM_ANDAMENTO),
+            ).fetchone()
+            if linha is None:
+                return
+            tentativas = linha[0] + 1
+            estado = FALHOU if tentativas >= self.max_tentativas else PENDENTE
+            conn.execute(
+                "UPDATE trabalhos SET estado = ?, tentativas = ?, prazo = NULL, erro = ?, "
+                "disponivel_em = ?, atualizado_em = ? WHERE fila = ? AND chave = ?",
+                (estado, tentativas, None if erro is None else str(erro),
+                 agora + self.espera_base * 2 ** (tentativas - 1), agora, fila, chave),
+            )
+
+        self._transacao(devolver)
+
+    def aguardando(self, fila):
+        """
+        Trabalhos que ainda podem ficar disponíveis: pendentes em espera ou em
+        andamento (que podem falhar e voltar para a fila). Os já processados
+        não contam, para que nenhum trabalhador espere a gravação de outro.
+        """
+        with self._trava:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM trabalhos WHERE fila = ? AND estado IN (?, ?)",
+                (fila, PENDENTE, EM_ANDAMENTO),
+            ).fetchone()[0]
+
+    def _manter_prazos(self, fila, trabalhador, prazo, parar):
+        """Renova os prazos de `trabalhador` a cada terço do `prazo` até `parar` ser sinalizado."""
+        while not parar.wait(prazo / 3):
+            try:
+                self.renovar(fila, trabalhador, prazo)
+            except sqlite3.Error as e:
+                print(f"Falha ao renovar o prazo dos trabalhos de {trabalhador}: {e}")
+
+    @contextmanager
+    def _batimento(self, fila, trabalhador, prazo):
+        """Mantém, numa thread, os prazos de `trabalhador` renovados enquanto o bloco roda."""
+        parar = threading.Event()
+        batimento = threading.Thread(target=self._manter_prazos, args=(fila, trabalhador, prazo, parar),
+                                     daemon=True)
+        batimento.start()
+        try:
+            yield
+        finally:
+            parar.set()
+            batimento.join()
+
+    def iterar(self, fila, trabalhador, lote=10, prazo=600, intervalo=5):
+        """
+        Gera os `dados` dos trabalhos reivindicados, `lote` por vez, até a fila
+        esvaziar. Enquanto houver trabalhos em espera ou em andamento (que
+        podem falhar ou expirar), aguarda `intervalo` segundos e tenta de novo.
+
+        Enquanto o gerador está vivo, uma thread renova o prazo dos trabalhos
+        deste trabalhador (em andamento ou aguardando confirmação), para que um
+        trabalho demorado (pausas, novas tentativas, confirmação em lote) não
+        expire e seja entregue a outro trabalhador no meio do processamento.
+        """
+        with self._batimento(fila, trabalhador, prazo):
+            while True:
+                reservados = self.reivindicar(fila, trabalhador, lote, prazo)
+                if reservados:
+                    for _, dados in reservados:
+                        yield dados
+                elif self.aguardando(fila):
+                    time.sleep(intervalo)
+                else:
+                    return
+
+    async def iterar_async(self, fila, trabalhador, lote=10, prazo=600, intervalo=5):
+        """
+        Versão assíncrona de `iterar`, para consumidores no loop de eventos: o
+        acesso ao SQLite roda em threads e a espera usa `asyncio.sleep`, então
+        as requisições em voo deste trabalhador continuam andando (e sendo
+        confirmadas) enquanto ele espera por trabalhos que ainda podem voltar.
+        """
+        with self._batimento(fila, trabalhador, prazo):
+            while True:
+                reservados = await asyncio.to_thread(self.reivindicar, fila, trabalhador, lote, prazo)
+                if reservados:
+                    for _, dados in reservados:
+                        yield dados
+                elif await asyncio.to_thread(self.aguardando, fila):
+                    await asyncio.sleep(intervalo)
+                else:
+                    return
+
+    def resumo(self, fila):
+        """Quantidade de trabalhos da `fila` em cada estado."""
+        with self._trava:
+            return dict(self.conn.execute(
+                "SELECT estado, COUNT(*) FROM trabalhos WHERE fila = ? GROUP BY estado", (fila,)
+            ).fetchall())
+
+    def fechar(self):
+        self.conn.close()
+
+
+class ConfirmacoesPendentes:
+    """
+    Acumula as chaves processadas por um trabalhador e só as confirma na fila
+    depois que o writer grava as linhas no disco: use como `ao_gravar` do
+    `EscritorParquet` (com `ao_gravar` próprio, por exemplo `estado.commit`,
+    chamado antes). Um trabalhador que morre antes da gravação não confirma
+    nada, e os trabalhos voltam para a fila quando o prazo expira.
+
+    A cada `a_cada` chaves acumuladas força a gravação do writer, para que as
+    confirmações não esperem um lote inteiro e o prazo não expire antes.
+    Chaves cujo prazo foi perdido mesmo assim são avisadas e retornadas.
+    """
+
+    def __init__(self, fila_trabalho, fila, trabalhador, ao_gravar=None, a_cada=50):
+        self.fila_trabalho = fila_trabalho
+        self.fila = fila
+        self.trabalhador = trabalhador
+        self.ao_gravar = ao_gravar
+        self.a_cada = a_cada
+        self.writer = None
+        self._chaves = []
+
+    def adicionar(self, chave):
+        self.fila_trabalho.marcar_processados(self.fila, [chave], self.trabalhador)
+        self._chaves.append(chave)
+        if self.writer is not None and len(self._chaves) >= self.a_cada:
+            self.writer.flush()
+
+    def __call__(self):
+        if self.ao_gravar:
+            self.ao_gravar()
+        if self._chaves:
+            perdidas = self.fila_trabalho.concluir(self.fila, self._chaves, self.trabalhador)
+            if perdidas:
+                print(f"Aviso: o prazo de {len(perdidas)} trabalho(s) expirou antes da confirmação e eles "
+                      f"voltaram para a fila (podem ser coletados de novo): {', '.join(perdidas[:10])}")
+            self._chaves = []
+            return perdidas
@@ -1,21 +1,51 @@
 import requests
-from bs4 import BeautifulSoup
+import asyncio
+import aiohttp
+import argparse
 import csv
 import time
 import random
 import re
 from datetime import datetime
 import os
+import sys
 from agents import USER_AGENTS
+from limitador import LimitadorTaxa
+from estado_coleta import EstadoColeta
+from cache_http import CacheHTTP
+from cliente_http import TAMANHO_POOL_PADRAO, criar_sessao, url_via_proxy
+from extratores import CAMPOS_PRODUTO, extrair_dados_produto
+from fila_trabalho import ConfirmacoesPendentes, FilaTrabalho, identificar_trabalhador
 import urllib.parse
 from dotenv import load_dotenv
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
 
+sys.path.insert(0, os.path.join(project_root, 'src'))
+from comum.armazenamento import EscritorParquet, SCHEMA_AVALIACOES, ler_tabela
+from comum.metricas import configurar_metricas, obter_metricas
+
 load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
 TOKEN_API = os.getenv("TOKEN_API")
 
+estado_db = os.path.join(project_root, 'data', 'raw', 'estado_coleta.db')
+cache_dir = os.path.join(project_root, 'data', 'cache', 'http')
+logs_dir = os.path.join(project_root, 'data', 'logs')
+metricas_db = os.path.join(project_root, 'data', 'output', 'metricas.duckdb')
+fila_db = os.path.join(project_root, 'data', 'raw', 'fila_coleta.db')
+
+FILA_PRODUTOS = "produtos"
+
+# Custo de cada requisição bem-sucedida no proxy (scrape.do), para o resumo de métricas
+CUSTO_PROXY = float(os.getenv("CUSTO_PROXY_POR_REQUISICAO", "0") or 0)
+
+# Cache de respostas em disco (configurado em main; None desativa)
+cache = None
+
+# Sessão HTTP com conexões keep-alive reaproveitadas (configurada em main; None usa requests.get)
+sessao = None
+
 def get_headers():
     """Retorna headers com User-Agent aleatório e cookies/referer"""
     return {
@@ -34,26 +64,43 @@ def get_headers():
 
 def fazer_requisicao(url, max_tentativas=3):
     """Faz uma requisição HTTP com até 3 tentativas e User-Agent aleatório."""
+    if cache:
+        resposta = cache.obter(url, "produtos")
+        if resposta:
+            print(f"Resposta em cache para {url}")
+            obter_metricas().registrar_requisicao("produtos", url, 0, em_cache=True)
+            return resposta
+        if cache.offline:
+            print(f"Modo offline: {url} não está no cache.")
+            return None
+
     for tentativa in range(1, max_tentativas + 1):
+        inicio = time.perf_counter()
+        status = None
         try:
             token = TOKEN_API
             if not token:
                 print("TOKEN_API não encontrado em .env; verifique o arquivo casasbahia/.env")
                 return None
-            encoded_url = urllib.parse.quote(url)
-            geoCode="br"
-            
-            url_scrapped = f"http://api.scrape.do/?token={token}&url={url}&geoCode={geoCode}"
+            url_scrapped = url_via_proxy(url, token)
             
-            print(f"Tentativa {tentativa} para {url_scrapped}")
-            response = requests.get(url_scrapped, timeout=15)
+            print(f"Tentativa {tentativa} para {url}")
+            response = (sessao or requests).get(url_scrapped, timeout=15)
+            status = response.status_code
             
             print(f"Status Code: {response.status_code}")
             
             response.raise_for_status()
 
+            obter_metricas().registrar_requisicao("produtos", url, time.perf_counter() - inicio, status,
+                                                  tentativa, len(response.content), proxy=True,
+                                                  por_tentativa=True)
+            if cache:
+                cache.salvar(url, "produtos", response.text)
             return response
         except Exception as e:
+            obter_metricas().registrar_requisicao("produtos", url, time.perf_counter() - inicio, status,
+                                                  tentativa, erro=e, proxy=True, por_tentativa=True)
             print(f"Erro na tentativa {tentativa}: {e}")
             if tentativa < max_tentativas:
                 espera = random.uniform(3, tentativa * 5)
@@ -65,27 +112,80 @@ def fazer_requisicao(url, max_tentativas=3):
     return None
 
 
-def coletar_opinioes(produto):
-    """Acessa o link do produto e coleta suas opiniões."""
-    url = produto["link"]
-    print(f"\nColetando opiniões de: {produto['titulo']}")
-    comentarios = []
+async def fazer_requisicao_async(sessao, url, limitador, max_tentativas=3):
+    """
+    Versão assíncrona de `fazer_requisicao`, com a mesma política de tentativas.
+    Em vez de um sleep fixo, cada tentativa aguarda uma ficha do `limitador`
+    para o host de destino. Retorna o HTML da página ou None. A leitura e a
+    gravação do cache (disco e SQLite) rodam em threads, sem travar o loop.
+    """
+    if cache:
+        resposta = await asyncio.to_thread(cache.obter, url, "produtos")
+        if resposta:
+            print(f"Resposta em cache para {url}")
+            obter_metricas().registrar_requisicao("produtos", url, 0, em_cache=True)
+            return resposta.text
+        if cache.offline:
+            print(f"Modo offline: {url} não está no cache.")
+            return None
 
-    response = fazer_requisicao(url)
-    if not response:
-        return comentarios
+    token = TOKEN_API
+    if not token:
+        print("TOKEN_API não encontrado em .env; verifique o arquivo casasbahia/.env")
+        return None
 
-    soup = BeautifulSoup(response.text, "html.parser")
+    host = urllib.parse.urlparse(url).netloc
+    url_scrapped = url_via_proxy(url, token)
 
-    konfidency_div = soup.find("div", class_="konfidency-reviews-summary")
-    id_avaliacoes = konfidency_div["data-sku"] if konfidency_div and konfidency_div.has_attr("data-sku") else "N/A"
+    for tentativa in range(1, max_tentativas + 1):
+        inicio = None
+        status = None
+        try:
+            await limitador.aguardar(host)
+            print(f"Tentativa {tentativa} para {url}")
+            inicio = time.perf_counter()
+            async with sessao.get(url_scrapped, timeout=aiohttp.ClientTimeout(total=15)) as response:
+                status = response.status
+                print(f"Status Code: {response.status}")
+                response.raise_for_status()
+                corpo = await response.read()
+                html = corpo.decode(response.get_encoding(), errors="replace")
+            obter_metricas().registrar_requisicao("produtos", url, time.perf_counter() - inicio, status,
+                                                  tentativa, len(corpo), proxy=True,
+                                                  por_tentativa=True)
+            if cache:
+                await asyncio.to_thread(cache.salvar, url, "produtos", html)
+            return html
+        except Exception as e:
+            if inicio is not None:
+                obter_metricas().registrar_requisicao("produtos", url, time.perf_counter() - inicio, status,
+                                                      tentativa, erro=e, proxy=True, por_tentativa=True)
+            print(f"Erro na tentativa {tentativa}: {e}")
+            if tentativa < max_tentativas:
+                espera = random.uniform(3, tentativa * 5)
+
+                print(f"Aguardando {espera:.1f}s antes da próxima tentativa...")
+                await asyncio.sleep(espera)
+            else:
+                print("Falha após 3 tentativas.")
+    return None
+
+
+def extrair_opinioes(produto, html):
+    """
+    Extrai o `data-sku` do resumo do Konfidency, além de preço, vendedor e
+    resumo das notas, e monta as linhas de saída do produto.
+    """
+    comentarios = []
+
+    dados = extrair_dados_produto(html)
     try:
         comentarios.append({
             "categoria": produto.get("categoria", "N/A"),
             "pesquisa": produto.get("pesquisa", "N/A"),
             "titulo": produto.get("titulo", "N/A"),
             "id_produto": produto.get("id_produto", "N/A"),
-            "id_avaliacoes": id_avaliacoes,
+            **dados,
         })
     except Exception as e:
         print(f"Erro ao processar comentário: {e}")
@@ -93,42 +193,273 @@ def coletar_opinioes(produto):
 
     return comentarios
 
+
+def coletar_opinioes(produto):
+    """Acessa o link do produto e coleta suas opiniões."""
+    url = produto["link"]
+    print(f"\nColetando opiniões de: {produto['titulo']}")
+
+    response = fazer_requisicao(url)
+    if not response:
+        return []
+
+    return extrair_opinioes(produto, response.text)
+
+
+def chave_produto(produto):
+    return produto.get("id_produto") or produto.get("link")
+
+
+def produtos_pendentes(produtos, estado):
+    """Filtra os produtos sem link ou cujo `id_avaliacoes` já foi resolvido numa coleta anterior."""
+    for produto in produtos:
+        if not produto.get("link"):
+            continue
+        if estado and estado.produto_resolvido(chave_produto(produto)):
+            continue
+        yield produto
+
+
+def gravar_opinioes(writer, produto, comentarios, estado=None, csv_saida=None):
+    """
+    Grava as linhas de um produto e registra o resultado no estado da coleta.
+    Um produto já gravado antes só ganha uma linha nova se o `id_avaliacoes`
+    mudou (por exemplo, resolvido agora): novas tentativas de um produto que
+    continua sem `id_avaliacoes` e revisitas com `--completo` não duplicam
+    linhas na saída. Sem `csv_saida` (saída em Parquet), o registro só é
+    confirmado quando o writer grava o lote no disco.
+    """
+    chave = chave_produto(produto)
+    anterior = estado.avaliacoes_registradas(chave) if estado is not None else None
+    for linha in comentarios:
+        if anterior is not None and linha["id_avaliacoes"] in ("N/A", anterior):
+            continue
+        writer.writerow(linha)
+
+    if estado is not None and comentarios:
+        if csv_saida:
+            csv_saida.flush()
+        id_avaliacoes = comentarios[-1]["id_avaliacoes"]
+        # Uma revisita que não achou o `data-sku` não desfaz um produto já resolvido
+        if id_avaliacoes == "N/A" and anterior not in (None, "N/A"):
+            id_avaliacoes = anterior
+        estado.registrar_produto(chave, id_avaliacoes, commit=csv_saida is not None)
+
+
+async def coletar_opinioes_async(produtos, writer, concorrencia=10, taxa=1.0, rajada=None,
+                                 estado=None, csv_saida=None, ao_concluir=None, ao_falhar=None):
+    """
+    Coleta as opiniões de vários produtos em paralelo.
+
+    No máximo `concorrencia` requisições ficam em voo ao mesmo tempo, e cada
+    host de destino é limitado a `taxa` requisições por segundo (token bucket).
+    Cada página é processada assim que chega e as linhas são gravadas em
+    `writer` imediatamente, então o tempo total é limitado pela taxa permitida
+    e não pela soma de pausas.
+
+    `ao_concluir(produto)` e `ao_falhar(produto)` são chamados depois de cada
+    produto gravado ou cuja página não pôde ser obtida (ver o modo `--trabalhador`).
+    `produtos` pode ser um iterável comum ou assíncrono (`FilaTrabalho.iterar_async`).
+    """
+    limitador = LimitadorTaxa(taxa, rajada)
+    if hasattr(produtos, "__aiter__"):
+        produtos = aiter(produtos)
+        trava = asyncio.Lock()
+
+        async def proximo():
+            # Um gerador assíncrono não pode ser avançado por duas tarefas ao mesmo tempo
+            async with trava:
+                return await anext(produtos, None)
+    else:
+        produtos = iter(produtos)
+
+        async def proximo():
+            return next(produtos, None)
+
+    async def trabalhador(sessao):
+        while (produto := await proximo()) is not None:
+            print(f"\nColetando opiniões de: {produto['titulo']}")
+            html = await fazer_requisicao_async(sessao, produto["link"], limitador)
+            if not html:
+                if ao_falhar:
+                    ao_falhar(produto)
+                continue
+
+            comentarios = await asyncio.to_thread(extrair_opinioes, produto, html)
+            gravar_opinioes(writer, produto, comentarios, estado, csv_saida)
+            if ao_concluir:
+                ao_concluir(produto)
+
+    conector = aiohttp.TCPConnector(limit=concorrencia)
+    async with aiohttp.ClientSession(connector=conector) as sessao:
+        await asyncio.gather(*(trabalhador(sessao) for _ in range(concorrencia)))
+
+
+def coletar_da_fila(args, estado):
+    """
+    Modo `--trabalhador`: reivindica produtos da fila, coleta e grava cada um
+    no dataset Parquet e só confirma na fila depois que as linhas estão no
+    disco. Produtos cuja página não pôde ser obtida voltam para a fila.
+    """
+    saida_parquet = os.path.join(project_root, 'data', 'raw', 'avaliacoes_casasbahia')
+    fila = FilaTrabalho(args.fila, args.max_tentativas)
+    trabalhador = identificar_trabalhador()
+    confirmacoes = ConfirmacoesPendentes(fila, FILA_PRODUTOS, trabalhador, ao_gravar=estado.commit)
+    writer = EscritorParquet(saida_parquet, SCHEMA_AVALIACOES, tamanho_lote=1000, ao_gravar=confirmacoes)
+    confirmacoes.writer = writer
+
+    def concluir(produto):
+        confirmacoes.adicionar(chave_produto(produto))
+
+    def falhar(produto):
+        fila.falhar(FILA_PRODUTOS, chave_produto(produto), trabalhador, "página do produto indisponível")
+
+    print(f"Trabalhador {trabalhador} consumindo a fila '{args.fila}'.")
+    if args.modo_async:
+        produtos = fila.iterar_async(FILA_PRODUTOS, trabalhador, args.concorrencia, args.prazo)
+        asyncio.run(coletar_opinioes_async(produtos, writer, args.concorrencia, args.taxa, estado=estado,
+                                           ao_concluir=concluir, ao_falhar=falhar))
+    else:
+        for produto in fila.iterar(FILA_PRODUTOS, trabalhador, 1, args.prazo):
+            em_cache = cache is not None and cache.contem(produto["link"], "produtos")
+            comentarios = coletar_opinioes(produto)
+            gravar_opinioes(writer, produto, comentarios, estado)
+            if comentarios:
+                concluir(produto)
+            else:
+                falhar(produto)
+            if not em_cache:
+                time.sleep(random.uniform(5, 8))
+    writer.close()
+
+    print(f"\nColeta concluída! Fila: {fila.resumo(FILA_PRODUTOS)}; dados adicionados em '{saida_parquet}'.")
+    fila.fechar()
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Coleta o id de avaliações (data-sku) de cada produto.")
+    parser.add_argument("--async", dest="modo_async", action="store_true",
+                        help="Usa o modo assíncrono com requisições em paralelo.")
+    parser.add_argument("--concorrencia", type=int, default=10,
+                        help="Número máximo de requisições em voo no modo assíncrono.")
+    parser.add_argument("--taxa", type=float, default=1.0,
+                        help="Requisições por segundo permitidas por host no modo assíncrono.")
+    parser.add_argument("--completo", action="store_true",
+                        help="Ignora o estado salvo e visita novamente todos os produtos.")
+    parser.add_argument("--sem-cache", action="store_true",
+                        help="Não usa o cache de respostas em disco.")
+    parser.add_argument("--offline", action="store_true",
+                        help="Reproduz apenas respostas do cache, sem acessar a rede.")
+    parser.add_argument("--formato", choices=["csv", "parquet"], default="csv",
+                        help="Formato de saída (Parquet é particionado por dia de coleta).")
+    parser.add_argument("--tamanho-pool", type=int, default=TAMANHO_POOL_PADRAO,
+                        help="Conexões keep-alive mantidas com o proxy no modo síncrono.")
+    parser.add_argument("--http2", action="store_true",
+                        help="Usa HTTP/2 no modo síncrono (requer httpx[http2]).")
+    parser.add_argument("--custo-proxy", type=float, default=CUSTO_PROXY,
+                        help="Custo de cada requisição bem-sucedida no proxy, para o resumo de métricas.")
+    parser.add_argument("--fila", default=fila_db,
+                        help="Banco SQLite da fila de trabalho compartilhada pelos trabalhadores.")
+    parser.add_argument("--enfileirar", action="store_true",
+                        help="Apenas enfileira os produtos pendentes na fila e termina.")
+    parser.add_argument("--trabalhador", action="store_true",
+                        help="Consome produtos da fila em vez do CSV de entrada (vários processos podem rodar juntos).")
+    parser.add_argument("--prazo", type=float, default=900,
+                        help="Segundos que um produto fica reservado para um trabalhador antes de voltar à fila.")
+    parser.add_argument("--max-tentativas", type=int, default=5,
+                        help="Tentativas de um produto na fila antes de ser marcado como falho.")
+    args = parser.parse_args()
+    if args.trabalhador and args.formato != "parquet":
+        parser.error("--trabalhador grava em Parquet (arquivos independentes por processo); use --formato parquet.")
+
+    global cache, sessao
+    metricas = configurar_metricas("get_products", logs_dir, args.custo_proxy)
+    sessao = criar_sessao(args.tamanho_pool, tentativas=0, http2=args.http2)
+    if not args.sem_cache:
+        cache = CacheHTTP(cache_dir, offline=args.offline)
+
     entrada_csv = os.path.join(project_root, 'data', 'raw', 'produtos_casasbahia.csv')
     saida_csv = os.path.join(project_root, 'data', 'raw', 'avaliacoes_casasbahia.csv')
 
-    if not os.path.exists(entrada_csv):
+    if not os.path.exists(entrada_csv) and not args.trabalhador:
         print(f"Arquivo '{entrada_csv}' não encontrado.")
         return
 
-    arquivo_existe = os.path.exists(saida_csv)
+    estado = EstadoColeta(estado_db)
 
-    with open(saida_csv, "a", newline="", encoding="utf-8") as csv_saida, \
-         open(entrada_csv, "r", encoding="utf-8") as csv_entrada:
+    if args.enfileirar:
+        fila = FilaTrabalho(args.fila, args.max_tentativas)
+        with open(entrada_csv, "r", encoding="utf-8") as csv_entrada:
+            produtos = produtos_pendentes(csv.DictReader(csv_entrada, delimiter='|'),
+                                          None if args.completo else estado)
+            novos = fila.enfileirar(FILA_PRODUTOS, ((chave_produto(produto), produto) for produto in produtos))
+        print(f"{novos} produtos enfileirados em '{args.fila}' ({fila.resumo(FILA_PRODUTOS)}).")
+        fila.fechar()
+        estado.fechar()
+        return
+
+    if args.trabalhador:
+        coletar_da_fila(args, estado)
+        estado.fechar()
+        metricas.finalizar(metricas_db)
+        return
+
+    # Escolhe a saída uma vez só; a coleta abaixo é a mesma para os dois formatos
+    if args.formato == "parquet":
+        saida = os.path.join(project_root, 'data', 'raw', 'avaliacoes_casasbahia')
+        if os.path.exists(saida):
+            existentes = ler_tabela(saida, ['id_produto', 'id_avaliacoes'])
+            estado.importar_produtos(existentes.itertuples(index=False))
+
+        csv_saida = None
+        writer = EscritorParquet(saida, SCHEMA_AVALIACOES, tamanho_lote=1000, ao_gravar=estado.commit)
+    else:
+        saida = saida_csv
+        arquivo_existe = os.path.exists(saida_csv)
+        estado.importar_produtos_csv(saida_csv)
 
-        leitor = csv.DictReader(csv_entrada, delimiter='|')
         campos = [
             "categoria",
             "pesquisa",
             "titulo",
             "id_produto",
-            "id_avaliacoes",
+            *CAMPOS_PRODUTO,
         ]
-        writer = csv.DictWriter(csv_saida, fieldnames=campos, delimiter='|')
+        if arquivo_existe:
+            # Mantém o cabeçalho de um arquivo gerado por uma versão anterior
+            with open(saida_csv, "r", encoding="utf-8") as existente:
+                campos = next(csv.reader(existente, delimiter='|'), campos)
+        csv_saida = open(saida_csv, "a", newline="", encoding="utf-8")
+        writer = csv.DictWriter(csv_saida, fieldnames=campos, delimiter='|', extrasaction='ignore')
 
         if not arquivo_existe:
             writer.writeheader()
 
-        for produto in leitor:
-            if not produto.get("link"):
-                continue
+    try:
+        with open(entrada_csv, "r", encoding="utf-8") as csv_entrada:
+            produtos = produtos_pendentes(csv.DictReader(csv_entrada, delimiter='|'),
+                                          None if args.completo else estado)
 
-            comentarios = coletar_opinioes(produto)
-            for linha in comentarios:
-                writer.writerow(linha)
-            time.sleep(random.uniform(5, 8))
+            if args.modo_async:
+                asyncio.run(coletar_opinioes_async(produtos, writer, args.concorrencia, args.taxa,
+                                                   estado=estado, csv_saida=csv_saida))
+            else:
+                for produto in produtos:
+                    em_cache = cache is not None and cache.contem(produto["link"], "produtos")
+                    comentarios = coletar_opinioes(produto)
+                    gravar_opinioes(writer, produto, comentarios, estado, csv_saida)
+                    if not em_cache:
+                        time.sleep(random.uniform(5, 8))
+    finally:
+        if csv_saida is not None:
+            csv_saida.close()
+        else:
+            writer.close()
+
+    estado.fechar()
+    metricas.finalizar(metricas_db)
 
-    print(f"\nColeta concluída! Dados adicionados em '{saida_csv}'.")
+    print(f"\nColeta concluída! Dados adicionados em '{saida}'.")
 
 
 if __name__ == "__main__":
@@ -1,90 +1,445 @@
 import csv
 import requests
 import json
+import hashlib
 import time
-import re
+import argparse
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import os
+import sys
+from estado_coleta import EstadoColeta
+from cache_http import CacheHTTP
+from cliente_http import ERROS_HTTP, criar_sessao
+from fila_trabalho import ConfirmacoesPendentes, FilaTrabalho, identificar_trabalhador
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
 project_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
 
+sys.path.insert(0, os.path.join(project_root, 'src'))
+from comum.armazenamento import EscritorParquet, SCHEMA_COMENTARIOS, ler_tabela
+from comum.metricas import configurar_metricas, obter_metricas
+from comum.normalizacao import sanitizar_texto
+
 input_csv = os.path.join(project_root, 'data', 'raw', 'avaliacoes_casasbahia.csv')
 output_csv = os.path.join(project_root, 'data', 'raw', 'comentarios_produtos.csv')
+# Saídas em Parquet: diretórios particionados por dia de coleta
+input_parquet = os.path.join(project_root, 'data', 'raw', 'avaliacoes_casasbahia')
+output_parquet = os.path.join(project_root, 'data', 'raw', 'comentarios_produtos')
+estado_db = os.path.join(project_root, 'data', 'raw', 'estado_coleta.db')
+cache_dir = os.path.join(project_root, 'data', 'cache', 'http')
+logs_dir = os.path.join(project_root, 'data', 'logs')
+metricas_db = os.path.join(project_root, 'data', 'output', 'metricas.duckdb')
+fila_db = os.path.join(project_root, 'data', 'raw', 'fila_coleta.db')
+
+FILA_AVALIACOES = "avaliacoes"
+
+# Cache de respostas em disco (configurado em main; None desativa)
+cache = None
+
+TAMANHO_PAGINA = 100
+# Páginas de um mesmo produto pedidas em paralelo
+CONCORRENCIA_PAGINAS = 4
 
-def coletar_dados(id_avaliacoes):
-    url = f"https://reviews-api.konfidency.com.br/casasbahia/{id_avaliacoes}/summary/helpfulScore,desc?pageSize=100&page=1"
+CAMPOS_SAIDA = [
+    "id_produto",
+    "id_avaliacoes",
+    "id_comentario",
+    "rating_do_comentario",
+    "quantidade_avaliacoes_do_produto",
+    "comentario_about_produto",
+    "data_coleta"
+]
+
+
+def coletar_dados(id_avaliacoes, pagina=1, tamanho_pagina=TAMANHO_PAGINA, sessao=None):
+    url = f"https://reviews-api.konfidency.com.br/casasbahia/{id_avaliacoes}/summary/helpfulScore,desc?pageSize={tamanho_pagina}&page={pagina}"
     print(url)
+    if cache:
+        resposta = cache.obter(url, "avaliacoes")
+        if resposta:
+            obter_metricas().registrar_requisicao("avaliacoes", url, 0, em_cache=True)
+            return resposta.json()
+        if cache.offline:
+            print(f"Modo offline: {url} não está no cache.")
+            return None
+
+    inicio = time.perf_counter()
+    response = None
     try:
-        response = requests.get(url, timeout=15)
+        response = (sessao or requests).get(url, timeout=15)
         response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f"Erro ao requisitar {id_avaliacoes}: {e}")
+        data = response.json()
+        _registrar_requisicao(url, inicio, response)
+        if cache:
+            cache.salvar(url, "avaliacoes", response.content)
+        return data
+    except ERROS_HTTP + (ValueError,) as e:
+        _registrar_requisicao(url, inicio, response if response is not None else getattr(e, "response", None), e)
+        print(f"Erro ao requisitar {id_avaliacoes} (página {pagina}): {e}")
         return None
 
 
+def _registrar_requisicao(url, inicio, response, erro=None):
+    """
+    Registra a requisição nas métricas. As novas tentativas feitas pelo Retry
+    da sessão não passam por aqui, então são lidas do histórico do urllib3.
+    """
+    retries = getattr(getattr(response, "raw", None), "retries", None)
+    tentativa = 1 + len(retries.history) if retries is not None else 1
+    obter_metricas().registrar_requisicao(
+        "avaliacoes", url, time.perf_counter() - inicio,
+        None if response is None else response.status_code, tentativa,
+        0 if response is None else len(response.content), erro,
+    )
+
+
+def coletar_paginas(id_avaliacoes, sessao=None, tamanho_pagina=TAMANHO_PAGINA, concorrencia=CONCORRENCIA_PAGINAS):
+    """
+    Percorre todas as páginas de avaliações de um produto, devolvendo o JSON
+    de cada uma, em ordem.
+
+    O número de páginas vem do `reviewCount` da primeira página, dividido pela
+    quantidade de comentários que ela trouxe: se a API limitar a página abaixo
+    de `tamanho_pagina`, as demais são pedidas com o tamanho que ela aceitou.
+    As páginas seguintes são pedidas em paralelo (até `concorrencia` por vez)
+    só depois que o consumidor pede a segunda, para que um produto sem
+    avaliações novas não custe mais que a primeira página. Sem `reviewCount`,
+    segue página a página até uma vir incompleta.
+
+    Levanta RuntimeError se alguma página falhar, para que o produto não seja
+    considerado completo com dados parciais.
+    """
+    def pedir(pagina, tamanho):
+        data = coletar_dados(id_avaliacoes, pagina, tamanho, sessao)
+        if not data:
+            raise RuntimeError(f"Falha ao coletar a página {pagina} de {id_avaliacoes}.")
+        return data
+
+    data = pedir(1, tamanho_pagina)
+    yield data
+
+    produtos = data.get("reviews", [])
+    por_pagina = max((len(produto.get("reviews", [])) for produto in produtos), default=0)
+    quantidades = [produto["reviewCount"] for produto in produtos if produto.get("reviewCount") is not None]
+    if por_pagina == 0:
+        return
+
+    if not quantidades:
+        pagina = 1
+        while any(len(produto.get("reviews", [])) >= por_pagina for produto in data.get("reviews", [])):
+            pagina += 1
+            data = pedir(pagina, por_pagina)
+            yield data
+        return
+
+    paginas = range(2, -(-max(int(q) for q in quantidades) // por_pagina) + 1)
+    if not paginas:
+        return
+    executor = ThreadPoolExecutor(max_workers=min(concorrencia, len(paginas)))
+    pendentes = deque()
+    try:
+        # Janela de páginas em voo: a memória não cresce com o total de páginas do produto
+        for pagina in paginas:
+            pendentes.append(executor.submit(pedir, pagina, por_pagina))
+            if len(pendentes) > concorrencia:
+                yield pendentes.popleft().result()
+        while pendentes:
+            yield pendentes.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
 def sanitize_text(text):
     """Remove quebras de linha, colapsa espaços e remove o delimitador '|' para garantir uma linha por comentário no CSV."""
-    if text is None:
-        return ""
-    
-    s = re.sub(r"[\r\n]+", " ", str(text))
-    
-    s = s.replace("|", "")
-    
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
-ids = []
-with open(input_csv, newline='', encoding='utf-8') as csvfile:
-    reader = csv.DictReader(csvfile, delimiter='|')
-    for row in reader:
-        if row.get('id_avaliacoes') != 'N/A':
-            ids.append(row.get('id_avaliacoes', '').strip())
-
-with open(output_csv, mode='w', newline='', encoding='utf-8') as outfile:
-    writer = csv.writer(outfile, delimiter='|')
-    writer.writerow([
-        "id_produto",
-        "id_avaliacoes",
-        "id_comentario",
-        "rating_do_comentario",
-        "quantidade_avaliacoes_do_produto",
-        "comentario_about_produto",
-        "data_coleta"
-    ])
-
-    for id_avaliacoes in ids:
-        print(id_avaliacoes)
-        data = coletar_dados(id_avaliacoes)
+    return sanitizar_texto(text)
 
-        if not data:
-            
-            time.sleep(1)
+
+def resumir_pagina(data):
+    """
+    Resume a primeira página da API de um produto em
+    (quantidade_avaliacoes, id do comentário mais recente, hash do conteúdo).
+    Se a quantidade e o hash não mudaram desde a última coleta, o produto
+    não tem avaliações novas e as demais páginas não precisam ser pedidas.
+    """
+    produtos = data.get("reviews", [])
+    quantidade = sum(produto.get("reviewCount", 0) or 0 for produto in produtos)
+    comentarios = [comentario for produto in produtos for comentario in produto.get("reviews", [])]
+
+    mais_recente = max(comentarios, key=lambda c: str(c.get("created", "")), default={})
+    conteudo = json.dumps(
+        [[c.get("_id"), c.get("rating"), c.get("text")] for c in comentarios],
+        ensure_ascii=False,
+    )
+    hash_pagina = hashlib.sha1(conteudo.encode("utf-8")).hexdigest()
+    return quantidade, mais_recente.get("_id"), hash_pagina
+
+
+def extrair_linhas(id_avaliacoes, data, sanitizar=True):
+    """
+    Converte o JSON de uma página da API nas linhas de saída.
+    Com `sanitizar=False` (saída em Parquet) o texto do comentário é mantido
+    como veio da API, com quebras de linha e '|'.
+    """
+    linhas = []
+    for produto in data.get("reviews", []):
+        id_produto = produto.get("_id", "")
+        qtd_avaliacoes = produto.get("reviewCount", 0)
+        comentarios = produto.get("reviews", [])
+
+        for comentario in comentarios:
+            id_comentario = comentario.get("_id", "")
+            rating = comentario.get("rating", "")
+            raw_text = comentario.get("text", "")
+            texto = sanitize_text(raw_text) if sanitizar else ("" if raw_text is None else str(raw_text))
+            data_coleta = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+            linhas.append([
+                id_produto,
+                id_avaliacoes,
+                id_comentario,
+                rating,
+                qtd_avaliacoes,
+                texto,
+                data_coleta
+            ])
+    return linhas
+
+
+def coletar_avaliacoes(ids, writer, sessao, concorrencia=8, tamanho_pagina=TAMANHO_PAGINA,
+                       estado=None, saida=None, sanitizar=True, ao_concluir=None, ao_falhar=None,
+                       concorrencia_paginas=CONCORRENCIA_PAGINAS):
+    """
+    Coleta todas as páginas de avaliações de vários produtos em paralelo.
+
+    Cada thread percorre as páginas de um `id_avaliacoes` (as seguintes à
+    primeira em paralelo, até `concorrencia_paginas`) e publica as linhas
+    de cada página numa fila limitada; a thread principal grava as linhas no
+    `writer` assim que chegam. A fila limitada segura as threads quando a
+    escrita atrasa, então o uso de memória não cresce com o volume coletado.
+
+    Com um `EstadoColeta`, produtos cuja primeira página não mudou desde a
+    última coleta são pulados, comentários já gravados são descartados e cada
+    produto concluído é registrado no banco. Com `saida` (o arquivo do
+    `writer` CSV), o arquivo é descarregado e o estado confirmado a cada
+    item; sem ela, o commit fica a cargo do writer (ver `EscritorParquet`),
+    feito só depois que as linhas estiverem no disco.
+
+    `ids` pode ser um iterável preguiçoso (por exemplo, `FilaTrabalho.iterar`):
+    só `concorrencia * 2` ids são consumidos à frente dos que já terminaram.
+    `ao_concluir(id)` é chamado na thread principal depois que todas as linhas
+    de um produto foram entregues ao writer, e `ao_falhar(id, erro)`, também
+    na thread principal, quando a coleta de um produto falha.
+    Retorna o total de linhas gravadas.
+    """
+    fila = queue.Queue(maxsize=concorrencia * 4)
+    fim = object()
+    anteriores = estado.carregar_avaliacoes() if estado else {}
+    indice_id = CAMPOS_SAIDA.index("id_comentario")
+
+    def tarefa(id_avaliacoes):
+        try:
+            resumo = None
+            for data in coletar_paginas(id_avaliacoes, sessao, tamanho_pagina, concorrencia_paginas):
+                if resumo is None:
+                    resumo = resumir_pagina(data)
+                    quantidade, _, hash_pagina = resumo
+                    if anteriores.get(id_avaliacoes) == (quantidade, hash_pagina):
+                        print(f"{id_avaliacoes} sem avaliações novas.")
+                        break
+                fila.put((id_avaliacoes, extrair_linhas(id_avaliacoes, data, sanitizar), None, None))
+            if resumo is not None:
+                fila.put((id_avaliacoes, [], resumo, None))
+        except Exception as e:
+            print(f"Erro ao processar {id_avaliacoes}: {e}")
+            if ao_falhar:
+                fila.put((id_avaliacoes, [], None, e))
+
+    def produtor():
+        vagas = threading.Semaphore(concorrencia * 2)
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            for id_avaliacoes in ids:
+                vagas.acquire()
+                executor.submit(tarefa, id_avaliacoes).add_done_callback(lambda _: vagas.release())
+        fila.put(fim)
+
+    threading.Thread(target=produtor, daemon=True).start()
+
+    total = 0
+    while (item := fila.get()) is not fim:
+        id_avaliacoes, linhas, resumo, erro = item
+        if erro is not None:
+            ao_falhar(id_avaliacoes, erro)
             continue
+        if estado and linhas:
+            linhas = estado.filtrar_comentarios_novos(linhas, indice_id)
+        writer.writerows(linhas)
+        total += len(linhas)
+
+        if estado:
+            if saida:
+                saida.flush()
+            if resumo is not None:
+                estado.registrar_avaliacoes(id_avaliacoes, *resumo, commit=saida is not None)
+            elif saida:
+                estado.commit()
+        if resumo is not None and ao_concluir:
+            ao_concluir(id_avaliacoes)
+    return total
+
+
+def ler_ids(caminho):
+    """Lê os `id_avaliacoes` válidos do CSV (ou dataset Parquet) gerado por get_products."""
+    ids = []
+    if os.path.isdir(caminho):
+        for valor in ler_tabela(caminho, ['id_avaliacoes'])['id_avaliacoes'].dropna():
+            if valor != 'N/A':
+                ids.append(str(valor).strip())
+        return ids
+
+    with open(caminho, newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile, delimiter='|')
+        for row in reader:
+            if row.get('id_avaliacoes') != 'N/A':
+                ids.append(row.get('id_avaliacoes', '').strip())
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coleta todas as avaliações dos produtos na API do Konfidency.")
+    parser.add_argument("--concorrencia", type=int, default=8,
+                        help="Número de produtos coletados em paralelo.")
+    parser.add_argument("--tamanho-pagina", type=int, default=TAMANHO_PAGINA,
+                        help="Quantidade de avaliações pedidas por página.")
+    parser.add_argument("--concorrencia-paginas", type=int, default=CONCORRENCIA_PAGINAS,
+                        help="Páginas de um mesmo produto pedidas em paralelo.")
+    parser.add_argument("--tamanho-pool", type=int, default=None,
+                        help="Conexões keep-alive mantidas com a API (padrão: concorrência x páginas em paralelo).")
+    parser.add_argument("--http2", action="store_true",
+                        help="Usa HTTP/2 (requer httpx[http2]).")
+    parser.add_argument("--tentativas", type=int, default=5,
+                        help="Tentativas por requisição em respostas 429/5xx.")
+    parser.add_argument("--backoff", type=float, default=1.0,
+                        help="Fator de backoff exponencial (segundos) entre tentativas.")
+    parser.add_argument("--ignorar-recentes", type=float, default=12,
+                        help="Pula produtos coletados nas últimas N horas (retoma uma execução interrompida). "
+                             "Use 0 para verificar todos.")
+    parser.add_argument("--completo", action="store_true",
+                        help="Ignora o estado salvo e refaz a coleta do zero.")
+    parser.add_argument("--sem-cache", action="store_true",
+                        help="Não usa o cache de respostas em disco.")
+    parser.add_argument("--offline", action="store_true",
+                        help="Reproduz apenas respostas do cache, sem acessar a rede.")
+    parser.add_argument("--formato", choices=["csv", "parquet"], default="csv",
+                        help="Formato de entrada e saída (Parquet é particionado por dia de coleta).")
+    parser.add_argument("--entrada", default=None,
+                        help="Arquivo de produtos de onde vêm os ids (padrão: a saída do get_products.py no --formato).")
+    parser.add_argument("--fila", default=fila_db,
+                        help="Banco SQLite da fila de trabalho compartilhada pelos trabalhadores.")
+    parser.add_argument("--enfileirar", action="store_true",
+                        help="Apenas enfileira os produtos a verificar na fila e termina.")
+    parser.add_argument("--trabalhador", action="store_true",
+                        help="Consome produtos da fila em vez da entrada (vários processos podem rodar juntos).")
+    parser.add_argument("--prazo", type=float, default=900,
+                        help="Segundos que um produto fica reservado para um trabalhador antes de voltar à fila.")
+    parser.add_argument("--max-tentativas", type=int, default=5,
+                        help="Tentativas de um produto na fila antes de ser marcado como falho.")
+    args = parser.parse_args()
+    if args.trabalhador and args.formato != "parquet":
+        parser.error("--trabalhador grava em Parquet (arquivos independentes por processo); use --formato parquet.")
+    if args.trabalhador and args.completo:
+        parser.error("--completo apaga a coleta anterior; use-o com --enfileirar, antes de iniciar os trabalhadores.")
+
+    global cache
+    metricas = configurar_metricas("get_reviews", logs_dir)
+    if not args.sem_cache:
+        cache = CacheHTTP(cache_dir, offline=args.offline)
+
+    parquet = args.formato == "parquet"
+    saida_path = output_parquet if parquet else output_csv
+    arquivo_existe = os.path.exists(saida_path) and not args.completo
+
+    estado = EstadoColeta(estado_db)
+    if args.completo:
+        estado.limpar_avaliacoes()
+        if parquet and os.path.exists(output_parquet):
+            # O CSV é truncado; o dataset Parquet só recebe arquivos novos, então a
+            # coleta anterior sai do caminho para não ser lida junto com a nova
+            anterior = f"{output_parquet}-anterior-{datetime.now():%Y%m%d-%H%M%S}"
+            os.replace(output_parquet, anterior)
+            print(f"Coleta anterior movida para '{anterior}'.")
+    elif arquivo_existe and parquet:
+        estado.importar_comentarios(ler_tabela(output_parquet, ['id_comentario'])['id_comentario'])
+    elif arquivo_existe:
+        estado.importar_comentarios_csv(output_csv)
+
+    # Um trabalhador recebe os produtos da fila, não da entrada
+    ids = [] if args.trabalhador else ler_ids(args.entrada or (input_parquet if parquet else input_csv))
+    if args.ignorar_recentes > 0:
+        recentes = estado.avaliacoes_recentes(args.ignorar_recentes)
+        ids = [id_avaliacoes for id_avaliacoes in ids if id_avaliacoes not in recentes]
+    if not args.trabalhador:
+        print(f"{len(ids)} produtos para verificar.")
+
+    if args.enfileirar:
+        fila = FilaTrabalho(args.fila, args.max_tentativas)
+        novos = fila.enfileirar(FILA_AVALIACOES, ((id_avaliacoes, id_avaliacoes) for id_avaliacoes in ids))
+        print(f"{novos} produtos enfileirados em '{args.fila}' ({fila.resumo(FILA_AVALIACOES)}).")
+        fila.fechar()
+        estado.fechar()
+        return
+
+    sessao = criar_sessao(args.tamanho_pool or args.concorrencia * args.concorrencia_paginas, args.tentativas, args.backoff, args.http2)
+
+    with metricas.etapa("coletar_avaliacoes") as etapa:
+        if args.trabalhador:
+            fila = FilaTrabalho(args.fila, args.max_tentativas)
+            trabalhador = identificar_trabalhador()
+            confirmacoes = ConfirmacoesPendentes(fila, FILA_AVALIACOES, trabalhador, ao_gravar=estado.commit)
+            writer = EscritorParquet(output_parquet, SCHEMA_COMENTARIOS, coluna_data="data_coleta",
+                                     ao_gravar=confirmacoes)
+            confirmacoes.writer = writer
+
+            def devolver(id_avaliacoes, erro):
+                # Grava antes as páginas já coletadas, para que quem pegar o produto de novo as descarte
+                writer.flush()
+                fila.falhar(FILA_AVALIACOES, id_avaliacoes, trabalhador, erro)
+
+            print(f"Trabalhador {trabalhador} consumindo a fila '{args.fila}'.")
+            total = coletar_avaliacoes(
+                fila.iterar(FILA_AVALIACOES, trabalhador, args.concorrencia, args.prazo), writer, sessao,
+                args.concorrencia, args.tamanho_pagina, estado, sanitizar=False,
+                ao_concluir=confirmacoes.adicionar, ao_falhar=devolver,
+                concorrencia_paginas=args.concorrencia_paginas,
+            )
+            writer.close()
+            print(f"Fila: {fila.resumo(FILA_AVALIACOES)}")
+            fila.fechar()
+        elif parquet:
+            writer = EscritorParquet(output_parquet, SCHEMA_COMENTARIOS, coluna_data="data_coleta",
+                                     ao_gravar=estado.commit)
+            total = coletar_avaliacoes(ids, writer, sessao, args.concorrencia, args.tamanho_pagina,
+                                       estado, sanitizar=False, concorrencia_paginas=args.concorrencia_paginas)
+            writer.close()
+        else:
+            with open(output_csv, mode='a' if arquivo_existe else 'w', newline='', encoding='utf-8') as outfile:
+                writer = csv.writer(outfile, delimiter='|')
+                if not arquivo_existe:
+                    writer.writerow(CAMPOS_SAIDA)
+
+                total = coletar_avaliacoes(ids, writer, sessao, args.concorrencia, args.tamanho_pagina,
+                                           estado, outfile, concorrencia_paginas=args.concorrencia_paginas)
+        etapa["linhas"] = total
+
+    estado.fechar()
+    metricas.finalizar(metricas_db)
+
+    print(f"\nColeta concluída! {total} comentários novos salvos em '{saida_path}'.")
+
 
-        for produto in data.get("reviews", []):
-            id_produto = produto.get("_id", "")
-            qtd_avaliacoes = produto.get("reviewCount", 0)
-            comentarios = produto.get("reviews", [])
-
-            for comentario in comentarios:
-                id_comentario = comentario.get("_id", "")
-                rating = comentario.get("rating", "")
-                raw_text = comentario.get("text", "")
-                texto = sanitize_text(raw_text)
-                data_coleta = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                writer.writerow([
-                    id_produto,
-                    id_avaliacoes,
-                    id_comentario,
-                    rating,
-                    qtd_avaliacoes,
-                    texto,
-                    data_coleta
-                ])
-
-            time.sleep(1)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
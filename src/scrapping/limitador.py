@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+
+class LimitadorTaxa:
+    """
+    Token bucket assíncrono com um balde por host.
+
+    Cada host recebe `taxa` fichas por segundo, acumulando no máximo
+    `capacidade` fichas (o tamanho da rajada permitida). Uma requisição
+    consome uma ficha; se o balde estiver vazio, a corrotina aguarda
+    exatamente o tempo necessário para a próxima ficha ficar disponível.
+    """
+
+    def __init__(self, taxa, capacidade=None):
+        if taxa <= 0:
+            raise ValueError("A taxa deve ser maior que zero.")
+        self.taxa = float(taxa)
+        self.capacidade = float(capacidade) if capacidade else max(1.0, self.taxa)
+        self._baldes = {}
+        self._travas = {}
+
+    def _balde(self, host):
+        if host not in self._baldes:
+            self._baldes[host] = [self.capacidade, time.monotonic()]
+            self._travas[host] = asyncio.Lock()
+        return self._baldes[host], self._travas[host]
+
+    async def aguardar(self, host):
+        """Bloqueia até que exista uma ficha disponível para `host` e a consome."""
+        balde, trava = self._balde(host)
+        async with trava:
+            while True:
+                agora = time.monotonic()
+                fichas, ultimo = balde
+                fichas = min(self.capacidade, fichas + (agora - ultimo) * self.taxa)
+                if fichas >= 1:
+                    balde[0] = fichas - 1
+                    balde[1] = agora
+                    return
+                balde[0] = fichas
+                balde[1] = agora
+                await asyncio.sleep((1 - fichas) / self.taxa)
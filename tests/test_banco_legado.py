@@ -0,0 +1,107 @@
+"""
+Gravação em um `reviews.duckdb` criado pela versão antiga (`to_sql`), em que
+`topicos` é o texto da lista Python e os ids são números.
+"""
+import os
+import sys
+
+import duckdb
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from processing import agregados as bi
+from processing.text_processor import salvar_no_banco_de_dados
+
+
+def criar_banco_legado(caminho):
+    with duckdb.connect(caminho) as con:
+        con.execute("""
+            CREATE TABLE reviews_classificadas (
+                id_produto BIGINT, id_avaliacoes BIGINT, id_comentario BIGINT,
+                rating_do_comentario BIGINT, comentario_about_produto VARCHAR,
+                data_coleta VARCHAR, comentario_limpo VARCHAR, sentimento VARCHAR, topicos VARCHAR
+            )
+        """)
+        con.execute("""
+            INSERT INTO reviews_classificadas VALUES
+            (1, 10, 100, 5, 'Ótima entrega', '2024-05-01 10:00:00', 'otima entrega', 'Positivo', '[''entrega'']'),
+            (1, 10, 101, 1, 'Tela quebrada', '2024-05-01 11:00:00', 'tela quebrada', 'Negativo', '[''tela'', ''defeito'']'),
+            (2, 20, 102, 3, 'Ok', '2024-05-02 09:00:00', 'ok', 'Neutro', '[]')
+        """)
+
+
+def lote_novo():
+    return pd.DataFrame({
+        'id_produto': ['1', '2'],
+        'id_avaliacoes': ['10', '20'],
+        'id_comentario': ['101', '103'],
+        'rating_do_comentario': [4, 5],
+        'comentario_about_produto': ['Tela boa', 'Chegou rápido'],
+        'data_coleta': ['2024-05-03 08:00:00', '2024-05-03 09:00:00'],
+        'comentario_limpo': ['tela boa', 'chegou rapido'],
+        'sentimento': ['Positivo', 'Positivo'],
+        'topicos': [['tela'], ['entrega']],
+    })
+
+
+def agregados(caminho):
+    with duckdb.connect(caminho) as con:
+        return {nome: sorted(con.execute(f"SELECT * FROM {nome}").fetchall(), key=str)
+                for nome in [bi.TABELA_TOPICOS, *bi.AGREGADOS]}
+
+
+def test_upsert_migra_topicos_e_calcula_agregados(tmp_path):
+    caminho = str(tmp_path / "reviews.duckdb")
+    criar_banco_legado(caminho)
+
+    sucesso, total = salvar_no_banco_de_dados(lote_novo(), caminho, modo="upsert")
+
+    assert sucesso, total
+    assert total == 4
+    with duckdb.connect(caminho) as con:
+        tipo = con.execute(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_name = 'reviews_classificadas' AND column_name = 'topicos'"
+        ).fetchone()[0]
+        topicos = dict(con.execute(
+            "SELECT CAST(id_comentario AS VARCHAR), topicos FROM reviews_classificadas"
+        ).fetchall())
+    assert tipo == "VARCHAR[]"
+    assert topicos == {'100': ['entrega'], '101': ['tela'], '102': [], '103': ['entrega']}
+
+    # As tabelas de BI cobrem as linhas antigas e as novas, como numa reconstrução
+    incrementais = agregados(caminho)
+    with duckdb.connect(caminho) as con:
+        bi.reconstruir_agregados(con)
+    assert incrementais == agregados(caminho)
+
+
+def test_append_migra_topicos(tmp_path):
+    caminho = str(tmp_path / "reviews.duckdb")
+    criar_banco_legado(caminho)
+
+    sucesso, total = salvar_no_banco_de_dados(lote_novo().iloc[1:], caminho, modo="append", agregados=False)
+
+    assert sucesso, total
+    with duckdb.connect(caminho) as con:
+        assert con.execute(
+            "SELECT topicos FROM reviews_classificadas WHERE CAST(id_comentario AS VARCHAR) = '103'"
+        ).fetchone()[0] == ['entrega']
+
+
+def test_carregar_produtos_migra_e_reconstroi(tmp_path):
+    caminho = str(tmp_path / "reviews.duckdb")
+    criar_banco_legado(caminho)
+    produtos = pd.DataFrame({'id_avaliacoes': ['10', '20'], 'categoria': ['TV', 'Celular'],
+                             'pesquisa': ['tv', 'celular'], 'titulo': ['TV 50"', 'Celular X']})
+
+    assert bi.carregar_produtos(caminho, produtos)
+
+    with duckdb.connect(caminho) as con:
+        categorias = dict(con.execute(
+            "SELECT categoria, SUM(quantidade) FROM agg_sentimento_categoria_dia GROUP BY ALL"
+        ).fetchall())
+        topicos = con.execute(f"SELECT COUNT(*) FROM {bi.TABELA_TOPICOS}").fetchone()[0]
+    assert categorias == {'TV': 2, 'Celular': 1}
+    assert topicos == 3
@@ -0,0 +1,46 @@
+"""Cache de respostas HTTP compartilhado por vários processos (`cache_http.py`)."""
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'scrapping'))
+
+from cache_http import CacheHTTP
+
+
+def gravar_repetidamente(diretorio, processo):
+    cache = CacheHTTP(diretorio)
+    for i in range(40):
+        cache.salvar(f"https://exemplo/p/{i % 5}", "produtos", f"processo {processo}, gravação {i}")
+    cache.fechar()
+
+
+def test_processos_gravando_as_mesmas_urls(tmp_path):
+    diretorio = str(tmp_path / "cache")
+    CacheHTTP(diretorio).fechar()
+    processos = [multiprocessing.Process(target=gravar_repetidamente, args=(diretorio, n)) for n in range(4)]
+    for processo in processos:
+        processo.start()
+    for processo in processos:
+        processo.join(timeout=60)
+    assert [processo.exitcode for processo in processos] == [0, 0, 0, 0]
+
+    cache = CacheHTTP(diretorio)
+    assert cache.conn.execute("SELECT COUNT(*) FROM respostas").fetchone()[0] == 5
+    assert all(cache.obter(f"https://exemplo/p/{i}", "produtos") for i in range(5))
+
+
+def test_despejo_considera_o_que_outros_processos_gravaram(tmp_path):
+    diretorio = str(tmp_path / "cache")
+    conteudo = os.urandom(1000)  # não comprime: cada entrada ocupa ~1 KB
+    primeiro = CacheHTTP(diretorio, tamanho_maximo=3500)
+    segundo = CacheHTTP(diretorio, tamanho_maximo=3500)
+    for i in range(3):
+        segundo.salvar(f"https://exemplo/p/{i}", "produtos", conteudo)
+
+    # O primeiro nunca gravou nada, mas o índice já está quase cheio
+    primeiro.salvar("https://exemplo/p/3", "produtos", conteudo)
+    total = primeiro.conn.execute("SELECT SUM(tamanho) FROM respostas").fetchone()[0]
+    assert total <= 3500 * 0.9
+    assert primeiro.obter("https://exemplo/p/0", "produtos") is None
+    assert primeiro.obter("https://exemplo/p/3", "produtos") is not None
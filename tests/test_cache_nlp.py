@@ -0,0 +1,19 @@
+"""Memoização dos resultados de NLP (`cache_nlp.py`)."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from processing.cache_nlp import CacheNLP
+
+
+def test_textos_com_a_mesma_chave_recebem_o_mesmo_valor(tmp_path):
+    caminho = str(tmp_path / "cache_nlp.db")
+    textos = ["produto  muito bom", " produto muito bom\n"]
+    assert CacheNLP.chave("leia", textos[0]) == CacheNLP.chave("leia", textos[1])
+
+    cache = CacheNLP(caminho)
+    cache.salvar_muitos("leia", {"produto muito bom": 0.6})
+    # Da camada em memória e, num cache novo, do SQLite
+    for consulta in (cache, CacheNLP(caminho)):
+        assert consulta.obter_muitos("leia", textos + ["outro texto"]) == {textos[0]: 0.6, textos[1]: 0.6}
@@ -0,0 +1,53 @@
+"""Deduplicação de comentários no pipeline (`deduplicacao.py` e `pipeline.deduplicar_chunk`)."""
+import os
+import sys
+
+import duckdb
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from processing.deduplicacao import IndiceMinHash
+from processing.pipeline import executar_pipeline
+
+TEXTO = "Produto excelente, chegou antes do prazo e funciona muito bem, recomendo a todos"
+
+
+def criar_entrada(caminho):
+    pd.DataFrame({
+        'id_produto': ['1', '2', '3', '4', '5'],
+        'id_avaliacoes': ['10', '20', '30', '40', '50'],
+        # 101 repete o comentário 100 (outro SKU), 102 é quase idêntico e 103 aparece duas vezes
+        'id_comentario': ['100', '101', '102', '103', '103'],
+        'rating_do_comentario': [5, 4, 5, 1, 1],
+        'comentario_about_produto': [TEXTO, TEXTO, TEXTO + "!", "Veio quebrado", "Veio quebrado"],
+        'data_coleta': '2024-05-01 10:00:00',
+    }).to_csv(caminho, sep='|', index=False)
+
+
+def contar(caminho, tabela):
+    with duckdb.connect(caminho) as con:
+        return con.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_chunk_com_duplicatas_processado_duas_vezes(tmp_path, incremental):
+    entrada = str(tmp_path / "comentarios.csv")
+    banco = str(tmp_path / "reviews.duckdb")
+    criar_entrada(entrada)
+    indice = IndiceMinHash(str(tmp_path / "indice"))
+
+    for _ in range(2):
+        executar_pipeline(entrada, banco, incremental=incremental, indice=indice)
+        # As duplicatas também são gravadas; só o `id_comentario` repetido vira uma linha
+        assert contar(banco, "reviews_classificadas") == 4
+        assert contar(banco, "review_canonica") == 4
+
+    with duckdb.connect(banco) as con:
+        canonicos = dict(con.execute("SELECT id_comentario, id_canonico FROM review_canonica").fetchall())
+        produtos = dict(con.execute(
+            "SELECT id_comentario, id_produto FROM reviews_classificadas"
+        ).fetchall())
+    assert canonicos == {'100': '100', '101': '100', '102': '100', '103': '103'}
+    assert produtos == {'100': '1', '101': '2', '102': '3', '103': '5'}
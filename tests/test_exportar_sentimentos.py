@@ -0,0 +1,42 @@
+"""Etapa 'sentimento' do pipeline (`pipeline.exportar_sentimentos`)."""
+import os
+import sys
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from processing import pipeline
+
+
+def criar_entrada(caminho, ids):
+    pd.DataFrame({
+        'id_produto': '1',
+        'id_avaliacoes': '10',
+        'id_comentario': ids,
+        'rating_do_comentario': 5,
+        'comentario_about_produto': [f'Produto muito bom {i}' for i in ids],
+        'data_coleta': '2024-05-01 10:00:00',
+    }).to_csv(caminho, sep='|', index=False)
+
+
+def test_incremental_classifica_so_os_novos_e_mantem_o_historico(tmp_path, monkeypatch):
+    entrada = str(tmp_path / "comentarios.csv")
+    saida = str(tmp_path / "classificados.parquet")
+    classificados = []
+    classificar = pipeline.classificar_sentimento
+
+    def contar(df, **kwargs):
+        classificados.extend(df['id_comentario'].astype(str))
+        return classificar(df, **kwargs)
+
+    monkeypatch.setattr(pipeline, "classificar_sentimento", contar)
+
+    criar_entrada(entrada, ['1', '2', '3'])
+    assert pipeline.exportar_sentimentos(entrada, saida, tamanho_chunk=2, incremental=True) == 3
+    criar_entrada(entrada, ['1', '2', '3', '4'])
+    assert pipeline.exportar_sentimentos(entrada, saida, tamanho_chunk=2, incremental=True) == 1
+
+    assert classificados == ['1', '2', '3', '4']
+    assert sorted(pq.read_table(saida)['id_comentario'].to_pylist()) == ['1', '2', '3', '4']
@@ -0,0 +1,134 @@
+"""Fila de trabalho compartilhada pelos trabalhadores (`fila_trabalho.py`)."""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'scrapping'))
+
+import get_products
+from estado_coleta import EstadoColeta
+from fila_trabalho import ConfirmacoesPendentes, FilaTrabalho
+
+FILA = "teste"
+
+
+def produtos(quantidade):
+    return [
+        (str(i), {"id_produto": str(i), "titulo": f"Produto {i}", "link": f"https://exemplo/p/{i}"})
+        for i in range(quantidade)
+    ]
+
+
+def test_trabalhador_async_termina_quando_a_fila_esvazia(tmp_path, monkeypatch):
+    caminho_fila = str(tmp_path / "fila.db")
+    fila = FilaTrabalho(caminho_fila)
+    fila.enfileirar(get_products.FILA_PRODUTOS, produtos(5))
+    fila.fechar()
+
+    async def requisicao_lenta(sessao, url, limitador, max_tentativas=3):
+        # Requisições ainda em voo quando a fila já não tem mais nada a entregar
+        await asyncio.sleep(0.3)
+        return None if url.endswith("/4") else "<html></html>"
+
+    monkeypatch.setattr(get_products, "fazer_requisicao_async", requisicao_lenta)
+    monkeypatch.setattr(get_products, "project_root", str(tmp_path))
+    args = argparse.Namespace(fila=caminho_fila, max_tentativas=1, modo_async=True, concorrencia=3,
+                              taxa=100.0, prazo=60)
+
+    def coletar():
+        estado = EstadoColeta(str(tmp_path / "estado.db"))
+        get_products.coletar_da_fila(args, estado)
+        estado.fechar()
+
+    execucao = threading.Thread(target=coletar, daemon=True)
+    execucao.start()
+    execucao.join(timeout=30)
+    assert not execucao.is_alive()
+
+    fila = FilaTrabalho(caminho_fila)
+    assert fila.resumo(get_products.FILA_PRODUTOS) == {"concluido": 4, "falhou": 1}
+    fila.fechar()
+
+
+def test_prazo_expirado_volta_para_a_fila(tmp_path):
+    fila = FilaTrabalho(str(tmp_path / "fila.db"))
+    fila.enfileirar(FILA, produtos(1))
+
+    assert [chave for chave, _ in fila.reivindicar(FILA, "a", prazo=0.1)] == ["0"]
+    assert fila.reivindicar(FILA, "b", prazo=60) == []
+    time.sleep(0.2)
+    assert [chave for chave, _ in fila.reivindicar(FILA, "b", prazo=60)] == ["0"]
+
+    # O trabalhador que perdeu o prazo não confirma o trabalho de outro
+    assert fila.concluir(FILA, ["0"], "a") == ["0"]
+    assert fila.concluir(FILA, ["0"], "b") == []
+    assert fila.resumo(FILA) == {"concluido": 1}
+    fila.fechar()
+
+
+def test_confirmar_duas_vezes(tmp_path):
+    fila = FilaTrabalho(str(tmp_path / "fila.db"))
+    fila.enfileirar(FILA, produtos(2))
+    fila.reivindicar(FILA, "a", quantidade=2)
+
+    assert fila.concluir(FILA, ["0"], "a") == []
+    # A segunda confirmação não acha o trabalho reservado e o avisa, sem mudar o estado
+    assert fila.concluir(FILA, ["0", "1"], "a") == ["0"]
+    assert fila.resumo(FILA) == {"concluido": 2}
+    assert fila.reivindicar(FILA, "b", quantidade=2) == []
+    fila.fechar()
+
+
+def test_falha_volta_com_espera_ate_o_maximo_de_tentativas(tmp_path):
+    fila = FilaTrabalho(str(tmp_path / "fila.db"), max_tentativas=2, espera_base=0.1)
+    fila.enfileirar(FILA, produtos(1))
+
+    fila.reivindicar(FILA, "a")
+    fila.falhar(FILA, "0", "a", "erro")
+    assert fila.reivindicar(FILA, "a") == []
+    assert fila.aguardando(FILA) == 1
+    time.sleep(0.15)
+    assert [chave for chave, _ in fila.reivindicar(FILA, "a")] == ["0"]
+    fila.falhar(FILA, "0", "a", "erro")
+    assert fila.resumo(FILA) == {"falhou": 1}
+    assert fila.aguardando(FILA) == 0
+    fila.fechar()
+
+
+def test_batimento_renova_o_prazo_enquanto_itera(tmp_path):
+    fila = FilaTrabalho(str(tmp_path / "fila.db"))
+    fila.enfileirar(FILA, produtos(1))
+
+    iterador = fila.iterar(FILA, "a", prazo=0.3, intervalo=0.05)
+    assert next(iterador)["id_produto"] == "0"
+    time.sleep(0.6)
+    # Sem a renovação o prazo já teria expirado
+    assert fila.reivindicar(FILA, "b", prazo=60) == []
+    fila.concluir(FILA, ["0"], "a")
+    assert list(iterador) == []
+    fila.fechar()
+
+
+def test_confirmacoes_pendentes_avisam_as_chaves_perdidas(tmp_path):
+    fila = FilaTrabalho(str(tmp_path / "fila.db"))
+    fila.enfileirar(FILA, produtos(2))
+    gravacoes = []
+    confirmacoes = ConfirmacoesPendentes(fila, FILA, "a", ao_gravar=lambda: gravacoes.append(1))
+
+    fila.reivindicar(FILA, "a", quantidade=2, prazo=0.1)
+    confirmacoes.adicionar("0")
+    confirmacoes.adicionar("1")
+    # Processados, mas não confirmados: ninguém espera por eles, e voltam quando o prazo expira
+    assert fila.aguardando(FILA) == 0
+    time.sleep(0.2)
+    fila.reivindicar(FILA, "b", quantidade=1, prazo=60)
+
+    perdidas = confirmacoes()
+    assert gravacoes == [1]
+    assert len(perdidas) == 1
+    assert fila.resumo(FILA) == {"concluido": 1, "em_andamento": 1}
+    assert confirmacoes() is None
+    fila.fechar()
@@ -0,0 +1,58 @@
+"""Paginação das avaliações de um produto (`get_reviews.coletar_paginas`)."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'scrapping'))
+
+import get_reviews
+
+
+def api_simulada(monkeypatch, total, limite, com_quantidade=True):
+    """Substitui a API: `total` avaliações, no máximo `limite` por página. Retorna as páginas pedidas."""
+    pedidas = []
+
+    def coletar_dados(id_avaliacoes, pagina=1, tamanho_pagina=100, sessao=None):
+        pedidas.append(pagina)
+        tamanho = min(tamanho_pagina, limite)
+        inicio = (pagina - 1) * tamanho
+        produto = {
+            "_id": id_avaliacoes,
+            "reviews": [{"_id": str(i)} for i in range(inicio, min(inicio + tamanho, total))],
+        }
+        if com_quantidade:
+            produto["reviewCount"] = total
+        return {"reviews": [produto]}
+
+    monkeypatch.setattr(get_reviews, "coletar_dados", coletar_dados)
+    return pedidas
+
+
+def ids(paginas):
+    return [c["_id"] for data in paginas for produto in data["reviews"] for c in produto["reviews"]]
+
+
+@pytest.mark.parametrize("com_quantidade", [True, False])
+def test_pagina_menor_que_a_pedida(monkeypatch, com_quantidade):
+    pedidas = api_simulada(monkeypatch, total=237, limite=50, com_quantidade=com_quantidade)
+    paginas = list(get_reviews.coletar_paginas("10", tamanho_pagina=100, concorrencia=3))
+    assert ids(paginas) == [str(i) for i in range(237)]
+    assert sorted(pedidas) == [1, 2, 3, 4, 5]
+
+
+def test_so_a_primeira_pagina_se_o_consumidor_para(monkeypatch):
+    pedidas = api_simulada(monkeypatch, total=500, limite=100)
+    paginas = get_reviews.coletar_paginas("10")
+    next(paginas)
+    paginas.close()
+    assert pedidas == [1]
+
+
+def test_falha_numa_pagina_levanta_erro(monkeypatch):
+    api_simulada(monkeypatch, total=300, limite=100)
+    coletar = get_reviews.coletar_dados
+    monkeypatch.setattr(get_reviews, "coletar_dados",
+                        lambda id_avaliacoes, pagina=1, *args: None if pagina == 3 else coletar(id_avaliacoes, pagina, *args))
+    with pytest.raises(RuntimeError):
+        list(get_reviews.coletar_paginas("10"))
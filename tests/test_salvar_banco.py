@@ -0,0 +1,42 @@
+"""Gravação de lotes no DuckDB por `salvar_no_banco_de_dados`."""
+import os
+import sys
+
+import duckdb
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from processing.text_processor import salvar_no_banco_de_dados
+
+
+def lote(ids, sentimento):
+    return pd.DataFrame({
+        'id_produto': '1',
+        'id_avaliacoes': '10',
+        'id_comentario': ids,
+        'rating_do_comentario': 5,
+        'comentario_about_produto': [f'comentário {i}' for i in ids],
+        'sentimento': sentimento,
+        'topicos': [['produto']] * len(ids),
+        'data_coleta': '2024-05-01 10:00:00',
+    })
+
+
+def test_upsert_colapsa_chaves_repetidas_no_lote(tmp_path):
+    caminho = str(tmp_path / "reviews.duckdb")
+    ids = [str(i) for i in range(200)]
+    assert salvar_no_banco_de_dados(lote(ids, 'Neutro'), caminho, modo="upsert")[0]
+
+    repetido = pd.concat([lote(ids, 'Neutro'), lote(['7'], 'Positivo')], ignore_index=True)
+    sucesso, total = salvar_no_banco_de_dados(repetido, caminho, modo="upsert")
+
+    assert sucesso, total
+    assert total == 200
+    with duckdb.connect(caminho) as con:
+        assert con.execute(
+            "SELECT sentimento FROM reviews_classificadas WHERE id_comentario = '7'"
+        ).fetchall() == [('Positivo',)]
+        assert con.execute(
+            "SELECT SUM(quantidade) FROM agg_sentimento_produto_dia"
+        ).fetchone()[0] == 200